@@ -2,7 +2,7 @@
 """PyBookkeeping_all_changes.py
 
 Changes:
-- Parent refs are stable slots: Element.refs is a list of ints; 0 means empty slot. Removing a child leaves a 0 slot.
+- Parent refs are stable slots: Element.refs is an array('i') of ints; 0 means empty slot. Removing a child leaves a 0 slot.
   Adding a child reuses the first empty slot if any, otherwise appends (so positions are stable).
 - CLI path prints last 3 segments with '...' prefix when longer.
 - Binary save/load uses struct for all integer packing and length-prefixing element payloads. Element internals are JSON-encoded
@@ -10,15 +10,29 @@ Changes:
 - Other behaviors preserved (element ids allocated, free id reuse, undo/redo, etc).
 """
 from __future__ import annotations
+import array
+import bisect
+import contextlib
+import functools
 import json
+import math
+import mmap
 import shlex
 import os
+import re
 import struct
+from collections import defaultdict
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
 from abc import ABC, abstractmethod
 import pprint
 
+# orjson is optional: it is several times faster than json and emits bytes directly
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # ---- constants ----
 FILE_MAGIC = b"BKUP_V3\0"  # 8 bytes (padded/truncated)
 FILE_VERSION = 3
@@ -30,7 +44,7 @@ class BookkeepingError(Exception):
     pass
 
 # ---- IndexPointer ----
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class IndexPointer:
     target_element_id: int
     target_index_key: str
@@ -61,19 +75,113 @@ def _deserialize(obj: Any) -> Any:
         return [_deserialize(v) for v in obj]
     return obj
 
+def _has_nonfinite(obj: Any) -> bool:
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        return any(_has_nonfinite(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(_has_nonfinite(v) for v in obj)
+    return False
+
+def _json_dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        try:
+            out = orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass  # e.g. ints wider than 64 bits; the stdlib encoder copes
+        else:
+            # orjson writes NaN/Infinity as null; only then is the walk worth it
+            if b"null" not in out or not _has_nonfinite(obj):
+                return out
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+def _json_loads(data: Union[bytes, memoryview]) -> Any:
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except ValueError:
+            pass  # e.g. NaN/Infinity written by the stdlib encoder
+    return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+def _load_json_file(filepath: str) -> Any:
+    with open(filepath, "rb") as f:
+        # orjson parses straight out of the page cache; json.loads needs a bytes copy anyway
+        if orjson is None or os.fstat(f.fileno()).st_size == 0:
+            return _json_loads(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            return _json_loads(view)
+
+def _clone(obj: Any) -> Any:
+    # detached copy with the same semantics as a serialize/deserialize round trip
+    return _deserialize(_serialize(obj))
+
+_SCALAR_TYPES = frozenset((str, int, float, bool, type(None)))
+
+def _detach(desc: Any) -> Any:
+    # undo/redo descriptors made only of scalars (e.g. the inverse of an additive
+    # op like add_column or add_node) cannot alias element state; skip the copy
+    if desc is None or all(type(a) in _SCALAR_TYPES for a in desc):
+        return desc
+    return _clone(desc)
+
+def _insert_at(d: Dict[Any, Any], pos: int, key: Any, value: Any):
+    # re-insert key so it ends up at position pos (dicts keep insertion order)
+    tail = list(d.items())[pos:]
+    for k, _ in tail:
+        del d[k]
+    d[key] = value
+    d.update(tail)
+
+def _mutates(method):
+    # mark the element's cached serializable form stale before the mutator runs
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._dirty = True
+        return method(self, *args, **kwargs)
+    return wrapper
+
 # ---- Element base ----
 class Element(ABC):
+    __slots__ = ("id", "name", "type", "refs", "_nonzero_refs", "_dirty", "_cached_serial", "_file_json")
+
     def __init__(self, name: str, element_id: Optional[int] = None):
         self.id: int = element_id if element_id is not None else -1
         self.name: str = name
         self.type: str = self.__class__.__name__
-        # refs: stable slots list; 0 = empty, otherwise element id
-        self.refs: List[int] = []
+        # refs: stable slots packed as uint32s (as in the TUI model); 0 = empty, otherwise element id
+        self.refs: array.array = array.array("I")
+        # number of non-empty slots in refs, kept by ElementRegistry._set_ref
+        self._nonzero_refs: int = 0
+        # to_serializable() cache, rebuilt only after a mutator ran
+        self._dirty: bool = True
+        self._cached_serial: Optional[Dict[str, Any]] = None
+        # (cached serial it was built from, refs, encoded JSON) for save_to_file
+        self._file_json: Optional[Tuple[Dict[str, Any], List[int], bytes]] = None
 
-    @abstractmethod
     def to_serializable(self) -> Dict[str, Any]:
+        if self._dirty or self._cached_serial is None:
+            self._cached_serial = self._build_serializable()
+            self._dirty = False
+        # refs are edited in place by the registry, so they are never cached;
+        # the shallow copy keeps callers from touching the cached dict itself
+        data = dict(self._cached_serial)
+        data["refs"] = list(self.refs)
+        return data
+
+    @abstractmethod
+    def _build_serializable(self) -> Dict[str, Any]:
         pass
 
+    def file_json(self) -> bytes:
+        # encoded to_serializable(); reused across saves until the element or its refs change
+        data = self.to_serializable()
+        cached = self._file_json
+        if cached is None or cached[0] is not self._cached_serial or cached[1] != data["refs"]:
+            cached = (self._cached_serial, data["refs"], _json_dumps(data))
+            self._file_json = cached
+        return cached[2]
+
     @abstractmethod
     def from_serializable(self, data: Dict[str, Any]):
         pass
@@ -86,10 +194,25 @@ class Element(ABC):
     def has_index_key(self, key: str) -> bool:
         pass
 
+    # ---- mutation descriptors (undo/redo) ----
+    # A descriptor is (method_name, *args). For every public mutator the element
+    # has an _inverse_<method> returning the descriptor that undoes it, built from
+    # only the sub-state the mutator touches (None when the mutator will refuse).
+    def apply_and_diff(self, mutation: Tuple) -> Tuple[Any, Any]:
+        op = mutation[0]
+        inverse = _detach(getattr(self, "_inverse_" + op)(*mutation[1:]))
+        forward = _detach(mutation)
+        getattr(self, op)(*mutation[1:])
+        return inverse, forward
+
+    def apply_patch(self, patch):
+        # patches are stored detached; hand the element its own copy
+        self._dirty = True
+        getattr(self, patch[0])(*_detach(patch[1:]))
+
     def info(self) -> str:
         # show positions count and number of non-empty refs
-        non_empty = sum(1 for r in self.refs if r)
-        return f"{self.type}(id={self.id}, name={self.name}, slots={len(self.refs)}, children={non_empty})"
+        return f"{self.type}(id={self.id}, name={self.name}, slots={len(self.refs)}, children={self._nonzero_refs})"
 
     def __repr__(self):
         return f"<{self.type} id={self.id} name={self.name}>"
@@ -97,6 +220,7 @@ class Element(ABC):
 # ---- Table Element ----
 class Table(Element):
     TYPE_CODE = "Table"
+    __slots__ = ("columns", "rows", "indexed_columns", "index_maps", "list_columns")
     def __init__(self, name: str, columns: Optional[List[str]] = None, element_id: Optional[int] = None):
         super().__init__(name, element_id)
         self.columns: List[str] = columns[:] if columns else []
@@ -105,6 +229,7 @@ class Table(Element):
         self.index_maps: Dict[str, Dict[Any, List[int]]] = {}
         self.list_columns: List[str] = []  # NEW: columns storing lists
 
+    @_mutates
     def add_column(self, col_name: str):
         if col_name in self.columns:
             raise BookkeepingError("Column exists")
@@ -112,6 +237,7 @@ class Table(Element):
         for r in self.rows:
             r[col_name] = None
 
+    @_mutates
     def del_column(self, col_name: str):
         if col_name not in self.columns:
             raise BookkeepingError("No such column")
@@ -123,6 +249,7 @@ class Table(Element):
             self.index_maps.pop(col_name, None)
 
 
+    @_mutates
     def add_list_column(self, col_name: str):
         if col_name in self.columns:
             raise BookkeepingError("Column exists")
@@ -131,6 +258,7 @@ class Table(Element):
         for r in self.rows:
             r[col_name] = []
 
+    @_mutates
     def del_list_column(self, col_name: str):
         if col_name not in self.columns:
             raise BookkeepingError("No such column")
@@ -140,6 +268,7 @@ class Table(Element):
         for r in self.rows:
             r.pop(col_name, None)
 
+    @_mutates
     def insert_row(self, row: Dict[str, Any]) -> int:
         new_row = {}
         for c in self.columns:
@@ -159,13 +288,15 @@ class Table(Element):
             self.index_maps[col].setdefault(val, []).append(idx)
         return idx
 
+    @_mutates
     def update_row(self, row_idx: int, updates: Dict[str, Any]):
         if row_idx < 0 or row_idx >= len(self.rows):
             raise BookkeepingError("Row index out of range")
-        row = self.rows[row_idx]
-        for k, v in updates.items():
+        for k in updates:
             if k not in self.columns:
                 raise BookkeepingError(f"Unknown column {k}")
+        row = self.rows[row_idx]
+        for k, v in updates.items():
             old = row.get(k)
             row[k] = v
             if k in self.indexed_columns:
@@ -177,14 +308,17 @@ class Table(Element):
                             del imap[old]
                     except ValueError:
                         pass
-                imap.setdefault(v, []).append(row_idx)
+                # keep postings in row order, the same order set_index_column builds
+                bisect.insort(imap.setdefault(v, []), row_idx)
 
+    @_mutates
     def delete_row(self, row_idx: int):
         if row_idx < 0 or row_idx >= len(self.rows):
             raise BookkeepingError("Row index out of range")
         self.rows.pop(row_idx)
         self._rebuild_indexes()
 
+    @_mutates
     def move_row(self, old_index: int, new_index: int):
         if old_index < 0 or old_index >= len(self.rows):
             raise BookkeepingError("Old row index out of range")
@@ -194,6 +328,7 @@ class Table(Element):
         self.rows.insert(new_index, row)
         self._rebuild_indexes()
 
+    @_mutates
     def set_index_column(self, col_name: str):
         if col_name not in self.columns:
             raise BookkeepingError("No such column")
@@ -205,6 +340,7 @@ class Table(Element):
             m.setdefault(val, []).append(i)
         self.index_maps[col_name] = m
 
+    @_mutates
     def unset_index_column(self, col_name: str):
         if col_name in self.indexed_columns:
             self.indexed_columns.remove(col_name)
@@ -225,20 +361,24 @@ class Table(Element):
         if not isinstance(self.rows[row_idx][col], list):
             raise BookkeepingError(f"Cell {row_idx}:{col} is not a list")
 
+    @_mutates
     def append_to_list_cell(self, row_idx: int, col: str, value: Any):
         self._validate_list_cell(row_idx, col)
         self.rows[row_idx][col].append(value)
 
+    @_mutates
     def insert_into_list_cell(self, row_idx: int, col: str, index: int, value: Any):
         self._validate_list_cell(row_idx, col)
         self.rows[row_idx][col].insert(index, value)
 
+    @_mutates
     def update_list_cell_item(self, row_idx: int, col: str, index: int, value: Any):
         self._validate_list_cell(row_idx, col)
         if index < 0 or index >= len(self.rows[row_idx][col]):
             raise BookkeepingError("List index out of range")
         self.rows[row_idx][col][index] = value
 
+    @_mutates
     def delete_list_cell_item(self, row_idx: int, col: str, index: int):
         self._validate_list_cell(row_idx, col)
         if index < 0 or index >= len(self.rows[row_idx][col]):
@@ -249,7 +389,114 @@ class Table(Element):
         for col in list(self.indexed_columns):
             self.set_index_column(col)
 
-    def to_serializable(self) -> Dict[str, Any]:
+    # ---- inverse descriptors ----
+    def _inverse_add_column(self, col_name: str):
+        return ("_drop_column", col_name, None)
+
+    def _inverse_add_list_column(self, col_name: str):
+        return ("_drop_column", col_name, len(self.list_columns))
+
+    def _drop_column(self, col_name: str, list_pos: Optional[int]):
+        # undo of add_column/add_list_column: the column was appended last
+        self.columns.pop()
+        if list_pos is not None:
+            self.list_columns.pop(list_pos)
+        for r in self.rows:
+            r.pop(col_name, None)
+
+    def _inverse_del_column(self, col_name: str):
+        if col_name not in self.columns:
+            return None
+        idx_pos = self.indexed_columns.index(col_name) if col_name in self.indexed_columns else None
+        return ("_restore_column", col_name, self.columns.index(col_name), None, idx_pos,
+                [r.get(col_name) for r in self.rows])
+
+    def _inverse_del_list_column(self, col_name: str):
+        if col_name not in self.columns:
+            return None
+        list_pos = self.list_columns.index(col_name) if col_name in self.list_columns else None
+        return ("_restore_column", col_name, self.columns.index(col_name), list_pos, None,
+                [r.get(col_name) for r in self.rows])
+
+    def _restore_column(self, col_name: str, col_pos: int, list_pos: Optional[int], idx_pos: Optional[int], values: List[Any]):
+        self.columns.insert(col_pos, col_name)
+        if list_pos is not None:
+            self.list_columns.insert(list_pos, col_name)
+        for r, v in zip(self.rows, values):
+            _insert_at(r, col_pos, col_name, v)
+        if idx_pos is not None:
+            self.indexed_columns.insert(idx_pos, col_name)
+            self.set_index_column(col_name)
+
+    def _inverse_insert_row(self, row: Dict[str, Any]):
+        return ("delete_row", len(self.rows))
+
+    def _inverse_update_row(self, row_idx: int, updates: Dict[str, Any]):
+        if row_idx < 0 or row_idx >= len(self.rows):
+            return None
+        row = self.rows[row_idx]
+        return ("update_row", row_idx, {k: row.get(k) for k in updates})
+
+    def _inverse_delete_row(self, row_idx: int):
+        if row_idx < 0 or row_idx >= len(self.rows):
+            return None
+        return ("_restore_row", row_idx, self.rows[row_idx])
+
+    def _restore_row(self, row_idx: int, row: Dict[str, Any]):
+        self.rows.insert(row_idx, row)
+        self._rebuild_indexes()
+
+    def _inverse_move_row(self, old_index: int, new_index: int):
+        return ("move_row", new_index, old_index)
+
+    def _inverse_set_index_column(self, col_name: str):
+        if col_name in self.indexed_columns:
+            return ("set_index_column", col_name)
+        return ("unset_index_column", col_name)
+
+    def _inverse_unset_index_column(self, col_name: str):
+        if col_name in self.indexed_columns:
+            return ("_reindex_column", col_name, self.indexed_columns.index(col_name))
+        return ("unset_index_column", col_name)
+
+    def _reindex_column(self, col_name: str, idx_pos: int):
+        self.indexed_columns.insert(idx_pos, col_name)
+        self.set_index_column(col_name)
+
+    def _list_cell(self, row_idx: int, col: str) -> Optional[List[Any]]:
+        if col not in self.list_columns or row_idx < 0 or row_idx >= len(self.rows):
+            return None
+        cell = self.rows[row_idx].get(col)
+        return cell if isinstance(cell, list) else None
+
+    def _inverse_append_to_list_cell(self, row_idx: int, col: str, value: Any):
+        cell = self._list_cell(row_idx, col)
+        if cell is None:
+            return None
+        return ("delete_list_cell_item", row_idx, col, len(cell))
+
+    def _inverse_insert_into_list_cell(self, row_idx: int, col: str, index: int, value: Any):
+        cell = self._list_cell(row_idx, col)
+        if cell is None:
+            return None
+        # where list.insert actually puts the value
+        pos = index + len(cell) if index < 0 else index
+        pos = min(max(pos, 0), len(cell))
+        return ("delete_list_cell_item", row_idx, col, pos)
+
+    def _inverse_update_list_cell_item(self, row_idx: int, col: str, index: int, value: Any):
+        cell = self._list_cell(row_idx, col)
+        if cell is None or index < 0 or index >= len(cell):
+            return None
+        return ("update_list_cell_item", row_idx, col, index, cell[index])
+
+    def _inverse_delete_list_cell_item(self, row_idx: int, col: str, index: int):
+        cell = self._list_cell(row_idx, col)
+        if cell is None or index < 0 or index >= len(cell):
+            return None
+        return ("insert_into_list_cell", row_idx, col, index, cell[index])
+
+    def _build_serializable(self) -> Dict[str, Any]:
         return {
             "id": self.id,
             "name": self.name,
@@ -258,9 +505,9 @@ class Table(Element):
             "rows": _serialize(self.rows),
             "indexed_columns": list(self.indexed_columns),
             "list_columns": list(self.list_columns),  # NEW
-            "refs": list(self.refs),
         }
 
+    @_mutates
     def from_serializable(self, data: Dict[str, Any]):
         self.id = int(data["id"])
         self.name = data.get("name", self.name)
@@ -268,7 +515,8 @@ class Table(Element):
         self.rows = _deserialize(data.get("rows", []))
         self.indexed_columns = list(data.get("indexed_columns", []))
         self.list_columns = list(data.get("list_columns", []))  # NEW
-        self.refs = [int(x) for x in data.get("refs", [])]
+        self.refs = array.array("I", [int(x) for x in data.get("refs", [])])
+        self._nonzero_refs = sum(1 for r in self.refs if r)
         self._rebuild_indexes()
 
     def list_indexable(self) -> List[str]:
@@ -282,15 +530,16 @@ class Table(Element):
 
 class OrderedTable(Table):
     #TODO: Make an orderedtable, without insert or delete or rearrange
-    pass
+    __slots__ = ()
 
 class UnorderedTable(Table):
     #TODO: Make an unorderedtable, with insert, delete or rearrange, but index will be affected!
-    pass
+    __slots__ = ()
 
 # ---- Graph Element ----
 class Graph(Element):
     TYPE_CODE = "Graph"
+    __slots__ = ("adj", "indexed_node_attrs", "node_index_maps")
 
     def __init__(self, name: str, element_id: Optional[int] = None):
         super().__init__(name, element_id)
@@ -300,6 +549,7 @@ class Graph(Element):
         self.node_index_maps: Dict[str, Dict[Any, List[str]]] = {}
 
     # ---------------- Nodes ----------------
+    @_mutates
     def add_node(self, node_id: str, attrs: Optional[Dict[str, Any]] = None):
         if node_id in self.adj:
             raise BookkeepingError("Node exists")
@@ -308,6 +558,7 @@ class Graph(Element):
             val = self.adj[node_id]["attrs"].get(attr)
             self.node_index_maps.setdefault(attr, {}).setdefault(val, []).append(node_id)
 
+    @_mutates
     def del_node(self, node_id: str):
         if node_id not in self.adj:
             raise BookkeepingError("No such node")
@@ -327,6 +578,7 @@ class Graph(Element):
         del self.adj[node_id]
         self._rebuild_node_indexes()
 
+    @_mutates
     def update_node(self, node_id: str, attrs: Dict[str, Any]):
         if node_id not in self.adj:
             raise BookkeepingError("No such node")
@@ -347,17 +599,20 @@ class Graph(Element):
                 m.setdefault(new_val, []).append(node_id)
 
     # ---------------- Edges ----------------
+    @_mutates
     def add_edge(self, frm: str, to: str, meta: Optional[Dict[str, Any]] = None):
         if frm not in self.adj or to not in self.adj:
             raise BookkeepingError("Both nodes must exist")
         self.adj[frm]["edges"][to] = dict(meta) if meta else {}
 
+    @_mutates
     def del_edge(self, frm: str, to: str):
         if frm not in self.adj or to not in self.adj[frm]["edges"]:
             raise BookkeepingError("Edge not found")
         del self.adj[frm]["edges"][to]
 
     # ---------------- Indexes ----------------
+    @_mutates
     def set_node_index(self, attr_name: str):
         if attr_name not in self.indexed_node_attrs:
             self.indexed_node_attrs.append(attr_name)
@@ -367,6 +622,7 @@ class Graph(Element):
             m.setdefault(val, []).append(nid)
         self.node_index_maps[attr_name] = m
 
+    @_mutates
     def unset_node_index(self, attr_name: str):
         if attr_name in self.indexed_node_attrs:
             self.indexed_node_attrs.remove(attr_name)
@@ -382,23 +638,85 @@ class Graph(Element):
         for attr in list(self.indexed_node_attrs):
             self.set_node_index(attr)
 
+    # ---------------- Inverse descriptors ----------------
+    def _inverse_add_node(self, node_id: str, attrs: Optional[Dict[str, Any]] = None):
+        return ("del_node", node_id)
+
+    def _inverse_del_node(self, node_id: str):
+        if node_id not in self.adj:
+            return None
+        incoming = [(src, list(data["edges"]).index(node_id), data["edges"][node_id])
+                    for src, data in self.adj.items() if src != node_id and node_id in data["edges"]]
+        return ("_restore_node", node_id, list(self.adj).index(node_id), self.adj[node_id], incoming)
+
+    def _restore_node(self, node_id: str, pos: int, data: Dict[str, Any], incoming: List[Tuple[str, int, Dict[str, Any]]]):
+        _insert_at(self.adj, pos, node_id, data)
+        for src, edge_pos, meta in incoming:
+            _insert_at(self.adj[src]["edges"], edge_pos, node_id, meta)
+        self._rebuild_node_indexes()
+
+    def _inverse_update_node(self, node_id: str, attrs: Dict[str, Any]):
+        if node_id not in self.adj:
+            return None
+        cur = self.adj[node_id]["attrs"]
+        return ("_restore_node_attrs", node_id, {k: cur[k] for k in attrs if k in cur}, [k for k in attrs if k not in cur])
+
+    def _restore_node_attrs(self, node_id: str, old: Dict[str, Any], added: List[str]):
+        cur = self.adj[node_id]["attrs"]
+        for k in added:
+            cur.pop(k, None)
+        cur.update(old)
+        self._rebuild_node_indexes()
+
+    def _inverse_add_edge(self, frm: str, to: str, meta: Optional[Dict[str, Any]] = None):
+        if frm not in self.adj or to not in self.adj:
+            return None
+        edges = self.adj[frm]["edges"]
+        if to in edges:
+            return ("add_edge", frm, to, edges[to])
+        return ("del_edge", frm, to)
+
+    def _inverse_del_edge(self, frm: str, to: str):
+        if frm not in self.adj or to not in self.adj[frm]["edges"]:
+            return None
+        edges = self.adj[frm]["edges"]
+        return ("_restore_edge", frm, to, list(edges).index(to), edges[to])
+
+    def _restore_edge(self, frm: str, to: str, pos: int, meta: Dict[str, Any]):
+        _insert_at(self.adj[frm]["edges"], pos, to, meta)
+
+    def _inverse_set_node_index(self, attr_name: str):
+        if attr_name in self.indexed_node_attrs:
+            return ("set_node_index", attr_name)
+        return ("unset_node_index", attr_name)
+
+    def _inverse_unset_node_index(self, attr_name: str):
+        if attr_name in self.indexed_node_attrs:
+            return ("_reindex_node_attr", attr_name, self.indexed_node_attrs.index(attr_name))
+        return ("unset_node_index", attr_name)
+
+    def _reindex_node_attr(self, attr_name: str, idx_pos: int):
+        self.indexed_node_attrs.insert(idx_pos, attr_name)
+        self.set_node_index(attr_name)
+
     # ---------------- Serialization ----------------
-    def to_serializable(self) -> Dict[str, Any]:
+    def _build_serializable(self) -> Dict[str, Any]:
         return {
             "id": self.id,
             "name": self.name,
             "type": Graph.TYPE_CODE,
             "adj": _serialize(self.adj),
             "indexed_node_attrs": list(self.indexed_node_attrs),
-            "refs": list(self.refs),
         }
 
+    @_mutates
     def from_serializable(self, data: Dict[str, Any]):
         self.id = int(data["id"])
         self.name = data.get("name", self.name)
         self.adj = _deserialize(data.get("adj", {}))
         self.indexed_node_attrs = list(data.get("indexed_node_attrs", []))
-        self.refs = [int(x) for x in data.get("refs", [])]
+        self.refs = array.array("I", [int(x) for x in data.get("refs", [])])
+        self._nonzero_refs = sum(1 for r in self.refs if r)
         self._rebuild_node_indexes()
 
     # ---------------- Info & Display ----------------
@@ -418,12 +736,14 @@ class Graph(Element):
 # ---- KeyValuePair Element ----
 class KeyValuePair(Element):
     TYPE_CODE = "KeyValuePair"
+    __slots__ = ("store", "indexed_keys")
 
     def __init__(self, name: str, element_id: Optional[int] = None):
         super().__init__(name, element_id)
         self.store: Dict[str, Any] = {}
         self.indexed_keys: List[str] = []
 
+    @_mutates
     def set(self, key: str, value: Any):
         self.store[key] = value
 
@@ -432,6 +752,7 @@ class KeyValuePair(Element):
             raise BookkeepingError("Key not found")
         return self.store[key]
 
+    @_mutates
     def delete(self, key: str):
         if key not in self.store:
             raise BookkeepingError("Key not found")
@@ -439,12 +760,14 @@ class KeyValuePair(Element):
         if key in self.indexed_keys:
             self.indexed_keys.remove(key)
 
+    @_mutates
     def set_index_key(self, key: str):
         if key not in self.store:
             raise BookkeepingError("Key not found to index")
         if key not in self.indexed_keys:
             self.indexed_keys.append(key)
 
+    @_mutates
     def unset_index_key(self, key: str):
         if key in self.indexed_keys:
             self.indexed_keys.remove(key)
@@ -454,22 +777,53 @@ class KeyValuePair(Element):
             raise BookkeepingError("Key not indexed")
         return self.store[key]
 
-    def to_serializable(self) -> Dict[str, Any]:
+    # ---- inverse descriptors ----
+    def _inverse_set(self, key: str, value: Any):
+        if key in self.store:
+            return ("set", key, self.store[key])
+        return ("delete", key)
+
+    def _inverse_delete(self, key: str):
+        if key not in self.store:
+            return None
+        idx_pos = self.indexed_keys.index(key) if key in self.indexed_keys else None
+        return ("_restore_key", key, list(self.store).index(key), self.store[key], idx_pos)
+
+    def _restore_key(self, key: str, pos: int, value: Any, idx_pos: Optional[int]):
+        _insert_at(self.store, pos, key, value)
+        if idx_pos is not None:
+            self.indexed_keys.insert(idx_pos, key)
+
+    def _inverse_set_index_key(self, key: str):
+        if key in self.indexed_keys:
+            return ("set_index_key", key)
+        return ("unset_index_key", key)
+
+    def _inverse_unset_index_key(self, key: str):
+        if key in self.indexed_keys:
+            return ("_reindex_key", key, self.indexed_keys.index(key))
+        return ("unset_index_key", key)
+
+    def _reindex_key(self, key: str, idx_pos: int):
+        self.indexed_keys.insert(idx_pos, key)
+
+    def _build_serializable(self) -> Dict[str, Any]:
         return {
             "id": self.id,
             "name": self.name,
             "type": KeyValuePair.TYPE_CODE,
             "store": _serialize(self.store),
             "indexed_keys": list(self.indexed_keys),
-            "refs": list(self.refs),
         }
 
+    @_mutates
     def from_serializable(self, data: Dict[str, Any]):
         self.id = int(data["id"])
         self.name = data.get("name", self.name)
         self.store = _deserialize(data.get("store", {}))
         self.indexed_keys = list(data.get("indexed_keys", []))
-        self.refs = [int(x) for x in data.get("refs", [])]
+        self.refs = array.array("I", [int(x) for x in data.get("refs", [])])
+        self._nonzero_refs = sum(1 for r in self.refs if r)
 
     def list_indexable(self) -> List[str]:
         return list(self.indexed_keys)
@@ -512,16 +866,37 @@ class ElementFactory:
         raise BookkeepingError("Unsupported element type in serialized data")
 
 # ---- Delta (unchanged) ----
-@dataclass
+@dataclass(slots=True)
 class Delta:
     action: str
     element_id: Optional[int] = None
     before: Optional[Dict[str, Any]] = None
     after: Optional[Dict[str, Any]] = None
-    path_before: Optional[List[int]] = None
-    path_after: Optional[List[int]] = None
+    # immutable, so consecutive deltas at the same depth share one tuple
+    path_before: Optional[Tuple[int, ...]] = None
+    path_after: Optional[Tuple[int, ...]] = None
     current_element_before: Optional[int] = None
     current_element_after: Optional[int] = None
+    # element-level edits: descriptors from Element.apply_and_diff instead of full snapshots
+    before_patch: Optional[Any] = None
+    after_patch: Optional[Any] = None
+    # ref-slot edits: build before/after from the live element only when undo/redo needs them
+    before_factory: Optional[Callable[[], Dict[str, Any]]] = None
+    after_factory: Optional[Callable[[], Dict[str, Any]]] = None
+    # compound deltas (see ElementRegistry.transaction): applied in order, undone in reverse
+    subdeltas: Optional[List[HistoryEntry]] = None
+
+@dataclass(slots=True)
+class NavDelta:
+    # descend (+1) or ascend (-1) by one level through slot; element_id is the
+    # element at the lower end of the move, so undo/redo need no stored paths
+    direction: int
+    slot: int
+    element_id: int
+    # list_history() reports navigation like the element-less updates it used to be
+    action = "update"
+
+HistoryEntry = Union[Delta, NavDelta]
 
 # ---- ElementRegistry ----
 class ElementRegistry:
@@ -533,17 +908,30 @@ class ElementRegistry:
         root_id = self._alloc_id()
         root = KeyValuePair("root", element_id=root_id)
         # initialize root with one slot (optional)
-        root.refs = []
+        root.refs = array.array("I")
         self.elements[root.id] = root
         self.root_id: int = root.id
+        # reverse index of refs: target id -> {(parent id, slot pos)}
+        self._incoming: Dict[int, Set[Tuple[int, int]]] = defaultdict(set)
+        # name -> ids carrying it, in self.elements order (a dict used as an ordered set)
+        self._name_index: Dict[str, Dict[int, None]] = {}
+        self._index_name(root)
 
         self.current_element_id: int = self.root_id
         # path_stack stores positions (integers) used to descend at each level
         self.path_stack: List[int] = []
+        # element ids along the path, root first; the last one is the current element
+        self._path_id_stack: List[int] = [self.root_id]
+        # tuple(path_stack) for deltas; None after path_stack changes
+        self._path_tuple_cache: Optional[Tuple[int, ...]] = ()
 
-        self._history: List[Delta] = []
+        self._history: List[HistoryEntry] = []
         self._hist_ptr: int = -1
         self._history_limit = history_limit
+        # deltas collected by an open transaction(); None outside one
+        self._batch: Optional[List[HistoryEntry]] = None
+        # bumped on every state change (new delta, undo/redo, load); lets callers memoize views
+        self._mutation_epoch: int = 0
 
     def _alloc_id(self) -> int:
         if self._free_ids:
@@ -562,15 +950,141 @@ class ElementRegistry:
     def _current(self) -> Element:
         return self.get_element(self.current_element_id)
 
+    def _path_tuple(self) -> Tuple[int, ...]:
+        if self._path_tuple_cache is None:
+            self._path_tuple_cache = tuple(self.path_stack)
+        return self._path_tuple_cache
+
+    def _walk_path(self, path: List[int]) -> Optional[List[int]]:
+        # element ids from root along path, or None if some slot is out of range or dangling
+        elements = self.elements
+        cur = self.root_id
+        ids = [cur]
+        append = ids.append
+        for pos in path:
+            el = elements.get(cur)
+            if el is None:
+                return None
+            refs = el.refs
+            if pos < 0 or pos >= len(refs):
+                return None
+            cur = refs[pos]
+            if cur == 0 or cur not in elements:
+                return None
+            append(cur)
+        return ids
+
+    @staticmethod
+    def _first_empty_slot(el: Element) -> int:
+        # array.index scans the packed slots in C; len(refs) means "append"
+        try:
+            return el.refs.index(0)
+        except ValueError:
+            return len(el.refs)
+
+    def _ref_state(self, el_id: int, refs: Tuple[int, ...]) -> Dict[str, Any]:
+        # serializable state of el_id as it is now, but with the given refs
+        state = self.get_element(el_id).to_serializable()
+        state["refs"] = list(refs)
+        return state
+
+    def _push_ref_delta(self, el: Element, refs_before: Tuple[int, ...]):
+        # a ref edit leaves the rest of el untouched, so only the refs are kept per side
+        delta = Delta(action="update", element_id=el.id,
+                      before_factory=functools.partial(self._ref_state, el.id, refs_before),
+                      after_factory=functools.partial(self._ref_state, el.id, tuple(el.refs)),
+                      path_before=self._path_tuple(), path_after=self._path_tuple(),
+                      current_element_before=self.current_element_id, current_element_after=self.current_element_id)
+        self._push_delta(delta)
+
+    # ---- refs writes (keep _incoming in step) ----
+    def _set_ref(self, el: Element, pos: int, new: int):
+        # single write path for el.refs[pos]; pos == len(el.refs) appends a slot
+        refs = el.refs
+        if pos == len(refs):
+            refs.append(0)
+        old = refs[pos]
+        if old:
+            el._nonzero_refs -= 1
+            parents = self._incoming.get(old)
+            if parents is not None:
+                parents.discard((el.id, pos))
+                if not parents:
+                    del self._incoming[old]
+        refs[pos] = new
+        if new:
+            el._nonzero_refs += 1
+            self._incoming[new].add((el.id, pos))
+
+    def _index_refs(self, el: Element):
+        for pos, target in enumerate(el.refs):
+            if target:
+                self._incoming[target].add((el.id, pos))
+
+    def _unindex_refs(self, el: Element):
+        for pos, target in enumerate(el.refs):
+            if target:
+                parents = self._incoming.get(target)
+                if parents is not None:
+                    parents.discard((el.id, pos))
+                    if not parents:
+                        del self._incoming[target]
+
+    def _rebuild_incoming(self):
+        self._incoming = defaultdict(set)
+        for el in self.elements.values():
+            self._index_refs(el)
+
+    def _index_name(self, el: Element):
+        self._name_index.setdefault(el.name, {})[el.id] = None
+
+    def _unindex_name(self, el: Element):
+        ids = self._name_index.get(el.name)
+        if ids is not None:
+            ids.pop(el.id, None)
+            if not ids:
+                del self._name_index[el.name]
+
+    def _rebuild_name_index(self):
+        self._name_index = {}
+        for el in self.elements.values():
+            self._index_name(el)
+
+    def _install_element(self, el: Element):
+        # add or replace an element wholesale (undo/redo snapshots, create)
+        old = self.elements.get(el.id)
+        if old is not None:
+            self._unindex_refs(old)
+        self.elements[el.id] = el
+        self._index_refs(el)
+        if old is None:
+            self._index_name(el)
+        elif old.name != el.name:
+            # replaced in place, so el keeps old's position; re-derive the order for its new name
+            self._unindex_name(old)
+            self._name_index[el.name] = {e.id: None for e in self.elements.values() if e.name == el.name}
+
+    def _remove_element(self, eid: int):
+        el = self.elements.pop(eid, None)
+        if el is not None:
+            self._unindex_refs(el)
+            self._unindex_name(el)
+            self._free_id(eid)
+
     def get_element(self, element_id: int) -> Element:
         if element_id not in self.elements:
             raise BookkeepingError("No such element")
         return self.elements[element_id]
 
     def find_by_name(self, name: str) -> List[Element]:
-        return [e for e in self.elements.values() if e.name == name]
+        elements = self.elements
+        return [elements[i] for i in self._name_index.get(name, ())]
 
-    def _push_delta(self, delta: Delta):
+    def _push_delta(self, delta: HistoryEntry):
+        self._mutation_epoch += 1
+        if self._batch is not None:
+            self._batch.append(delta)
+            return
         if self._hist_ptr < len(self._history) - 1:
             self._history = self._history[: self._hist_ptr + 1]
         self._history.append(delta)
@@ -579,6 +1093,30 @@ class ElementRegistry:
             self._history = self._history[drop:]
         self._hist_ptr = len(self._history) - 1
 
+    def _push_delta_batch(self, deltas: List[HistoryEntry], action: str, element_id: Optional[int] = None):
+        if not deltas:
+            return
+        if len(deltas) == 1:
+            self._push_delta(deltas[0])
+            return
+        # path and current element are restored by the sub-deltas themselves
+        self._push_delta(Delta(action=action, element_id=element_id, subdeltas=deltas))
+
+    @contextlib.contextmanager
+    def transaction(self, action: str = "transaction", element_id: Optional[int] = None):
+        # collect every delta pushed inside the block into one history entry;
+        # nested transactions fold into the outermost one
+        if self._batch is not None:
+            yield
+            return
+        self._batch = []
+        try:
+            yield
+        finally:
+            deltas, self._batch = self._batch, None
+            # whatever was applied before an error still has to be undoable
+            self._push_delta_batch(deltas, action, element_id)
+
     def undo(self):
         if self._hist_ptr < 0:
             raise BookkeepingError("Nothing to undo")
@@ -596,61 +1134,92 @@ class ElementRegistry:
     def list_history(self):
         out = []
         for i, d in enumerate(self._history):
-            out.append({"idx": i, "action": d.action, "element_id": d.element_id})
+            out.append({"idx": i, "action": d.action,
+                        "element_id": None if type(d) is NavDelta else d.element_id})
         return out
 
-    def _apply_delta(self, delta: Delta, reverse: bool):
+    def _apply_nav(self, delta: NavDelta, reverse: bool):
+        self._mutation_epoch += 1
+        if (delta.direction > 0) != reverse:
+            self.path_stack.append(delta.slot)
+            self._path_id_stack.append(delta.element_id)
+        else:
+            self.path_stack.pop()
+            self._path_id_stack.pop()
+        self._path_tuple_cache = None
+        self.current_element_id = self._path_id_stack[-1]
+
+    def _apply_delta(self, delta: HistoryEntry, reverse: bool):
+        if type(delta) is NavDelta:
+            self._apply_nav(delta, reverse)
+            return
+        if delta.subdeltas is not None:
+            for sub in (reversed(delta.subdeltas) if reverse else delta.subdeltas):
+                self._apply_delta(sub, reverse)
+            return
+        self._mutation_epoch += 1
         state = delta.before if reverse else delta.after
-        if delta.action == "create":
+        if state is None:
+            factory = delta.before_factory if reverse else delta.after_factory
+            if factory is not None:
+                state = factory()
+        patch = delta.before_patch if reverse else delta.after_patch
+        if patch is not None:
+            self.get_element(delta.element_id).apply_patch(patch)
+
+        elif delta.action == "create":
+            if state is None:
+                raise BookkeepingError("Malformed create delta")
+            # the parent slot is part of the create; element-level deltas rely on it being restored
+            self._install_element(ElementFactory.from_serializable(state["cur"]))
             if reverse:
-                if delta.element_id in self.elements:
-                    del self.elements[delta.element_id]
-                    self._free_id(delta.element_id)
+                self._remove_element(delta.element_id)
             else:
-                if state is None:
-                    raise BookkeepingError("Malformed create delta")
-                el = ElementFactory.from_serializable(state)
-                self.elements[el.id] = el
+                el = ElementFactory.from_serializable(state["created"])
+                self._install_element(el)
+                if el.id in self._free_ids:
+                    self._free_ids.remove(el.id)
 
         elif delta.action == "delete":
             if reverse:
                 if state is None:
                     raise BookkeepingError("Malformed delete delta")
-                el = ElementFactory.from_serializable(state)
-                self.elements[el.id] = el
+                self._install_element(ElementFactory.from_serializable(state))
+                # the delete freed the id; a later create must not hand it out again
+                if delta.element_id in self._free_ids:
+                    self._free_ids.remove(delta.element_id)
             else:
-                if delta.element_id in self.elements:
-                    del self.elements[delta.element_id]
-                    self._free_id(delta.element_id)
+                self._remove_element(delta.element_id)
 
         elif delta.action == "update":
             if state is None:
-                if delta.element_id in self.elements:
-                    del self.elements[delta.element_id]
-                    self._free_id(delta.element_id)
+                if delta.element_id is not None:
+                    self._remove_element(delta.element_id)
             else:
-                el = ElementFactory.from_serializable(state)
-                self.elements[el.id] = el
+                self._install_element(ElementFactory.from_serializable(state))
 
         if reverse:
             if delta.path_before is not None:
                 self.path_stack = list(delta.path_before)
+                self._path_tuple_cache = delta.path_before
             if delta.current_element_before is not None:
                 self.current_element_id = delta.current_element_before
         else:
             if delta.path_after is not None:
                 self.path_stack = list(delta.path_after)
+                self._path_tuple_cache = delta.path_after
             if delta.current_element_after is not None:
                 self.current_element_id = delta.current_element_after
+        # a delta moves at most one level: trim or extend the id stack to match
+        ids = self._path_id_stack
+        del ids[len(self.path_stack) + 1:]
+        if len(ids) == len(self.path_stack):
+            ids.append(self.current_element_id)
+        ids[-1] = self.current_element_id
 
     # incoming refs: return (element_id, slot_pos) pairs where slot_pos is the index in parent's refs list
     def incoming_refs(self, target_id: int) -> List[Tuple[int, int]]:
-        out = []
-        for eid, el in self.elements.items():
-            for pos, v in enumerate(el.refs):
-                if v == target_id:
-                    out.append((eid, pos))
-        return out
+        return sorted(self._incoming.get(target_id, ()))
 
     def reachable_from_root(self) -> set:
         seen = set()
@@ -673,39 +1242,30 @@ class ElementRegistry:
         el_id = self._alloc_id()
         el = ElementFactory.create(element_type, name, element_id=el_id, **kwargs)
         cur = self._current()
-        before_cur = cur.to_serializable()
+        refs_before = tuple(cur.refs)
         # choose slot: if slot_pos specified, use it (must be within 0..len)
         if slot_pos is None:
             # find first empty slot (0) or append
-            found = None
-            for i, v in enumerate(cur.refs):
-                if v == 0:
-                    found = i
-                    break
-            if found is None:
-                cur.refs.append(el.id)
-                used_pos = len(cur.refs) - 1
-            else:
-                cur.refs[found] = el.id
-                used_pos = found
+            used_pos = self._first_empty_slot(cur)
         else:
             if slot_pos < 0:
                 raise BookkeepingError("slot_pos out of range")
             if slot_pos < len(cur.refs):
                 if cur.refs[slot_pos] != 0:
                     raise BookkeepingError("slot already occupied")
-                cur.refs[slot_pos] = el.id
-                used_pos = slot_pos
             else:
                 # extend with zeros up to slot_pos then set
                 while len(cur.refs) < slot_pos:
                     cur.refs.append(0)
-                cur.refs.append(el.id)
-                used_pos = slot_pos
-        self.elements[el.id] = el
+            used_pos = slot_pos
+        self._set_ref(cur, used_pos, el.id)
+        self._install_element(el)
         after_cur = cur.to_serializable()
-        delta = Delta(action="create", element_id=el.id, before={"cur": before_cur}, after={"cur": after_cur, "created": el.to_serializable()},
-                      path_before=list(self.path_stack), path_after=list(self.path_stack),
+        parent_state = functools.partial(self._ref_state, cur.id, refs_before)
+        before_factory = lambda: {"cur": parent_state()}
+        delta = Delta(action="create", element_id=el.id, before_factory=before_factory,
+                      after={"cur": after_cur, "created": el.to_serializable()},
+                      path_before=self._path_tuple(), path_after=self._path_tuple(),
                       current_element_before=self.current_element_id, current_element_after=self.current_element_id)
         self._push_delta(delta)
         return el.id, used_pos
@@ -715,37 +1275,21 @@ class ElementRegistry:
         if element_id not in self.elements:
             raise BookkeepingError("Target element does not exist")
         cur = self._current()
-        before = cur.to_serializable()
+        refs_before = tuple(cur.refs)
         if slot_pos is None:
-            found = None
-            for i, v in enumerate(cur.refs):
-                if v == 0:
-                    found = i
-                    break
-            if found is None:
-                cur.refs.append(element_id)
-                used = len(cur.refs) - 1
-            else:
-                cur.refs[found] = element_id
-                used = found
+            used = self._first_empty_slot(cur)
         else:
             if slot_pos < 0:
                 raise BookkeepingError("slot_pos out of range")
             if slot_pos < len(cur.refs):
                 if cur.refs[slot_pos] != 0:
                     raise BookkeepingError("slot already occupied")
-                cur.refs[slot_pos] = element_id
-                used = slot_pos
             else:
                 while len(cur.refs) < slot_pos:
                     cur.refs.append(0)
-                cur.refs.append(element_id)
-                used = slot_pos
-        after = cur.to_serializable()
-        delta = Delta(action="update", element_id=cur.id, before=before, after=after,
-                      path_before=list(self.path_stack), path_after=list(self.path_stack),
-                      current_element_before=self.current_element_id, current_element_after=self.current_element_id)
-        self._push_delta(delta)
+            used = slot_pos
+        self._set_ref(cur, used, element_id)
+        self._push_ref_delta(cur, refs_before)
         return used
 
     # updateref: change target at slot_pos to new element id
@@ -757,13 +1301,9 @@ class ElementRegistry:
             raise BookkeepingError("New target element does not exist")
         if cur.refs[slot_pos] == 0:
             raise BookkeepingError("Slot is empty")
-        before = cur.to_serializable()
-        cur.refs[slot_pos] = new_element_id
-        after = cur.to_serializable()
-        delta = Delta(action="update", element_id=cur.id, before=before, after=after,
-                      path_before=list(self.path_stack), path_after=list(self.path_stack),
-                      current_element_before=self.current_element_id, current_element_after=self.current_element_id)
-        self._push_delta(delta)
+        refs_before = tuple(cur.refs)
+        self._set_ref(cur, slot_pos, new_element_id)
+        self._push_ref_delta(cur, refs_before)
 
     # deleteref: clear slot (set to 0) only if target has >1 incoming refs after removal
     def deleteref(self, slot_pos: int):
@@ -778,13 +1318,9 @@ class ElementRegistry:
         count = sum(1 for (eid, pos) in incoming if not (eid == cur.id and pos == slot_pos))
         if count <= 0:
             raise BookkeepingError("Cannot clear slot: would orphan target (no other incoming refs)")
-        before = cur.to_serializable()
-        cur.refs[slot_pos] = 0
-        after = cur.to_serializable()
-        delta = Delta(action="update", element_id=cur.id, before=before, after=after,
-                      path_before=list(self.path_stack), path_after=list(self.path_stack),
-                      current_element_before=self.current_element_id, current_element_after=self.current_element_id)
-        self._push_delta(delta)
+        refs_before = tuple(cur.refs)
+        self._set_ref(cur, slot_pos, 0)
+        self._push_ref_delta(cur, refs_before)
 
     # delete element entirely (allowed only if element has no children refs)
     def delete(self, slot_pos: int):
@@ -796,40 +1332,35 @@ class ElementRegistry:
             raise BookkeepingError("Slot empty")
         target_el = self.elements.get(target_id)
         if target_el is None:
-            before_parent = cur.to_serializable()
-            cur.refs[slot_pos] = 0
-            after_parent = cur.to_serializable()
-            delta = Delta(action="update", element_id=cur.id, before=before_parent, after=after_parent,
-                          path_before=list(self.path_stack), path_after=list(self.path_stack),
-                          current_element_before=self.current_element_id, current_element_after=self.current_element_id)
-            self._push_delta(delta)
+            refs_before = tuple(cur.refs)
+            self._set_ref(cur, slot_pos, 0)
+            self._push_ref_delta(cur, refs_before)
             raise BookkeepingError("Dangling reference removed (target was missing)")
-        if any(child for child in target_el.refs if child):
+        if target_el._nonzero_refs > 0:
             raise BookkeepingError("Cannot delete: target element has children refs (would orphan subtree)")
         before_deleted = target_el.to_serializable()
-        before_parent = cur.to_serializable()
+        # refs of every parent touched below, as they were before (cur included)
+        parents_before: Dict[int, Tuple[int, ...]] = {cur.id: tuple(cur.refs)}
         # remove incoming refs across all parents (clear slots)
         incoming = self.incoming_refs(target_id)
         for (eid, pos) in incoming:
             el = self.elements.get(eid)
             if el and pos < len(el.refs) and el.refs[pos] == target_id:
-                el.refs[pos] = 0
+                parents_before.setdefault(eid, tuple(el.refs))
+                self._set_ref(el, pos, 0)
         # delete element
-        if target_id in self.elements:
-            del self.elements[target_id]
-            self._free_id(target_id)
+        self._remove_element(target_id)
         # clear parent slot
         if cur.refs[slot_pos] == target_id:
-            cur.refs[slot_pos] = 0
-        after_parent = cur.to_serializable()
+            self._set_ref(cur, slot_pos, 0)
         delta = Delta(action="delete", element_id=target_id, before=before_deleted, after=None,
-                      path_before=list(self.path_stack), path_after=list(self.path_stack),
+                      path_before=self._path_tuple(), path_after=self._path_tuple(),
                       current_element_before=self.current_element_id, current_element_after=self.current_element_id)
-        parent_delta = Delta(action="update", element_id=cur.id, before=before_parent, after=after_parent,
-                             path_before=list(self.path_stack), path_after=list(self.path_stack),
-                             current_element_before=self.current_element_id, current_element_after=self.current_element_id)
-        self._push_delta(delta)
-        self._push_delta(parent_delta)
+        # one history entry: undo restores every cleared slot, then the element
+        with self.transaction("delete", target_id):
+            self._push_delta(delta)
+            for eid, refs_before in parents_before.items():
+                self._push_ref_delta(self.elements[eid], refs_before)
 
     # descend into a child by slot position (push slot pos to path_stack)
     def descend(self, slot_pos: int):
@@ -841,218 +1372,77 @@ class ElementRegistry:
         target_id = cur.refs[slot_pos]
         if target_id not in self.elements:
             raise BookkeepingError("Referenced element missing")
-        before_path = list(self.path_stack)
-        before_current = self.current_element_id
         self.path_stack.append(slot_pos)
+        self._path_tuple_cache = None
+        self._path_id_stack.append(target_id)
         self.current_element_id = target_id
-        delta = Delta(action="update", element_id=None, before=None, after=None,
-                      path_before=before_path, path_after=list(self.path_stack),
-                      current_element_before=before_current, current_element_after=self.current_element_id)
-        self._push_delta(delta)
+        self._push_delta(NavDelta(1, slot_pos, target_id))
 
     def ascend(self):
         if not self.path_stack:
             raise BookkeepingError("Already at root; cannot ascend")
-        before_path = list(self.path_stack)
-        before_current = self.current_element_id
-        self.path_stack.pop()
-        cur = self.root_id
-        for pos in self.path_stack:
-            el = self.elements.get(cur)
-            if el is None or pos < 0 or pos >= len(el.refs):
-                raise BookkeepingError("Invalid path state while ascending")
-            cur = el.refs[pos]
-            if cur == 0 or cur not in self.elements:
-                raise BookkeepingError("Invalid path state while ascending (missing element)")
+        # the parent's id was recorded on the way down; no need to re-walk from root
+        cur = self._path_id_stack[-2]
+        if cur not in self.elements:
+            raise BookkeepingError("Invalid path state while ascending (missing element)")
+        child = self.current_element_id
+        slot_pos = self.path_stack.pop()
+        self._path_tuple_cache = None
+        self._path_id_stack.pop()
         self.current_element_id = cur
-        delta = Delta(action="update", element_id=None, before=None, after=None,
-                      path_before=before_path, path_after=list(self.path_stack),
-                      current_element_before=before_current, current_element_after=self.current_element_id)
-        self._push_delta(delta)
+        self._push_delta(NavDelta(-1, slot_pos, child))
 
-    def _record_element_update(self, el: Element, before_state: Dict[str, Any]):
-        after_state = el.to_serializable()
-        delta = Delta(action="update", element_id=el.id, before=before_state, after=after_state,
-                      path_before=list(self.path_stack), path_after=list(self.path_stack),
+    def _record_element_update(self, el: Element, mutation: Tuple):
+        # apply the mutation and keep only the touched sub-state for undo/redo
+        inverse, forward = el.apply_and_diff(mutation)
+        delta = Delta(action="update", element_id=el.id, before_patch=inverse, after_patch=forward,
+                      path_before=self._path_tuple(), path_after=self._path_tuple(),
                       current_element_before=self.current_element_id, current_element_after=self.current_element_id)
         self._push_delta(delta)
 
-    # Table ops (unchanged semantics)
-    def table_add_column(self, col: str):
-        el = self._current()
-        if not isinstance(el, Table):
-            raise BookkeepingError("Current element is not a Table")
-        before = el.to_serializable()
-        el.add_column(col)
-        self._record_element_update(el, before)
-
-    def table_del_column(self, col: str):
-        el = self._current()
-        if not isinstance(el, Table):
-            raise BookkeepingError("Current element is not a Table")
-        before = el.to_serializable()
-        el.del_column(col)
-        self._record_element_update(el, before)
-
-    def table_insert_row(self, row: Dict[str, Any]) -> int:
-        el = self._current()
-        if not isinstance(el, Table):
-            raise BookkeepingError("Current element is not a Table")
-        before = el.to_serializable()
-        idx = el.insert_row(row)
-        self._record_element_update(el, before)
-        return idx
-
-    def table_update_row(self, row_idx: int, updates: Dict[str, Any]):
-        el = self._current()
-        if not isinstance(el, Table):
-            raise BookkeepingError("Current element is not a Table")
-        before = el.to_serializable()
-        el.update_row(row_idx, updates)
-        self._record_element_update(el, before)
-
-    def table_delete_row(self, row_idx: int):
-        el = self._current()
-        if not isinstance(el, Table):
-            raise BookkeepingError("Current element is not a Table")
-        before = el.to_serializable()
-        el.delete_row(row_idx)
-        self._record_element_update(el, before)
-
-    def table_move_row(self, old_idx: int, new_idx: int):
-        el = self._current()
-        if not isinstance(el, Table):
-            raise BookkeepingError("Current element is not a Table")
-        before = el.to_serializable()
-        el.move_row(old_idx, new_idx)
-        self._record_element_update(el, before)
-
-    def table_set_index(self, col: str):
-        el = self._current()
-        if not isinstance(el, Table):
-            raise BookkeepingError("Current element is not a Table")
-        before = el.to_serializable()
-        el.set_index_column(col)
-        self._record_element_update(el, before)
-
-    def table_unset_index(self, col: str):
-        el = self._current()
-        if not isinstance(el, Table):
-            raise BookkeepingError("Current element is not a Table")
-        before = el.to_serializable()
-        el.unset_index_column(col)
-        self._record_element_update(el, before)
-
-
-    def table_add_list_column(self, col: str):
-        el = self._current()
-        if not isinstance(el, Table):
-            raise BookkeepingError("Current element is not a Table")
-        before = el.to_serializable()
-        el.add_list_column(col)
-        self._record_element_update(el, before)
-
-    def table_del_list_column(self, col: str):
+    def _current_as(self, cls: type) -> Element:
         el = self._current()
-        if not isinstance(el, Table):
-            raise BookkeepingError("Current element is not a Table")
-        before = el.to_serializable()
-        el.del_list_column(col)
-        self._record_element_update(el, before)
+        if not isinstance(el, cls):
+            raise BookkeepingError(f"Current element is not a {cls.__name__}")
+        return el
 
-    def table_list_append(self, row_idx: int, col: str, value: Any):
-        el = self._current()
-        if not isinstance(el, Table):
-            raise BookkeepingError("Current element is not a Table")
-        before = el.to_serializable()
-        el.append_to_list_cell(row_idx, col, value)
-        self._record_element_update(el, before)
-
-    def table_list_insert(self, row_idx: int, col: str, index: int, value: Any):
-        el = self._current()
-        if not isinstance(el, Table):
-            raise BookkeepingError("Current element is not a Table")
-        before = el.to_serializable()
-        el.insert_into_list_cell(row_idx, col, index, value)
-        self._record_element_update(el, before)
+    def _dispatch(self, cls: type, op: str, *args):
+        # shared body of the mutating table_*/graph_*/kv_* wrappers below
+        self._record_element_update(self._current_as(cls), (op, *args))
 
-    def table_list_update(self, row_idx: int, col: str, index: int, value: Any):
-        el = self._current()
-        if not isinstance(el, Table):
-            raise BookkeepingError("Current element is not a Table")
-        before = el.to_serializable()
-        el.update_list_cell_item(row_idx, col, index, value)
-        self._record_element_update(el, before)
+    # Table ops (unchanged semantics)
+    table_add_column = functools.partialmethod(_dispatch, Table, "add_column")
+    table_del_column = functools.partialmethod(_dispatch, Table, "del_column")
 
-    def table_list_delete(self, row_idx: int, col: str, index: int):
-        el = self._current()
-        if not isinstance(el, Table):
-            raise BookkeepingError("Current element is not a Table")
-        before = el.to_serializable()
-        el.delete_list_cell_item(row_idx, col, index)
-        self._record_element_update(el, before)
+    def table_insert_row(self, row: Dict[str, Any]) -> int:
+        el = self._current_as(Table)
+        self._record_element_update(el, ("insert_row", row))
+        return len(el.rows) - 1
+
+    table_update_row = functools.partialmethod(_dispatch, Table, "update_row")
+    table_delete_row = functools.partialmethod(_dispatch, Table, "delete_row")
+    table_move_row = functools.partialmethod(_dispatch, Table, "move_row")
+    table_set_index = functools.partialmethod(_dispatch, Table, "set_index_column")
+    table_unset_index = functools.partialmethod(_dispatch, Table, "unset_index_column")
+
+    table_add_list_column = functools.partialmethod(_dispatch, Table, "add_list_column")
+    table_del_list_column = functools.partialmethod(_dispatch, Table, "del_list_column")
+    table_list_append = functools.partialmethod(_dispatch, Table, "append_to_list_cell")
+    table_list_insert = functools.partialmethod(_dispatch, Table, "insert_into_list_cell")
+    table_list_update = functools.partialmethod(_dispatch, Table, "update_list_cell_item")
+    table_list_delete = functools.partialmethod(_dispatch, Table, "delete_list_cell_item")
 
     # Graph ops
-    def graph_add_node(self, node_id: str, attrs: Optional[Dict[str, Any]] = None):
-        el = self._current()
-        if not isinstance(el, Graph):
-            raise BookkeepingError("Current element is not a Graph")
-        before = el.to_serializable()
-        el.add_node(node_id, attrs)
-        self._record_element_update(el, before)
-
-    def graph_del_node(self, node_id: str):
-        el = self._current()
-        if not isinstance(el, Graph):
-            raise BookkeepingError("Current element is not a Graph")
-        before = el.to_serializable()
-        el.del_node(node_id)
-        self._record_element_update(el, before)
-
-    def graph_update_node(self, node_id: str, attrs: Dict[str, Any]):
-        el = self._current()
-        if not isinstance(el, Graph):
-            raise BookkeepingError("Current element is not a Graph")
-        before = el.to_serializable()
-        el.update_node(node_id, attrs)
-        self._record_element_update(el, before)
-
-    def graph_add_edge(self, frm: str, to: str, meta: Optional[Dict[str, Any]] = None):
-        el = self._current()
-        if not isinstance(el, Graph):
-            raise BookkeepingError("Current element is not a Graph")
-        before = el.to_serializable()
-        el.add_edge(frm, to, meta)
-        self._record_element_update(el, before)
-
-    def graph_del_edge(self, frm: str, to: str):
-        el = self._current()
-        if not isinstance(el, Graph):
-            raise BookkeepingError("Current element is not a Graph")
-        before = el.to_serializable()
-        el.del_edge(frm, to)
-        self._record_element_update(el, before)
-
-    def graph_set_node_index(self, attr: str):
-        el = self._current()
-        if not isinstance(el, Graph):
-            raise BookkeepingError("Current element is not a Graph")
-        before = el.to_serializable()
-        el.set_node_index(attr)
-        self._record_element_update(el, before)
-
-    def graph_unset_node_index(self, attr: str):
-        el = self._current()
-        if not isinstance(el, Graph):
-            raise BookkeepingError("Current element is not a Graph")
-        before = el.to_serializable()
-        el.unset_node_index(attr)
-        self._record_element_update(el, before)
+    graph_add_node = functools.partialmethod(_dispatch, Graph, "add_node")
+    graph_del_node = functools.partialmethod(_dispatch, Graph, "del_node")
+    graph_update_node = functools.partialmethod(_dispatch, Graph, "update_node")
+    graph_add_edge = functools.partialmethod(_dispatch, Graph, "add_edge")
+    graph_del_edge = functools.partialmethod(_dispatch, Graph, "del_edge")
+    graph_set_node_index = functools.partialmethod(_dispatch, Graph, "set_node_index")
+    graph_unset_node_index = functools.partialmethod(_dispatch, Graph, "unset_node_index")
 
     def graph_lookup_nodes(self, attr: str, value: Any):
-        el = self._current()
-        if not isinstance(el, Graph):
-            raise BookkeepingError("Current element is not a Graph")
+        el = self._current_as(Graph)
         # Works with adjacency table: lookup in attrs for matching value
         if attr not in el.indexed_node_attrs:
             raise BookkeepingError("Node attribute not indexed")
@@ -1061,43 +1451,14 @@ class ElementRegistry:
 
 
     # KVP ops
-    def kv_set(self, key: str, value: Any):
-        el = self._current()
-        if not isinstance(el, KeyValuePair):
-            raise BookkeepingError("Current element is not a KeyValuePair")
-        before = el.to_serializable()
-        el.set(key, value)
-        self._record_element_update(el, before)
+    kv_set = functools.partialmethod(_dispatch, KeyValuePair, "set")
 
     def kv_get(self, key: str):
-        el = self._current()
-        if not isinstance(el, KeyValuePair):
-            raise BookkeepingError("Current element is not a KeyValuePair")
-        return el.get(key)
-
-    def kv_delete(self, key: str):
-        el = self._current()
-        if not isinstance(el, KeyValuePair):
-            raise BookkeepingError("Current element is not a KeyValuePair")
-        before = el.to_serializable()
-        el.delete(key)
-        self._record_element_update(el, before)
+        return self._current_as(KeyValuePair).get(key)
 
-    def kv_set_index(self, key: str):
-        el = self._current()
-        if not isinstance(el, KeyValuePair):
-            raise BookkeepingError("Current element is not a KeyValuePair")
-        before = el.to_serializable()
-        el.set_index_key(key)
-        self._record_element_update(el, before)
-
-    def kv_unset_index(self, key: str):
-        el = self._current()
-        if not isinstance(el, KeyValuePair):
-            raise BookkeepingError("Current element is not a KeyValuePair")
-        before = el.to_serializable()
-        el.unset_index_key(key)
-        self._record_element_update(el, before)
+    kv_delete = functools.partialmethod(_dispatch, KeyValuePair, "delete")
+    kv_set_index = functools.partialmethod(_dispatch, KeyValuePair, "set_index_key")
+    kv_unset_index = functools.partialmethod(_dispatch, KeyValuePair, "unset_index_key")
 
     '''
     # ---- binary save/load using struct + length-prefixed element payloads (payloads are JSON bytes)
@@ -1190,30 +1551,40 @@ class ElementRegistry:
     '''
 
         # ---- JSON save/load (human-readable) ----
+    # Kept as JSON rather than pickle: the files are shared with the TUI and meant
+    # to be inspectable, and unpickling a file can execute arbitrary code.
     def save_to_file(self, filepath: str):
-        data = {
-            "elements": [el.to_serializable() for el in self.elements.values()],
-            "meta": {
-                "current_element_id": self.current_element_id,
-                "path_stack": list(self.path_stack),
-                "root_id": self.root_id,
-                "next_id": self._next_id,
-                "free_ids": list(self._free_ids)
-            }
+        meta = {
+            "current_element_id": self.current_element_id,
+            "path_stack": list(self.path_stack),
+            "root_id": self.root_id,
+            "next_id": self._next_id,
+            "free_ids": list(self._free_ids)
         }
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(data, f, separators=(",", ":"), ensure_ascii=False)
+        # same document as {"elements": [...], "meta": meta}, written one element
+        # at a time; only elements changed since the last save are re-encoded
+        with open(filepath, "wb") as f:
+            f.write(b'{"elements":[')
+            sep = b""
+            for el in self.elements.values():
+                f.write(sep)
+                f.write(el.file_json())
+                sep = b","
+            f.write(b'],"meta":')
+            f.write(_json_dumps(meta))
+            f.write(b"}")
 
     def load_from_file(self, filepath: str):
         if not os.path.exists(filepath):
             raise BookkeepingError("File not found")
-        with open(filepath, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = _load_json_file(filepath)
         new_elements: Dict[int, Element] = {}
         for el_data in data.get("elements", []):
             el = ElementFactory.from_serializable(el_data)
             new_elements[el.id] = el
         self.elements = new_elements
+        self._rebuild_incoming()
+        self._rebuild_name_index()
         meta = data.get("meta", {})
         self._next_id = int(meta.get("next_id", max(self.elements.keys()) + 1 if self.elements else 1))
         self._free_ids = list(meta.get("free_ids", []))
@@ -1226,7 +1597,7 @@ class ElementRegistry:
             else:
                 rid = self._alloc_id()
                 root = KeyValuePair("root", element_id=rid)
-                self.elements[rid] = root
+                self._install_element(root)
                 self.root_id = rid
         current_element_id = meta.get("current_element_id")
         if current_element_id is not None and int(current_element_id) in self.elements:
@@ -1234,30 +1605,25 @@ class ElementRegistry:
         else:
             self.current_element_id = self.root_id
         path_stack = meta.get("path_stack", [])
-        # validate path_stack
-        valid = True
-        cur = self.root_id
-        for pos in path_stack:
-            el = self.elements.get(cur)
-            if el is None or pos < 0 or pos >= len(el.refs) or el.refs[pos] == 0 or el.refs[pos] not in self.elements:
-                valid = False
-                break
-            cur = el.refs[pos]
-        self.path_stack = list(path_stack) if valid else []
+        # validate path_stack, collecting the element ids along it
+        ids = self._walk_path(path_stack)
+        self.path_stack = list(path_stack) if ids is not None else []
+        self._path_tuple_cache = None
+        self._path_id_stack = ids if ids is not None else [self.root_id]
         self._history.clear()
         self._hist_ptr = -1
+        self._mutation_epoch += 1
 
 
     def validate_pointer(self, pointer: IndexPointer) -> bool:
-        if pointer.target_element_id not in self.elements:
-            return False
-        target = self.elements[pointer.target_element_id]
-        return target.has_index_key(pointer.target_index_key)
+        # one dict probe and one set probe; both are exact, so no prefilter is needed
+        target = self.elements.get(pointer.target_element_id)
+        return target is not None and target.has_index_key(pointer.target_index_key)
 
     def resolve_pointer(self, pointer: IndexPointer) -> Any:
-        if not self.validate_pointer(pointer):
+        target = self.elements.get(pointer.target_element_id)
+        if target is None or not target.has_index_key(pointer.target_index_key):
             raise BookkeepingError("Invalid pointer")
-        target = self.elements[pointer.target_element_id]
         if isinstance(target, Table):
             return target.index_maps[pointer.target_index_key]
         if isinstance(target, Graph):
@@ -1355,6 +1721,20 @@ Notes
 """
 
 
+# one pass over the token instead of trying int(), float(), ... in turn; the
+# int/float groups accept exactly what int()/float() accept
+_DIGITS = r"\d(?:_?\d)*"
+_VALUE_RE = re.compile(
+    rf"(?P<int>\s*[-+]?{_DIGITS}\s*)"
+    rf"|(?P<float>\s*[-+]?(?:(?:{_DIGITS}(?:\.(?:{_DIGITS})?)?|\.{_DIGITS})(?:[eE][-+]?{_DIGITS})?|(?i:inf|infinity|nan))\s*)"
+    r"|(?P<bool>(?i:true|false))"
+    r"|(?P<quoted>\"(?:.*\")?|'(?:.*')?)",
+    re.DOTALL,
+)
+
+# Parsed values are immutable (numbers, bools, str, frozen IndexPointer), so
+# repeated literals in a session can share one cached result.
+@functools.lru_cache(maxsize=4096)
 def parse_value(token: str):
     if token.startswith("ptr:"):
         body = token[len("ptr:"):]
@@ -1366,35 +1746,111 @@ def parse_value(token: str):
         except ValueError:
             raise BookkeepingError("Invalid element id in pointer")
         return IndexPointer(eid, k)
-    try:
+    m = _VALUE_RE.fullmatch(token)
+    if m is None:
+        return token
+    kind = m.lastgroup
+    if kind == "int":
         return int(token)
-    except ValueError:
-        pass
-    try:
+    if kind == "float":
         return float(token)
-    except ValueError:
-        pass
-    if token.lower() in ("true", "false"):
+    if kind == "bool":
         return token.lower() == "true"
-    if (token.startswith('"') and token.endswith('"')) or (token.startswith("'") and token.endswith("'")):
-        return token[1:-1]
-    return token
+    return token[1:-1]
+
+@functools.lru_cache(maxsize=4096)
+def _parse_kv_token(token: str) -> Tuple[str, Any]:
+    k, sep, v = token.partition("=")
+    if not sep:
+        raise BookkeepingError("expected key=value tokens")
+    return k, parse_value(v)
 
 def parse_kvs(tokens: List[str]) -> Dict[str, Any]:
     out = {}
     for t in tokens:
-        if "=" not in t:
-            raise BookkeepingError("expected key=value tokens")
-        k, v = t.split("=", 1)
-        out[k] = parse_value(v)
+        k, v = _parse_kv_token(t)
+        out[k] = v
     return out
 
 class CLI:
     def __init__(self):
         self.reg = ElementRegistry()
         self.running = True
+        # ((registry, path tuple, mutation epoch), formatted path) of the last prompt
+        self._path_cache: Tuple[Any, Optional[str]] = (None, None)
+        # commands that work on any element; element-specific ones are handled in handle()
+        self._handlers: Dict[str, Callable[[List[str]], None]] = {
+            "help": self._cmd_help,
+            "exit": self._cmd_exit,
+            "quit": self._cmd_exit,
+            "info": self._cmd_info,
+            "history": self._cmd_history,
+            "undo": self._cmd_undo,
+            "redo": self._cmd_redo,
+            "create": self._cmd_create,
+            "createref": self._cmd_createref,
+            "updateref": self._cmd_updateref,
+            "deleteref": self._cmd_deleteref,
+            "delete": self._cmd_delete,
+            "list": self._cmd_list,
+            "inspect": self._cmd_inspect,
+            "descend": self._cmd_descend,
+            "ascend": self._cmd_ascend,
+            "up": self._cmd_ascend,
+            "save": self._cmd_save,
+            "load": self._cmd_load,
+            "show": self._cmd_show,
+            "to_dict": self._cmd_to_dict,
+        }
+        # element-specific commands, keyed by the part after the prefix
+        self._tbl_handlers: Dict[str, Callable[[List[str]], None]] = {
+            "add_col": self._cmd_tbl_add_col,
+            "del_col": self._cmd_tbl_del_col,
+            "insert_row": self._cmd_tbl_insert_row,
+            "update_row": self._cmd_tbl_update_row,
+            "del_row": self._cmd_tbl_del_row,
+            "move_row": self._cmd_tbl_move_row,
+            "set_index": self._cmd_tbl_set_index,
+            "unset_index": self._cmd_tbl_unset_index,
+            "lookup": self._cmd_tbl_lookup,
+            "add_list_col": self._cmd_tbl_add_list_col,
+            "del_list_col": self._cmd_tbl_del_list_col,
+            "list_append": self._cmd_tbl_list_append,
+            "list_insert": self._cmd_tbl_list_insert,
+            "list_update": self._cmd_tbl_list_update,
+            "list_del": self._cmd_tbl_list_del,
+            "show_rows": self._cmd_tbl_show_rows,
+        }
+        self._g_handlers: Dict[str, Callable[[List[str]], None]] = {
+            "add_node": self._cmd_g_add_node,
+            "del_node": self._cmd_g_del_node,
+            "update_node": self._cmd_g_update_node,
+            "add_edge": self._cmd_g_add_edge,
+            "del_edge": self._cmd_g_del_edge,
+            "set_node_index": self._cmd_g_set_node_index,
+            "unset_node_index": self._cmd_g_unset_node_index,
+            "lookup_nodes": self._cmd_g_lookup_nodes,
+            "show": self._cmd_g_show,
+        }
+        self._kv_handlers: Dict[str, Callable[[List[str]], None]] = {
+            "set": self._cmd_kv_set,
+            "get": self._cmd_kv_get,
+            "del": self._cmd_kv_del,
+            "set_index": self._cmd_kv_set_index,
+            "unset_index": self._cmd_kv_unset_index,
+            "lookup": self._cmd_kv_lookup,
+        }
+        # command prefix -> (TYPE_CODE of the element it applies to, its handlers)
+        self._prefix_handlers: Dict[str, Tuple[str, Dict[str, Callable[[List[str]], None]]]] = {
+            "tbl": (Table.TYPE_CODE, self._tbl_handlers),
+            "g": (Graph.TYPE_CODE, self._g_handlers),
+            "kv": (KeyValuePair.TYPE_CODE, self._kv_handlers),
+        }
 
     def _format_path(self) -> str:
+        key = (self.reg, tuple(self.reg.path_stack), self.reg._mutation_epoch)
+        if self._path_cache[0] == key:
+            return self._path_cache[1]
         # Build readable segments from path_stack: each segment as name#id
         segments: List[str] = []
         cur = self.reg.root_id
@@ -1418,7 +1874,9 @@ class CLI:
             segs = segments
         if len(segs) > 3:
             segs = ["..."] + segs[-3:]
-        return "/".join(segs)
+        out = "/".join(segs)
+        self._path_cache = (key, out)
+        return out
 
     def run(self):
         print("Bookkeeping CLI (stable slots). Type 'help'.")
@@ -1451,366 +1909,355 @@ class CLI:
             return matches[0].id
         raise BookkeepingError("Element not found by id or name")
 
+    def _cmd_help(self, parts: List[str]):
+        print(HELP)
+
+    def _cmd_exit(self, parts: List[str]):
+        self.running = False
+        print("Bye.")
+
+    def _cmd_info(self, parts: List[str]):
+        print("root id:", self.reg.root_id)
+        print("current id:", self.reg.current_element_id)
+        print("path stack:", self.reg.path_stack)
+
+    def _cmd_history(self, parts: List[str]):
+        for h in self.reg.list_history():
+            print(h)
+
+    def _cmd_undo(self, parts: List[str]):
+        self.reg.undo()
+        print("Undone")
+
+    def _cmd_redo(self, parts: List[str]):
+        self.reg.redo()
+        print("Redone")
+
+    def _cmd_create(self, parts: List[str]):
+        # create <type> <name> [<slot_pos>]
+        if len(parts) < 3:
+            raise BookkeepingError("create <type> <name> [<slot_pos>]")
+        etype = parts[1]
+        name = parts[2]
+        slot = None
+        if len(parts) >= 4:
+            slot = int(parts[3])
+        eid, used = self.reg.create_element(etype, name, slot_pos=slot)
+        print("Created", eid, "in slot", used)
+
+    def _cmd_createref(self, parts: List[str]):
+        # createref [<slot_pos>] <element_id>
+        if len(parts) not in (2,3):
+            raise BookkeepingError("createref [<slot_pos>] <element_id>")
+        if len(parts) == 2:
+            slot = None
+            eid = self._resolve(parts[1])
+        else:
+            slot = int(parts[1])
+            eid = self._resolve(parts[2])
+        used = self.reg.createref(slot, eid)
+        print("Created ref to", eid, "in slot", used)
+
+    def _cmd_updateref(self, parts: List[str]):
+        if len(parts) != 3:
+            raise BookkeepingError("updateref <slot_pos> <new_element_id>")
+        pos = int(parts[1])
+        new_eid = self._resolve(parts[2])
+        self.reg.updateref(pos, new_eid)
+        print("Updated slot", pos, "->", new_eid)
+
+    def _cmd_deleteref(self, parts: List[str]):
+        if len(parts) != 2:
+            raise BookkeepingError("deleteref <slot_pos>")
+        pos = int(parts[1])
+        self.reg.deleteref(pos)
+        print("Cleared slot", pos)
+
+    def _cmd_delete(self, parts: List[str]):
+        if len(parts) != 2:
+            raise BookkeepingError("delete <slot_pos>")
+        pos = int(parts[1])
+        self.reg.delete(pos)
+        print("Deleted element at slot", pos)
+
+    def _cmd_list(self, parts: List[str]):
+        cur = self.reg._current()
+        lines = ["Slots from current element (position -> id (type name) ):"]
+        elements_get = self.reg.elements.get
+        for i, v in enumerate(cur.refs):
+            el = elements_get(v) if v else None
+            if el:
+                lines.append(f"  {i} -> {v} ({el.type} '{el.name}')")
+            else:
+                lines.append(f"  {i} -> {v} (empty)")
+        print("\n".join(lines))
+
+    def _cmd_inspect(self, parts: List[str]):
+        if len(parts) != 2:
+            raise BookkeepingError("inspect <slot_pos>")
+        pos = int(parts[1])
+        cur = self.reg._current()
+        if pos < 0 or pos >= len(cur.refs):
+            raise BookkeepingError("pos not in current slots")
+        eid = cur.refs[pos]
+        if eid == 0:
+            raise BookkeepingError("slot empty")
+        el = self.reg.elements.get(eid)
+        if not el:
+            raise BookkeepingError("Referenced element missing")
+        pprint.pprint(el.to_serializable())
+
+    def _cmd_descend(self, parts: List[str]):
+        if len(parts) != 2:
+            raise BookkeepingError("descend <slot_pos>")
+        pos = int(parts[1])
+        self.reg.descend(pos)
+        print("Descended into slot", pos)
+
+    def _cmd_ascend(self, parts: List[str]):
+        self.reg.ascend()
+        print("Ascended. Current path:", self.reg.path_stack)
+
+    def _cmd_save(self, parts: List[str]):
+        if len(parts) != 2:
+            raise BookkeepingError("save <file>")
+        self.reg.save_to_file(parts[1])
+        print("Saved to", parts[1])
+
+    def _cmd_load(self, parts: List[str]):
+        if len(parts) != 2:
+            raise BookkeepingError("load <file>")
+        self.reg.load_from_file(parts[1])
+        print("Loaded from", parts[1])
+
+    def _cmd_show(self, parts: List[str]):
+        print(self.reg._current().info())
+
+    def _cmd_to_dict(self, parts: List[str]):
+        pprint.pprint(self.reg._current().to_serializable())
+
+    # ---- table commands (prefix tbl.) ----
+    def _cmd_tbl_add_col(self, parts: List[str]):
+        if len(parts) != 2:
+            raise BookkeepingError("tbl.add_col <col>")
+        self.reg.table_add_column(parts[1])
+        print("Added column")
+
+    def _cmd_tbl_del_col(self, parts: List[str]):
+        if len(parts) != 2:
+            raise BookkeepingError("tbl.del_col <col>")
+        self.reg.table_del_column(parts[1])
+        print("Deleted column")
+
+    def _cmd_tbl_insert_row(self, parts: List[str]):
+        kv = parse_kvs(parts[1:])
+        idx = self.reg.table_insert_row(kv)
+        print("Inserted row", idx)
+
+    def _cmd_tbl_update_row(self, parts: List[str]):
+        if len(parts) < 3:
+            raise BookkeepingError("tbl.update_row <idx> k=v ...")
+        idx = int(parts[1])
+        kv = parse_kvs(parts[2:])
+        self.reg.table_update_row(idx, kv)
+        print("Updated row")
+
+    def _cmd_tbl_del_row(self, parts: List[str]):
+        if len(parts) != 2:
+            raise BookkeepingError("tbl.del_row <idx>")
+        self.reg.table_delete_row(int(parts[1]))
+        print("Deleted row")
+
+    def _cmd_tbl_move_row(self, parts: List[str]):
+        if len(parts) != 3:
+            raise BookkeepingError("tbl.move_row <old_idx> <new_idx>")
+        old_idx = int(parts[1])
+        new_idx = int(parts[2])
+        self.reg.table_move_row(old_idx, new_idx)
+        print(f"Moved row {old_idx} -> {new_idx}")
+
+    def _cmd_tbl_set_index(self, parts: List[str]):
+        if len(parts) != 2:
+            raise BookkeepingError("tbl.set_index <col>")
+        self.reg.table_set_index(parts[1])
+        print("Indexed column")
+
+    def _cmd_tbl_unset_index(self, parts: List[str]):
+        if len(parts) != 2:
+            raise BookkeepingError("tbl.unset_index <col>")
+        self.reg.table_unset_index(parts[1])
+        print("Unset index")
+
+    def _cmd_tbl_lookup(self, parts: List[str]):
+        if len(parts) != 3:
+            raise BookkeepingError("tbl.lookup <col> <value>")
+        val = parse_value(parts[2])
+        pprint.pprint(self.reg._current().lookup_by_index(parts[1], val))
+
+    def _cmd_tbl_add_list_col(self, parts: List[str]):
+        if len(parts) != 2:
+            raise BookkeepingError("tbl.add_list_col <col>")
+        self.reg.table_add_list_column(parts[1])
+        print("Added list column")
+
+    def _cmd_tbl_del_list_col(self, parts: List[str]):
+        if len(parts) != 2:
+            raise BookkeepingError("tbl.del_list_col <col>")
+        self.reg.table_del_list_column(parts[1])
+        print("Deleted list column")
+
+    def _cmd_tbl_list_append(self, parts: List[str]):
+        if len(parts) != 4:
+            raise BookkeepingError("tbl.list_append <row> <col> <value>")
+        row = int(parts[1])
+        val = parse_value(parts[3])
+        self.reg.table_list_append(row, parts[2], val)
+        print("Appended to list cell")
+
+    def _cmd_tbl_list_insert(self, parts: List[str]):
+        if len(parts) != 5:
+            raise BookkeepingError("tbl.list_insert <row> <col> <index> <value>")
+        row = int(parts[1])
+        idx = int(parts[3])
+        val = parse_value(parts[4])
+        self.reg.table_list_insert(row, parts[2], idx, val)
+        print("Inserted into list cell")
+
+    def _cmd_tbl_list_update(self, parts: List[str]):
+        if len(parts) != 5:
+            raise BookkeepingError("tbl.list_update <row> <col> <index> <value>")
+        row = int(parts[1])
+        idx = int(parts[3])
+        val = parse_value(parts[4])
+        self.reg.table_list_update(row, parts[2], idx, val)
+        print("Updated list cell")
+
+    def _cmd_tbl_list_del(self, parts: List[str]):
+        if len(parts) != 4:
+            raise BookkeepingError("tbl.list_del <row> <col> <index>")
+        row = int(parts[1])
+        idx = int(parts[3])
+        self.reg.table_list_delete(row, parts[2], idx)
+        print("Deleted list cell item")
+
+    def _cmd_tbl_show_rows(self, parts: List[str]):
+        pprint.pprint(self.reg._current().rows)
+
+    # ---- graph commands (prefix g.) ----
+    def _cmd_g_add_node(self, parts: List[str]):
+        if len(parts) < 2:
+            raise BookkeepingError("g.add_node <node_id> [k=v...]")
+        nid = parts[1]
+        attrs = parse_kvs(parts[2:]) if len(parts) > 2 else {}
+        self.reg.graph_add_node(nid, attrs)
+        print("Added node")
+
+    def _cmd_g_del_node(self, parts: List[str]):
+        if len(parts) != 2:
+            raise BookkeepingError("g.del_node <node_id>")
+        self.reg.graph_del_node(parts[1])
+        print("Deleted node")
+
+    def _cmd_g_update_node(self, parts: List[str]):
+        if len(parts) < 3:
+            raise BookkeepingError("g.update_node <node_id> k=v ...")
+        nid = parts[1]
+        attrs = parse_kvs(parts[2:])
+        self.reg.graph_update_node(nid, attrs)
+        print("Updated node")
+
+    def _cmd_g_add_edge(self, parts: List[str]):
+        if len(parts) < 3:
+            raise BookkeepingError("g.add_edge <from> <to> [k=v...]")
+        frm, to = parts[1], parts[2]
+        meta = parse_kvs(parts[3:]) if len(parts) > 3 else {}
+        self.reg.graph_add_edge(frm, to, meta)
+        print("Added edge")
+
+    def _cmd_g_del_edge(self, parts: List[str]):
+        if len(parts) != 3:
+            raise BookkeepingError("g.del_edge <from> <to>")
+        self.reg.graph_del_edge(parts[1], parts[2])
+        print("Deleted edge")
+
+    def _cmd_g_set_node_index(self, parts: List[str]):
+        if len(parts) != 2:
+            raise BookkeepingError("g.set_node_index <attr>")
+        self.reg.graph_set_node_index(parts[1])
+        print("Indexed node attr")
+
+    def _cmd_g_unset_node_index(self, parts: List[str]):
+        if len(parts) != 2:
+            raise BookkeepingError("g.unset_node_index <attr>")
+        self.reg.graph_unset_node_index(parts[1])
+        print("Unset node index")
+
+    def _cmd_g_lookup_nodes(self, parts: List[str]):
+        if len(parts) != 3:
+            raise BookkeepingError("g.lookup_nodes <attr> <value>")
+        val = parse_value(parts[2])
+        pprint.pprint(self.reg.graph_lookup_nodes(parts[1], val))
+
+    def _cmd_g_show(self, parts: List[str]):
+        # Full adjacency table
+        pprint.pprint(self.reg._current().adj)
+
+    # ---- key-value commands (prefix kv.) ----
+    def _cmd_kv_set(self, parts: List[str]):
+        if len(parts) != 3:
+            raise BookkeepingError("kv.set <key> <value>")
+        val = parse_value(parts[2])
+        self.reg.kv_set(parts[1], val)
+        print("Set key")
+
+    def _cmd_kv_get(self, parts: List[str]):
+        if len(parts) != 2:
+            raise BookkeepingError("kv.get <key>")
+        pprint.pprint(self.reg.kv_get(parts[1]))
+
+    def _cmd_kv_del(self, parts: List[str]):
+        if len(parts) != 2:
+            raise BookkeepingError("kv.del <key>")
+        self.reg.kv_delete(parts[1])
+        print("Deleted key")
+
+    def _cmd_kv_set_index(self, parts: List[str]):
+        if len(parts) != 2:
+            raise BookkeepingError("kv.set_index <key>")
+        self.reg.kv_set_index(parts[1])
+        print("Indexed")
+
+    def _cmd_kv_unset_index(self, parts: List[str]):
+        if len(parts) != 2:
+            raise BookkeepingError("kv.unset_index <key>")
+        self.reg.kv_unset_index(parts[1])
+        print("Unset index")
+
+    def _cmd_kv_lookup(self, parts: List[str]):
+        if len(parts) != 2:
+            raise BookkeepingError("kv.lookup <key>")
+        pprint.pprint(self.reg._current().lookup_by_key(parts[1]))
+
     def handle(self, line: str):
         parts = shlex.split(line)
         if not parts:
             return
         cmd = parts[0].lower()
-        if cmd == "help":
-            print(HELP)
-            return
-        if cmd in ("exit", "quit"):
-            self.running = False
-            print("Bye.")
-            return
-        if cmd == "info":
-            print("root id:", self.reg.root_id)
-            print("current id:", self.reg.current_element_id)
-            print("path stack:", self.reg.path_stack)
-            return
-        if cmd == "history":
-            for h in self.reg.list_history():
-                print(h)
-            return
-        if cmd == "undo":
-            self.reg.undo()
-            print("Undone")
-            return
-        if cmd == "redo":
-            self.reg.redo()
-            print("Redone")
-            return
-
-        if cmd == "create":
-            # create <type> <name> [<slot_pos>]
-            if len(parts) < 3:
-                raise BookkeepingError("create <type> <name> [<slot_pos>]")
-            etype = parts[1]
-            name = parts[2]
-            slot = None
-            if len(parts) >= 4:
-                slot = int(parts[3])
-            eid, used = self.reg.create_element(etype, name, slot_pos=slot)
-            print("Created", eid, "in slot", used)
-            return
-
-        if cmd == "createref":
-            # createref [<slot_pos>] <element_id>
-            if len(parts) not in (2,3):
-                raise BookkeepingError("createref [<slot_pos>] <element_id>")
-            if len(parts) == 2:
-                slot = None
-                eid = self._resolve(parts[1])
-            else:
-                slot = int(parts[1])
-                eid = self._resolve(parts[2])
-            used = self.reg.createref(slot, eid)
-            print("Created ref to", eid, "in slot", used)
-            return
-
-        if cmd == "updateref":
-            if len(parts) != 3:
-                raise BookkeepingError("updateref <slot_pos> <new_element_id>")
-            pos = int(parts[1])
-            new_eid = self._resolve(parts[2])
-            self.reg.updateref(pos, new_eid)
-            print("Updated slot", pos, "->", new_eid)
-            return
-
-        if cmd == "deleteref":
-            if len(parts) != 2:
-                raise BookkeepingError("deleteref <slot_pos>")
-            pos = int(parts[1])
-            self.reg.deleteref(pos)
-            print("Cleared slot", pos)
-            return
-
-        if cmd == "delete":
-            if len(parts) != 2:
-                raise BookkeepingError("delete <slot_pos>")
-            pos = int(parts[1])
-            self.reg.delete(pos)
-            print("Deleted element at slot", pos)
-            return
-
-        if cmd == "list":
-            cur = self.reg._current()
-            print("Slots from current element (position -> id (type name) ):")
-            for i, v in enumerate(cur.refs):
-                el = self.reg.elements.get(v) if v else None
-                if el:
-                    print(f"  {i} -> {v} ({el.type} '{el.name}')")
-                else:
-                    print(f"  {i} -> {v} (empty)")
-            return
-
-        if cmd == "inspect":
-            if len(parts) != 2:
-                raise BookkeepingError("inspect <slot_pos>")
-            pos = int(parts[1])
-            cur = self.reg._current()
-            if pos < 0 or pos >= len(cur.refs):
-                raise BookkeepingError("pos not in current slots")
-            eid = cur.refs[pos]
-            if eid == 0:
-                raise BookkeepingError("slot empty")
-            el = self.reg.elements.get(eid)
-            if not el:
-                raise BookkeepingError("Referenced element missing")
-            pprint.pprint(el.to_serializable())
-            return
-
-        if cmd == "descend":
-            if len(parts) != 2:
-                raise BookkeepingError("descend <slot_pos>")
-            pos = int(parts[1])
-            self.reg.descend(pos)
-            print("Descended into slot", pos)
-            return
-
-        if cmd in ("ascend", "up"):
-            self.reg.ascend()
-            print("Ascended. Current path:", self.reg.path_stack)
-            return
-
-        if cmd == "save":
-            if len(parts) != 2:
-                raise BookkeepingError("save <file>")
-            self.reg.save_to_file(parts[1])
-            print("Saved to", parts[1])
-            return
-
-        if cmd == "load":
-            if len(parts) != 2:
-                raise BookkeepingError("load <file>")
-            self.reg.load_from_file(parts[1])
-            print("Loaded from", parts[1])
+        handler = self._handlers.get(cmd)
+        if handler is not None:
+            handler(parts)
             return
 
         cur_el = self.reg._current()
 
-        # Table commands
-        if cmd.startswith("tbl.") and isinstance(cur_el, Table):
-            sub = cmd.split(".", 1)[1]
-            if sub == "add_col":
-                if len(parts) != 2:
-                    raise BookkeepingError("tbl.add_col <col>")
-                self.reg.table_add_column(parts[1])
-                print("Added column")
-                return
-            if sub == "del_col":
-                if len(parts) != 2:
-                    raise BookkeepingError("tbl.del_col <col>")
-                self.reg.table_del_column(parts[1])
-                print("Deleted column")
-                return
-            if sub == "insert_row":
-                kv = parse_kvs(parts[1:])
-                idx = self.reg.table_insert_row(kv)
-                print("Inserted row", idx)
-                return
-            if sub == "update_row":
-                if len(parts) < 3:
-                    raise BookkeepingError("tbl.update_row <idx> k=v ...")
-                idx = int(parts[1])
-                kv = parse_kvs(parts[2:])
-                self.reg.table_update_row(idx, kv)
-                print("Updated row")
-                return
-            if sub == "del_row":
-                if len(parts) != 2:
-                    raise BookkeepingError("tbl.del_row <idx>")
-                self.reg.table_delete_row(int(parts[1]))
-                print("Deleted row")
-                return
-            if sub == "move_row":
-                if len(parts) != 3:
-                    raise BookkeepingError("tbl.move_row <old_idx> <new_idx>")
-                old_idx = int(parts[1])
-                new_idx = int(parts[2])
-                self.reg.table_move_row(old_idx, new_idx)
-                print(f"Moved row {old_idx} -> {new_idx}")
-                return
-            if sub == "set_index":
-                if len(parts) != 2:
-                    raise BookkeepingError("tbl.set_index <col>")
-                self.reg.table_set_index(parts[1])
-                print("Indexed column")
-                return
-            if sub == "unset_index":
-                if len(parts) != 2:
-                    raise BookkeepingError("tbl.unset_index <col>")
-                self.reg.table_unset_index(parts[1])
-                print("Unset index")
-                return
-            if sub == "lookup":
-                if len(parts) != 3:
-                    raise BookkeepingError("tbl.lookup <col> <value>")
-                val = parse_value(parts[2])
-                pprint.pprint(self.reg._current().lookup_by_index(parts[1], val))
-                return
-
-            if sub == "add_list_col":
-                if len(parts) != 2:
-                    raise BookkeepingError("tbl.add_list_col <col>")
-                self.reg.table_add_list_column(parts[1])
-                print("Added list column")
-                return
-            if sub == "del_list_col":
-                if len(parts) != 2:
-                    raise BookkeepingError("tbl.del_list_col <col>")
-                self.reg.table_del_list_column(parts[1])
-                print("Deleted list column")
-                return
-            if sub == "list_append":
-                if len(parts) != 4:
-                    raise BookkeepingError("tbl.list_append <row> <col> <value>")
-                row = int(parts[1])
-                val = parse_value(parts[3])
-                self.reg.table_list_append(row, parts[2], val)
-                print("Appended to list cell")
-                return
-            if sub == "list_insert":
-                if len(parts) != 5:
-                    raise BookkeepingError("tbl.list_insert <row> <col> <index> <value>")
-                row = int(parts[1])
-                idx = int(parts[3])
-                val = parse_value(parts[4])
-                self.reg.table_list_insert(row, parts[2], idx, val)
-                print("Inserted into list cell")
-                return
-            if sub == "list_update":
-                if len(parts) != 5:
-                    raise BookkeepingError("tbl.list_update <row> <col> <index> <value>")
-                row = int(parts[1])
-                idx = int(parts[3])
-                val = parse_value(parts[4])
-                self.reg.table_list_update(row, parts[2], idx, val)
-                print("Updated list cell")
-                return
-            if sub == "list_del":
-                if len(parts) != 4:
-                    raise BookkeepingError("tbl.list_del <row> <col> <index>")
-                row = int(parts[1])
-                idx = int(parts[3])
-                self.reg.table_list_delete(row, parts[2], idx)
-                print("Deleted list cell item")
-                return
-
-            if sub == "show_rows":
-                pprint.pprint(cur_el.rows)
-                return
-            raise BookkeepingError("Unknown tbl command")
-
-        # Graph commands (prefix g.)
-        if cmd.startswith("g.") and isinstance(cur_el, Graph):
-            sub = cmd.split(".", 1)[1]
-            if sub == "add_node":
-                if len(parts) < 2:
-                    raise BookkeepingError("g.add_node <node_id> [k=v...]")
-                nid = parts[1]
-                attrs = parse_kvs(parts[2:]) if len(parts) > 2 else {}
-                self.reg.graph_add_node(nid, attrs)
-                print("Added node")
-                return
-            if sub == "del_node":
-                if len(parts) != 2:
-                    raise BookkeepingError("g.del_node <node_id>")
-                self.reg.graph_del_node(parts[1])
-                print("Deleted node")
-                return
-            if sub == "update_node":
-                if len(parts) < 3:
-                    raise BookkeepingError("g.update_node <node_id> k=v ...")
-                nid = parts[1]
-                attrs = parse_kvs(parts[2:])
-                self.reg.graph_update_node(nid, attrs)
-                print("Updated node")
-                return
-            if sub == "add_edge":
-                if len(parts) < 3:
-                    raise BookkeepingError("g.add_edge <from> <to> [k=v...]")
-                frm, to = parts[1], parts[2]
-                meta = parse_kvs(parts[3:]) if len(parts) > 3 else {}
-                self.reg.graph_add_edge(frm, to, meta)
-                print("Added edge")
-                return
-            if sub == "del_edge":
-                if len(parts) != 3:
-                    raise BookkeepingError("g.del_edge <from> <to>")
-                self.reg.graph_del_edge(parts[1], parts[2])
-                print("Deleted edge")
-                return
-            if sub == "set_node_index":
-                if len(parts) != 2:
-                    raise BookkeepingError("g.set_node_index <attr>")
-                self.reg.graph_set_node_index(parts[1])
-                print("Indexed node attr")
-                return
-            if sub == "unset_node_index":
-                if len(parts) != 2:
-                    raise BookkeepingError("g.unset_node_index <attr>")
-                self.reg.graph_unset_node_index(parts[1])
-                print("Unset node index")
-                return
-            if sub == "lookup_nodes":
-                if len(parts) != 3:
-                    raise BookkeepingError("g.lookup_nodes <attr> <value>")
-                val = parse_value(parts[2])
-                pprint.pprint(self.reg.graph_lookup_nodes(parts[1], val))
-                return
-            if sub == "show":
-                # Full adjacency table
-                pprint.pprint(cur_el.adj)
-                return
-        raise BookkeepingError("Unknown g command")
-
-
-        # KVP commands (prefix kv.)
-        if cmd.startswith("kv.") and isinstance(cur_el, KeyValuePair):
-            sub = cmd.split(".", 1)[1]
-            if sub == "set":
-                if len(parts) != 3:
-                    raise BookkeepingError("kv.set <key> <value>")
-                val = parse_value(parts[2])
-                self.reg.kv_set(parts[1], val)
-                print("Set key")
-                return
-            if sub == "get":
-                if len(parts) != 2:
-                    raise BookkeepingError("kv.get <key>")
-                pprint.pprint(self.reg.kv_get(parts[1]))
-                return
-            if sub == "del":
-                if len(parts) != 2:
-                    raise BookkeepingError("kv.del <key>")
-                self.reg.kv_delete(parts[1])
-                print("Deleted key")
-                return
-            if sub == "set_index":
-                if len(parts) != 2:
-                    raise BookkeepingError("kv.set_index <key>")
-                self.reg.kv_set_index(parts[1])
-                print("Indexed")
-                return
-            if sub == "unset_index":
-                if len(parts) != 2:
-                    raise BookkeepingError("kv.unset_index <key>")
-                self.reg.kv_unset_index(parts[1])
-                print("Unset index")
-                return
-            if sub == "lookup":
-                if len(parts) != 2:
-                    raise BookkeepingError("kv.lookup <key>")
-                pprint.pprint(self.reg._current().lookup_by_key(parts[1]))
-                return
-            raise BookkeepingError("Unknown kv command")
-
-        if cmd == "show":
-            print(cur_el.info())
-            return
-        if cmd == "to_dict":
-            pprint.pprint(cur_el.to_serializable())
+        # Element-specific commands: the prefix picks the table, the rest the handler
+        prefix, dot, sub = cmd.partition(".")
+        entry = self._prefix_handlers.get(prefix) if dot else None
+        if entry is not None and entry[0] == cur_el.TYPE_CODE:
+            handler = entry[1].get(sub)
+            if handler is None:
+                raise BookkeepingError(f"Unknown {prefix} command")
+            handler(parts)
             return
 
         raise BookkeepingError("Unknown command or invalid for current element")
@@ -1827,7 +2274,7 @@ def _demo():
     tid, tpos = r.create_element("table", "mytable")
     print("created table:", tid, "in slot", tpos)
     r.ascend()
-    print("at root, slots:", r._current().refs)
+    print("at root, slots:", list(r._current().refs))
     r.save_to_file("demo_all_changes.bin")
     print("saved demo_all_changes.bin")
     r2 = ElementRegistry()
@@ -1,25 +1,36 @@
 ﻿#!/usr/bin/env python3
 from __future__ import annotations
+import base64
+import functools
+import heapq
 import json
+import re
 import shlex
 import os
 import struct
+import sys
+import zlib
+from collections import deque
+from contextlib import contextmanager
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional, Tuple
 from abc import ABC, abstractmethod
+from array import array
 import pprint
 from pprint import pformat
 
 from enum import Enum, auto
 import curses
 import locale
-from typing import Callable, Final, List, Optional, Tuple, Protocol, runtime_checkable
+from typing import Callable, Final, Iterator, List, Optional, Tuple, Protocol, runtime_checkable
+from itertools import islice
 
 # ---- constants ----
 FILE_MAGIC = b"BKUP_V3\0"  # 8 bytes (padded/truncated)
 FILE_VERSION = 3
 U32 = "<I"  # little-endian unsigned 4 bytes
 U64 = "<Q"  # unsigned 8 bytes (if needed)
+HISTORY_HOT_DELTAS = 16  # newest deltas keep plain before/after dicts; older ones are zlib-packed
 
 # ---- exceptions ----
 class BookkeepingError(Exception):
@@ -35,42 +46,128 @@ class IndexPointer:
         return f"<IndexPointer {self.target_element_id}::{self.target_index_key}>"
 
 # ---- JSON helpers for internals (we still use JSON for complex structures) ----
-def _serialize(obj: Any) -> Any:
+# dispatch on the exact type(); subclasses (OrderedDict, namedtuple, ...) miss the table and take the isinstance path
+def _identity(obj: Any) -> Any:
+    return obj
+
+def _ser_dict(obj: dict) -> Dict[str, Any]:
+    ser = _serialize
+    return {str(k): ser(v) for k, v in obj.items()}
+
+def _ser_list(obj) -> List[Any]:
+    ser = _serialize
+    return [ser(v) for v in obj]
+
+def _ser_fallback(obj: Any) -> Any:
     if isinstance(obj, IndexPointer):
-        return {"__IndexPointer__": True,
-                "target_element_id": obj.target_element_id,
-                "target_index_key": obj.target_index_key}
+        return _SER[IndexPointer](obj)
     if isinstance(obj, dict):
-        return {str(k): _serialize(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [_serialize(v) for v in obj]
-    if isinstance(obj, tuple):
-        return [_serialize(v) for v in obj]
+        return _ser_dict(obj)
+    if isinstance(obj, (list, tuple)):
+        return _ser_list(obj)
     return obj
 
+_SER: Dict[type, Callable[[Any], Any]] = {
+    str: _identity, int: _identity, float: _identity, bool: _identity, type(None): _identity,
+    IndexPointer: lambda ip: {"__IndexPointer__": True,
+                              "target_element_id": ip.target_element_id,
+                              "target_index_key": ip.target_index_key},
+    dict: _ser_dict,
+    list: _ser_list,
+    tuple: _ser_list,
+}
+
+def _serialize(obj: Any) -> Any:
+    return _SER.get(type(obj), _ser_fallback)(obj)
+
+def _de_dict(obj: dict) -> Any:
+    if obj.get("__IndexPointer__"):
+        return IndexPointer(int(obj["target_element_id"]), obj["target_index_key"])
+    de = _deserialize
+    return {k: de(v) for k, v in obj.items()}
+
+def _de_list(obj: list) -> List[Any]:
+    de = _deserialize
+    return [de(v) for v in obj]
+
+# json.loads only produces these container types
+_DE: Dict[type, Callable[[Any], Any]] = {dict: _de_dict, list: _de_list}
+
 def _deserialize(obj: Any) -> Any:
-    if isinstance(obj, dict):
-        if obj.get("__IndexPointer__"):
-            return IndexPointer(int(obj["target_element_id"]), obj["target_index_key"])
-        return {k: _deserialize(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [_deserialize(v) for v in obj]
-    return obj
+    return _DE.get(type(obj), _identity)(obj)
+
+# ---- packed uint32 blocks (refs in save files) ----
+_NATIVE_LE_U32 = array("I").itemsize == 4 and sys.byteorder == "little"
+
+def _pack_u32(values: array) -> str:
+    raw = values.tobytes() if _NATIVE_LE_U32 else struct.pack(f"<{len(values)}I", *values)
+    return base64.b64encode(raw).decode("ascii")
+
+def _unpack_u32(text: str) -> array:
+    raw = base64.b64decode(text)
+    if _NATIVE_LE_U32:
+        out = array("I")
+        out.frombytes(raw)  # one C-level copy, no per-slot int()
+        return out
+    return array("I", (v for (v,) in struct.iter_unpack("<I", raw)))
 
 # ---- Element base ----
+def _mutates(method):
+    """Mark an Element method as changing serialized state: bumps _rev and drops the cached to_serializable()."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._rev += 1
+        self._cached_serial = None
+        return method(self, *args, **kwargs)
+    return wrapper
+
 class Element(ABC):
     TYPE_CODE = "NULL"
     def __init__(self, name: str, element_id: Optional[int] = None):
         self.id: int = element_id if element_id is not None else -1
         self.name: str = name
         self.type: str = self.__class__.__name__
-        # refs: stable slots list; 0 = empty, otherwise element id
-        self.refs: List[int] = []
+        # refs: stable slots list; 0 = empty, otherwise element id (packed uint32s)
+        self.refs: array = array("I")
+        # min-heap of empty slot positions; may hold stale entries, checked when read
+        self._free_slots: List[int] = []
+        # bumped by every @_mutates method; the last to_serializable() result is reused until then
+        self._rev: int = 0
+        self._cached_serial: Optional[Dict[str, Any]] = None
+        # (rev, encoded to_file_serializable()) from the last save
+        self._file_json: Optional[Tuple[int, str]] = None
 
-    @abstractmethod
     def to_serializable(self) -> Dict[str, Any]:
+        """Serialized snapshot, shared between calls until the element changes; treat it as read-only."""
+        data = self._cached_serial
+        if data is None:
+            data = self._cached_serial = self._build_serial()
+        return data
+
+    @abstractmethod
+    def _build_serial(self) -> Dict[str, Any]:
         pass
 
+    def to_file_serializable(self) -> Dict[str, Any]:
+        """Form written by save_to_file; from_serializable accepts it as well as to_serializable()."""
+        data = self.to_serializable()
+        n = data["refs_len"]
+        # mostly-occupied slot lists go to disk as one base64 block of little-endian uint32s
+        if len(data["refs_sparse"]) * 2 <= n:
+            return data
+        packed = {k: v for k, v in data.items() if k not in ("refs_len", "refs_sparse")}
+        packed["refs_packed"] = _pack_u32(self.refs)
+        return packed
+
+    def file_json(self) -> str:
+        """to_file_serializable() encoded as compact JSON, re-encoded only after the element changes."""
+        cached = self._file_json
+        if cached is not None and cached[0] == self._rev:
+            return cached[1]
+        text = json.dumps(self.to_file_serializable(), separators=(",", ":"), ensure_ascii=False)
+        self._file_json = (self._rev, text)
+        return text
+
     @abstractmethod
     def from_serializable(self, data: Dict[str, Any]):
         pass
@@ -83,6 +180,85 @@ class Element(ABC):
     def has_index_key(self, key: str) -> bool:
         pass
 
+    # refs are mostly empty slots: store only the occupied ones plus the slot count
+    def _refs_to_serializable(self) -> Dict[str, Any]:
+        return {
+            "refs_len": len(self.refs),
+            "refs_sparse": {str(i): v for i, v in enumerate(self.refs) if v},
+        }
+
+    def _refs_from_serializable(self, data: Dict[str, Any]):
+        if "refs_packed" in data:
+            self.refs = _unpack_u32(data["refs_packed"])
+            self._rebuild_free_slots()
+            return
+        if "refs_sparse" not in data:
+            # older saves carry the full slot list
+            self.refs = array("I", [int(x) for x in data.get("refs", [])])
+            self._rebuild_free_slots()
+            return
+        refs = array("I", [0]) * int(data.get("refs_len", 0))
+        for pos, v in data["refs_sparse"].items():
+            refs[int(pos)] = int(v)
+        self.refs = refs
+        self._rebuild_free_slots()
+
+    # ---- slot helpers: every write of an empty slot goes through these to keep _free_slots complete ----
+    def _rebuild_free_slots(self):
+        # ascending positions already form a valid heap
+        self._free_slots = [i for i, v in enumerate(self.refs) if v == 0]
+
+    def first_free_slot(self) -> Optional[int]:
+        """Lowest empty slot position, or None when every slot is occupied."""
+        self._drop_filled_slots()
+        heap = self._free_slots
+        return heap[0] if heap else None
+
+    def _drop_filled_slots(self):
+        # pop entries off the top of the heap whose slot was filled (or truncated) since it was freed
+        heap = self._free_slots
+        refs = self.refs
+        while heap:
+            pos = heap[0]
+            if pos < len(refs) and refs[pos] == 0:
+                return
+            heapq.heappop(heap)
+
+    def _push_free_slot(self, pos: int):
+        heap = self._free_slots
+        heapq.heappush(heap, pos)
+        # stale entries below the top are only dropped when they surface; if they pile
+        # up (slots filled and freed by position), rebuild so the heap stays O(len(refs))
+        if len(heap) > 2 * len(self.refs) + 8:
+            self._rebuild_free_slots()
+
+    @_mutates
+    def set_slot(self, pos: int, target: int):
+        """Point slot pos at target, padding with empty slots when pos is past the end."""
+        refs = self.refs
+        if pos >= len(refs):
+            for i in range(len(refs), pos):
+                heapq.heappush(self._free_slots, i)
+            refs.extend(array("I", [0]) * (pos - len(refs)))
+            refs.append(target)
+        else:
+            refs[pos] = target
+        if target == 0:
+            self._push_free_slot(pos)
+        else:
+            # consuming the lowest free slot: take its entry off the heap now
+            self._drop_filled_slots()
+
+    @_mutates
+    def clear_slot(self, pos: int):
+        self.refs[pos] = 0
+        self._push_free_slot(pos)
+
+    @_mutates
+    def truncate_slots(self, length: int):
+        # only called with empty slots past length; their stale heap entries are skipped on read
+        del self.refs[length:]
+
     def info(self) -> str:
         # show positions count and number of non-empty refs
         non_empty = sum(1 for r in self.refs if r)
@@ -92,6 +268,27 @@ class Element(ABC):
         return f"<{self.type} id={self.id} name={self.name}>"
 
 # ---- Table Element ----
+def _compile_row_builder(columns: List[str], list_columns: List[str]) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """Specialize insert_row's validate-and-fill for one column layout.
+
+    Builds e.g. `lambda r: {'a': r.get('a'), 'L': r['L'] if 'L' in r else []}` plus the unknown-key
+    check, with the column names baked in as literals (repr keeps arbitrary names safe).
+    """
+    fields = []
+    for c in columns:
+        lit = repr(c)
+        fields.append(f"{lit}: r[{lit}] if {lit} in r else []" if c in list_columns else f"{lit}: r.get({lit})")
+    src = (
+        "def build(r):\n"
+        "    for k in r:\n"
+        "        if k not in known:\n"
+        "            raise BookkeepingError(f'Unknown column {k}')\n"
+        f"    return {{{', '.join(fields)}}}\n"
+    )
+    ns: Dict[str, Any] = {"known": frozenset(columns), "BookkeepingError": BookkeepingError}
+    exec(src, ns)
+    return ns["build"]
+
 class Table(Element):
     TYPE_CODE = "Table"
     def __init__(self, name: str, columns: Optional[List[str]] = None, element_id: Optional[int] = None):
@@ -99,20 +296,45 @@ class Table(Element):
         self.columns: List[str] = columns[:] if columns else []
         self.rows: List[Dict[str, Any]] = []
         self.indexed_columns: List[str] = []
-        self.index_maps: Dict[str, Dict[Any, List[int]]] = {}
+        # column -> value -> row positions; postings are dicts used as insertion-ordered sets (O(1) removal)
+        self.index_maps: Dict[str, Dict[Any, Dict[int, None]]] = {}
         self.list_columns: List[str] = []  # NEW: columns storing lists
+        # insert_row's compiled row builder; None until first use and whenever the columns change
+        self._insert_fn: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None
 
-    def add_column(self, col_name: str):
+    # --- validators: raise before any mutation so callers can check up front ---
+    def _validate_new_column(self, col_name: str):
         if col_name in self.columns:
             raise BookkeepingError("Column exists")
+
+    def _validate_column(self, col_name: str):
+        if col_name not in self.columns:
+            raise BookkeepingError("No such column")
+
+    def _validate_row_index(self, row_idx: int, msg: str = "Row index out of range"):
+        if row_idx < 0 or row_idx >= len(self.rows):
+            raise BookkeepingError(msg)
+
+    def _validate_row_keys(self, row: Dict[str, Any]):
+        for k in row:
+            if k not in self.columns:
+                raise BookkeepingError(f"Unknown column {k}")
+
+    @_mutates
+    def add_column(self, col_name: str):
+        self._validate_new_column(col_name)
+        # interned: every row dict keys on this same string object
+        col_name = sys.intern(col_name)
         self.columns.append(col_name)
+        self._insert_fn = None
         for r in self.rows:
             r[col_name] = None
 
+    @_mutates
     def del_column(self, col_name: str):
-        if col_name not in self.columns:
-            raise BookkeepingError("No such column")
+        self._validate_column(col_name)
         self.columns.remove(col_name)
+        self._insert_fn = None
         for r in self.rows:
             r.pop(col_name, None)
         if col_name in self.indexed_columns:
@@ -120,88 +342,125 @@ class Table(Element):
             self.index_maps.pop(col_name, None)
 
 
+    @_mutates
     def add_list_column(self, col_name: str):
-        if col_name in self.columns:
-            raise BookkeepingError("Column exists")
+        self._validate_new_column(col_name)
+        col_name = sys.intern(col_name)
         self.columns.append(col_name)
         self.list_columns.append(col_name)
+        self._insert_fn = None
         for r in self.rows:
             r[col_name] = []
 
+    @_mutates
     def del_list_column(self, col_name: str):
-        if col_name not in self.columns:
-            raise BookkeepingError("No such column")
+        self._validate_column(col_name)
         self.columns.remove(col_name)
         if col_name in self.list_columns:
             self.list_columns.remove(col_name)
+        self._insert_fn = None
         for r in self.rows:
             r.pop(col_name, None)
 
+    @_mutates
     def insert_row(self, row: Dict[str, Any]) -> int:
-        new_row = {}
-        for c in self.columns:
-            if c in self.list_columns:
-                new_row[c] = []
-            else:
-                new_row[c] = None
-        for k, v in row.items():
-            if k not in self.columns:
-                raise BookkeepingError(f"Unknown column {k}")
-            new_row[k] = v
+        build = self._insert_fn
+        if build is None:
+            build = self._insert_fn = _compile_row_builder(self.columns, self.list_columns)
+        new_row = build(row)
         self.rows.append(new_row)
         idx = len(self.rows) - 1
         for col in self.indexed_columns:
             self.index_maps.setdefault(col, {})
             val = new_row.get(col)
-            self.index_maps[col].setdefault(val, []).append(idx)
+            self.index_maps[col].setdefault(val, {})[idx] = None
         return idx
 
+    @_mutates
     def update_row(self, row_idx: int, updates: Dict[str, Any]):
-        if row_idx < 0 or row_idx >= len(self.rows):
-            raise BookkeepingError("Row index out of range")
+        self._validate_row_index(row_idx)
+        self._validate_row_keys(updates)
         row = self.rows[row_idx]
         for k, v in updates.items():
-            if k not in self.columns:
-                raise BookkeepingError(f"Unknown column {k}")
             old = row.get(k)
             row[k] = v
             if k in self.indexed_columns:
                 imap = self.index_maps.setdefault(k, {})
-                if old in imap:
-                    try:
-                        imap[old].remove(row_idx)
-                        if not imap[old]:
-                            del imap[old]
-                    except ValueError:
-                        pass
-                imap.setdefault(v, []).append(row_idx)
-
+                idxs = imap.get(old)
+                if idxs is not None:
+                    idxs.pop(row_idx, None)
+                    if not idxs:
+                        del imap[old]
+                imap.setdefault(v, {})[row_idx] = None
+
+    @_mutates
     def delete_row(self, row_idx: int):
-        if row_idx < 0 or row_idx >= len(self.rows):
-            raise BookkeepingError("Row index out of range")
-        self.rows.pop(row_idx)
-        self._rebuild_indexes()
-
+        self._validate_row_index(row_idx)
+        row = self.rows.pop(row_idx)
+        if not self.indexed_columns:
+            return
+        if len(self.rows) - row_idx > len(self.rows) // 2:
+            self._rebuild_indexes()
+            return
+        # only rows after row_idx changed position: drop the deleted one from its posting,
+        # then slide the postings of the values in the tail one step down
+        tail = self.rows[row_idx:]
+        for col in self.indexed_columns:
+            imap = self.index_maps.setdefault(col, {})
+            val = row.get(col)
+            idxs = imap.get(val)
+            if idxs is not None and row_idx in idxs:
+                del idxs[row_idx]
+                if not idxs:
+                    del imap[val]
+            for v in {r.get(col) for r in tail}:
+                idxs = imap.get(v)
+                if idxs is not None:
+                    imap[v] = {i - 1 if i > row_idx else i: None for i in idxs}
+
+    def _validate_move(self, old_index: int, new_index: int):
+        self._validate_row_index(old_index, "Old row index out of range")
+        self._validate_row_index(new_index, "New row index out of range")
+
+    @_mutates
     def move_row(self, old_index: int, new_index: int):
-        if old_index < 0 or old_index >= len(self.rows):
-            raise BookkeepingError("Old row index out of range")
-        if new_index < 0 or new_index >= len(self.rows):
-            raise BookkeepingError("New row index out of range")
+        self._validate_move(old_index, new_index)
         row = self.rows.pop(old_index)
         self.rows.insert(new_index, row)
-        self._rebuild_indexes()
-
+        if old_index == new_index or not self.indexed_columns:
+            return
+        lo, hi = sorted((old_index, new_index))
+        if hi - lo > len(self.rows) // 2:
+            self._rebuild_indexes()
+            return
+        # only rows lo..hi changed position: the moved row jumps to new_index,
+        # the rest of the window slides one step toward old_index
+        step = -1 if old_index < new_index else 1
+        def moved(p: int) -> int:
+            if p == old_index:
+                return new_index
+            return p + step if lo <= p <= hi else p
+        window = self.rows[lo:hi + 1]
+        for col in self.indexed_columns:
+            imap = self.index_maps.setdefault(col, {})
+            for val in {r.get(col) for r in window}:
+                idxs = imap.get(val)
+                if idxs is not None:
+                    # postings stay in ascending row order, as a full rebuild leaves them
+                    imap[val] = dict.fromkeys(sorted(moved(p) for p in idxs))
+
+    @_mutates
     def set_index_column(self, col_name: str):
-        if col_name not in self.columns:
-            raise BookkeepingError("No such column")
+        self._validate_column(col_name)
         if col_name not in self.indexed_columns:
             self.indexed_columns.append(col_name)
-        m: Dict[Any, List[int]] = {}
+        m: Dict[Any, Dict[int, None]] = {}
         for i, r in enumerate(self.rows):
             val = r.get(col_name)
-            m.setdefault(val, []).append(i)
+            m.setdefault(val, {})[i] = None
         self.index_maps[col_name] = m
 
+    @_mutates
     def unset_index_column(self, col_name: str):
         if col_name in self.indexed_columns:
             self.indexed_columns.remove(col_name)
@@ -210,43 +469,47 @@ class Table(Element):
     def lookup_by_index(self, col_name: str, value: Any) -> List[Dict[str, Any]]:
         if col_name not in self.indexed_columns:
             raise BookkeepingError("Column not indexed")
-        idxs = self.index_maps.get(col_name, {}).get(value, [])
+        idxs = self.index_maps.get(col_name, {}).get(value, ())
         return [self.rows[i] for i in idxs]
 
 
     def _validate_list_cell(self, row_idx: int, col: str):
         if col not in self.list_columns:
             raise BookkeepingError(f"Column {col} is not a list column")
-        if row_idx < 0 or row_idx >= len(self.rows):
-            raise BookkeepingError("Row index out of range")
+        self._validate_row_index(row_idx)
         if not isinstance(self.rows[row_idx][col], list):
             raise BookkeepingError(f"Cell {row_idx}:{col} is not a list")
 
+    def _validate_list_item(self, row_idx: int, col: str, index: int):
+        self._validate_list_cell(row_idx, col)
+        if index < 0 or index >= len(self.rows[row_idx][col]):
+            raise BookkeepingError("List index out of range")
+
+    @_mutates
     def append_to_list_cell(self, row_idx: int, col: str, value: Any):
         self._validate_list_cell(row_idx, col)
         self.rows[row_idx][col].append(value)
 
+    @_mutates
     def insert_into_list_cell(self, row_idx: int, col: str, index: int, value: Any):
         self._validate_list_cell(row_idx, col)
         self.rows[row_idx][col].insert(index, value)
 
+    @_mutates
     def update_list_cell_item(self, row_idx: int, col: str, index: int, value: Any):
-        self._validate_list_cell(row_idx, col)
-        if index < 0 or index >= len(self.rows[row_idx][col]):
-            raise BookkeepingError("List index out of range")
+        self._validate_list_item(row_idx, col, index)
         self.rows[row_idx][col][index] = value
 
+    @_mutates
     def delete_list_cell_item(self, row_idx: int, col: str, index: int):
-        self._validate_list_cell(row_idx, col)
-        if index < 0 or index >= len(self.rows[row_idx][col]):
-            raise BookkeepingError("List index out of range")
+        self._validate_list_item(row_idx, col, index)
         del self.rows[row_idx][col][index]
 
     def _rebuild_indexes(self):
         for col in list(self.indexed_columns):
             self.set_index_column(col)
 
-    def to_serializable(self) -> Dict[str, Any]:
+    def _build_serial(self) -> Dict[str, Any]:
         return {
             "id": self.id,
             "name": self.name,
@@ -255,17 +518,36 @@ class Table(Element):
             "rows": _serialize(self.rows),
             "indexed_columns": list(self.indexed_columns),
             "list_columns": list(self.list_columns),  # NEW
-            "refs": list(self.refs),
+            **self._refs_to_serializable(),
         }
 
+    # on disk, rows whose keys are exactly `columns` are written as value lists in column order,
+    # so a column name is stored once per table instead of once per row
+    def to_file_serializable(self) -> Dict[str, Any]:
+        data = super().to_file_serializable()
+        cols = data["columns"]
+        col_set = set(cols)
+        rows = data["rows"]
+        if not all(len(r) == len(cols) and r.keys() == col_set for r in rows):
+            return data
+        packed = {k: v for k, v in data.items() if k != "rows"}
+        packed["row_values"] = [[r[c] for c in cols] for r in rows]
+        return packed
+
+    @_mutates
     def from_serializable(self, data: Dict[str, Any]):
         self.id = int(data["id"])
         self.name = data.get("name", self.name)
-        self.columns = list(data.get("columns", []))
-        self.rows = _deserialize(data.get("rows", []))
-        self.indexed_columns = list(data.get("indexed_columns", []))
-        self.list_columns = list(data.get("list_columns", []))  # NEW
-        self.refs = [int(x) for x in data.get("refs", [])]
+        self.columns = [sys.intern(c) for c in data.get("columns", [])]
+        if "row_values" in data:
+            cols = self.columns
+            self.rows = [dict(zip(cols, _deserialize(vals))) for vals in data["row_values"]]
+        else:
+            self.rows = _deserialize(data.get("rows", []))
+        self.indexed_columns = [sys.intern(c) for c in data.get("indexed_columns", [])]
+        self.list_columns = [sys.intern(c) for c in data.get("list_columns", [])]  # NEW
+        self._insert_fn = None
+        self._refs_from_serializable(data)
         self._rebuild_indexes()
 
     def list_indexable(self) -> List[str]:
@@ -286,6 +568,21 @@ class UnorderedTable(Table):
     pass
 
 # ---- Graph Element ----
+@dataclass
+class GraphCSR:
+    """Compressed-sparse-row snapshot of Graph.adj.
+
+    Edges of node_ids[i] are edge_target[offset[i]:offset[i + 1]] (indexes into node_ids) with
+    matching edge_meta entries; rev_offset/rev_source hold the same for incoming edges.
+    node_ids may run past the graph's nodes when a loaded edge points at a missing node.
+    """
+    node_ids: List[str]
+    offset: array
+    edge_target: array
+    edge_meta: List[Dict[str, Any]]
+    rev_offset: array
+    rev_source: array
+
 class Graph(Element):
     TYPE_CODE = "Graph"
 
@@ -294,76 +591,109 @@ class Graph(Element):
         # adjacency table: node_id -> {"attrs": { ... }, "edges": {target_id: {meta...}}}
         self.adj: Dict[str, Dict[str, Any]] = {}
         self.indexed_node_attrs: List[str] = []
-        self.node_index_maps: Dict[str, Dict[Any, List[str]]] = {}
+        # attr -> value -> node ids, as insertion-ordered dict sets like Table.index_maps
+        self.node_index_maps: Dict[str, Dict[Any, Dict[str, None]]] = {}
+        # read-side CSR view of the edges, built on demand by _edges_csr(); reset by anything that changes the shape
+        self._csr: Optional[GraphCSR] = None
 
-    # ---------------- Nodes ----------------
-    def add_node(self, node_id: str, attrs: Optional[Dict[str, Any]] = None):
+    # ---------------- Validators ----------------
+    def _validate_new_node(self, node_id: str):
         if node_id in self.adj:
             raise BookkeepingError("Node exists")
-        self.adj[node_id] = {"attrs": dict(attrs) if attrs else {}, "edges": {}}
+
+    def _validate_node(self, node_id: str):
+        if node_id not in self.adj:
+            raise BookkeepingError("No such node")
+
+    def _validate_edge_ends(self, frm: str, to: str):
+        if frm not in self.adj or to not in self.adj:
+            raise BookkeepingError("Both nodes must exist")
+
+    def _validate_edge(self, frm: str, to: str):
+        if frm not in self.adj or to not in self.adj[frm]["edges"]:
+            raise BookkeepingError("Edge not found")
+
+    # ---------------- Nodes ----------------
+    @_mutates
+    def add_node(self, node_id: str, attrs: Optional[Dict[str, Any]] = None):
+        self._validate_new_node(node_id)
+        # own copy of attrs, with interned keys
+        attrs = {sys.intern(k): v for k, v in attrs.items()} if attrs else {}
+        self.adj[node_id] = {"attrs": attrs, "edges": {}}
+        self._csr = None
         for attr in self.indexed_node_attrs:
             val = self.adj[node_id]["attrs"].get(attr)
-            self.node_index_maps.setdefault(attr, {}).setdefault(val, []).append(node_id)
+            self.node_index_maps.setdefault(attr, {}).setdefault(val, {})[node_id] = None
 
+    @_mutates
     def del_node(self, node_id: str):
-        if node_id not in self.adj:
-            raise BookkeepingError("No such node")
-        # remove incoming edges from all other nodes
-        for src in self.adj:
-            self.adj[src]["edges"].pop(node_id, None)
+        self._validate_node(node_id)
+        # remove incoming edges from all other nodes; the reverse CSR names the sources when it is current
+        csr = self._csr
+        if csr is not None:
+            i = csr.node_ids.index(node_id)
+            for s in csr.rev_source[csr.rev_offset[i]:csr.rev_offset[i + 1]]:
+                self.adj[csr.node_ids[s]]["edges"].pop(node_id, None)
+        else:
+            for src in self.adj:
+                self.adj[src]["edges"].pop(node_id, None)
+        self._csr = None
         # remove from indexes
         for attr in self.indexed_node_attrs:
             val = self.adj[node_id]["attrs"].get(attr)
-            if val in self.node_index_maps.get(attr, {}):
-                try:
-                    self.node_index_maps[attr][val].remove(node_id)
-                    if not self.node_index_maps[attr][val]:
-                        del self.node_index_maps[attr][val]
-                except ValueError:
-                    pass
+            m = self.node_index_maps.get(attr, {})
+            nids = m.get(val)
+            if nids is not None:
+                nids.pop(node_id, None)
+                if not nids:
+                    del m[val]
         del self.adj[node_id]
-        self._rebuild_node_indexes()
 
+    @_mutates
     def update_node(self, node_id: str, attrs: Dict[str, Any]):
-        if node_id not in self.adj:
-            raise BookkeepingError("No such node")
-        old_attrs = dict(self.adj[node_id]["attrs"])
-        self.adj[node_id]["attrs"].update(attrs)
-        for attr in self.indexed_node_attrs:
-            old_val = old_attrs.get(attr)
-            new_val = self.adj[node_id]["attrs"].get(attr)
+        self._validate_node(node_id)
+        node_attrs = self.adj[node_id]["attrs"]
+        # only indexed attrs need their old value
+        old_vals = {attr: node_attrs.get(attr) for attr in self.indexed_node_attrs}
+        node_attrs.update(attrs)
+        for attr, old_val in old_vals.items():
+            new_val = node_attrs.get(attr)
             if old_val != new_val:
                 m = self.node_index_maps.setdefault(attr, {})
-                if old_val in m:
-                    try:
-                        m[old_val].remove(node_id)
-                        if not m[old_val]:
-                            del m[old_val]
-                    except ValueError:
-                        pass
-                m.setdefault(new_val, []).append(node_id)
+                nids = m.get(old_val)
+                if nids is not None:
+                    nids.pop(node_id, None)
+                    if not nids:
+                        del m[old_val]
+                m.setdefault(new_val, {})[node_id] = None
 
     # ---------------- Edges ----------------
+    @_mutates
     def add_edge(self, frm: str, to: str, meta: Optional[Dict[str, Any]] = None):
-        if frm not in self.adj or to not in self.adj:
-            raise BookkeepingError("Both nodes must exist")
-        self.adj[frm]["edges"][to] = dict(meta) if meta else {}
+        self._validate_edge_ends(frm, to)
+        meta = dict(meta) if meta else {}
+        self.adj[frm]["edges"][to] = meta
+        self._csr = None
 
+    @_mutates
     def del_edge(self, frm: str, to: str):
-        if frm not in self.adj or to not in self.adj[frm]["edges"]:
-            raise BookkeepingError("Edge not found")
+        self._validate_edge(frm, to)
         del self.adj[frm]["edges"][to]
+        self._csr = None
 
     # ---------------- Indexes ----------------
+    @_mutates
     def set_node_index(self, attr_name: str):
+        attr_name = sys.intern(attr_name)
         if attr_name not in self.indexed_node_attrs:
             self.indexed_node_attrs.append(attr_name)
-        m: Dict[Any, List[str]] = {}
+        m: Dict[Any, Dict[str, None]] = {}
         for nid, data in self.adj.items():
             val = data["attrs"].get(attr_name)
-            m.setdefault(val, []).append(nid)
+            m.setdefault(val, {})[nid] = None
         self.node_index_maps[attr_name] = m
 
+    @_mutates
     def unset_node_index(self, attr_name: str):
         if attr_name in self.indexed_node_attrs:
             self.indexed_node_attrs.remove(attr_name)
@@ -372,7 +702,7 @@ class Graph(Element):
     def lookup_nodes_by_index(self, attr_name: str, value: Any):
         if attr_name not in self.indexed_node_attrs:
             raise BookkeepingError("Node attribute not indexed")
-        nids = self.node_index_maps.get(attr_name, {}).get(value, [])
+        nids = self.node_index_maps.get(attr_name, {}).get(value, ())
         return [{"node_id": nid, "attrs": self.adj[nid]["attrs"]} for nid in nids]
 
     def _rebuild_node_indexes(self):
@@ -380,22 +710,24 @@ class Graph(Element):
             self.set_node_index(attr)
 
     # ---------------- Serialization ----------------
-    def to_serializable(self) -> Dict[str, Any]:
+    def _build_serial(self) -> Dict[str, Any]:
         return {
             "id": self.id,
             "name": self.name,
             "type": Graph.TYPE_CODE,
             "adj": _serialize(self.adj),
             "indexed_node_attrs": list(self.indexed_node_attrs),
-            "refs": list(self.refs),
+            **self._refs_to_serializable(),
         }
 
+    @_mutates
     def from_serializable(self, data: Dict[str, Any]):
         self.id = int(data["id"])
         self.name = data.get("name", self.name)
         self.adj = _deserialize(data.get("adj", {}))
-        self.indexed_node_attrs = list(data.get("indexed_node_attrs", []))
-        self.refs = [int(x) for x in data.get("refs", [])]
+        self._csr = None
+        self.indexed_node_attrs = [sys.intern(a) for a in data.get("indexed_node_attrs", [])]
+        self._refs_from_serializable(data)
         self._rebuild_node_indexes()
 
     # ---------------- Info & Display ----------------
@@ -406,11 +738,49 @@ class Graph(Element):
         return key in self.indexed_node_attrs
 
     def info(self) -> str:
-        return f"Graph(name={self.name}, nodes={len(self.adj)}, edges={sum(len(d['edges']) for d in self.adj.values())}, slots={len(self.refs)})"
+        return f"Graph(name={self.name}, nodes={len(self.adj)}, edges={len(self._edges_csr().edge_target)}, slots={len(self.refs)})"
+
+    def _edges_csr(self) -> GraphCSR:
+        csr = self._csr
+        if csr is None:
+            csr = self._csr = self._build_csr()
+        return csr
+
+    def _build_csr(self) -> GraphCSR:
+        node_ids = list(self.adj)
+        pos = {nid: i for i, nid in enumerate(node_ids)}
+        offset = array("I", [0])
+        edge_target = array("I")
+        edge_meta: List[Dict[str, Any]] = []
+        for nid in list(node_ids):
+            for tgt, meta in self.adj[nid]["edges"].items():
+                t = pos.get(tgt)
+                if t is None:
+                    t = pos[tgt] = len(node_ids)
+                    node_ids.append(tgt)
+                edge_target.append(t)
+                edge_meta.append(meta)
+            offset.append(len(edge_target))
+        # reverse CSR by counting sort over the targets
+        counts = array("I", [0]) * (len(node_ids) + 1)
+        for t in edge_target:
+            counts[t + 1] += 1
+        for i in range(len(node_ids)):
+            counts[i + 1] += counts[i]
+        rev_offset = array("I", counts)
+        rev_source = array("I", [0]) * len(edge_target)
+        for src in range(len(offset) - 1):
+            for j in range(offset[src], offset[src + 1]):
+                t = edge_target[j]
+                rev_source[counts[t]] = src
+                counts[t] += 1
+        return GraphCSR(node_ids, offset, edge_target, edge_meta, rev_offset, rev_source)
 
     # Helper for CLI show_edges (backwards compatibility)
     def edges_as_list(self):
-        return [(src, tgt, meta) for src, data in self.adj.items() for tgt, meta in data["edges"].items()]
+        csr = self._edges_csr()
+        ids, off, tgt, meta = csr.node_ids, csr.offset, csr.edge_target, csr.edge_meta
+        return [(ids[i], ids[tgt[j]], meta[j]) for i in range(len(off) - 1) for j in range(off[i], off[i + 1])]
 
 # ---- KeyValuePair Element ----
 class KeyValuePair(Element):
@@ -421,27 +791,35 @@ class KeyValuePair(Element):
         self.store: Dict[str, Any] = {}
         self.indexed_keys: List[str] = []
 
+    def _validate_key(self, key: str, msg: str = "Key not found"):
+        if key not in self.store:
+            raise BookkeepingError(msg)
+
+    @_mutates
     def set(self, key: str, value: Any):
-        self.store[key] = value
+        self.store[sys.intern(key)] = value
 
     def get(self, key: str):
-        if key not in self.store:
-            raise BookkeepingError("Key not found")
+        self._validate_key(key)
         return self.store[key]
 
+    @_mutates
     def delete(self, key: str):
-        if key not in self.store:
-            raise BookkeepingError("Key not found")
+        self._validate_key(key)
         del self.store[key]
         if key in self.indexed_keys:
             self.indexed_keys.remove(key)
 
+    def _validate_index_key(self, key: str):
+        self._validate_key(key, "Key not found to index")
+
+    @_mutates
     def set_index_key(self, key: str):
-        if key not in self.store:
-            raise BookkeepingError("Key not found to index")
+        self._validate_index_key(key)
         if key not in self.indexed_keys:
             self.indexed_keys.append(key)
 
+    @_mutates
     def unset_index_key(self, key: str):
         if key in self.indexed_keys:
             self.indexed_keys.remove(key)
@@ -451,22 +829,23 @@ class KeyValuePair(Element):
             raise BookkeepingError("Key not indexed")
         return self.store[key]
 
-    def to_serializable(self) -> Dict[str, Any]:
+    def _build_serial(self) -> Dict[str, Any]:
         return {
             "id": self.id,
             "name": self.name,
             "type": KeyValuePair.TYPE_CODE,
             "store": _serialize(self.store),
             "indexed_keys": list(self.indexed_keys),
-            "refs": list(self.refs),
+            **self._refs_to_serializable(),
         }
 
+    @_mutates
     def from_serializable(self, data: Dict[str, Any]):
         self.id = int(data["id"])
         self.name = data.get("name", self.name)
         self.store = _deserialize(data.get("store", {}))
         self.indexed_keys = list(data.get("indexed_keys", []))
-        self.refs = [int(x) for x in data.get("refs", [])]
+        self._refs_from_serializable(data)
 
     def list_indexable(self) -> List[str]:
         return list(self.indexed_keys)
@@ -479,46 +858,77 @@ class KeyValuePair(Element):
 
 # ---- Factory ----
 class ElementFactory:
+    # user-facing type names (lower case) -> element class
+    _BY_NAME: Dict[str, type] = {
+        "table": Table,
+        "graph": Graph,
+        "kvp": KeyValuePair,
+        "kv": KeyValuePair,
+        "keyvaluepair": KeyValuePair,
+    }
+
     @staticmethod
     def create(element_type: str, name: str, element_id: Optional[int] = None, **kwargs) -> Element:
-        t = element_type.lower()
-        if t == "table":
+        cls = ElementFactory._BY_NAME.get(element_type.lower())
+        if cls is None:
+            raise BookkeepingError("Unknown element type")
+        if cls is Table:
             return Table(name, columns=kwargs.get("columns"), element_id=element_id)
-        if t == "graph":
-            return Graph(name, element_id=element_id)
-        if t in ("kvp", "kv", "keyvaluepair"):
-            return KeyValuePair(name, element_id=element_id)
-        raise BookkeepingError("Unknown element type")
+        return cls(name, element_id=element_id)
+
 
+    # serialized "type" tag -> (element class, name used when the record has none);
+    # one dict lookup per loaded element
+    _BY_TYPE_CODE: Dict[str, Tuple[type, str]] = {
+        Table.TYPE_CODE: (Table, "Table"),
+        Graph.TYPE_CODE: (Graph, "Graph"),
+        KeyValuePair.TYPE_CODE: (KeyValuePair, "KVP"),
+    }
 
     @staticmethod
     def from_serializable(data: Dict[str, Any]) -> Element:
-        t = data.get("type")
-        if t == Table.TYPE_CODE:
-            el = Table(data.get("name", "Table"), element_id=int(data["id"]))
-            el.from_serializable(data)
-            return el
-        if t == Graph.TYPE_CODE:
-            el = Graph(data.get("name", "Graph"), element_id=int(data["id"]))
-            el.from_serializable(data)
-            return el
-        if t == KeyValuePair.TYPE_CODE:
-            el = KeyValuePair(data.get("name", "KVP"), element_id=int(data["id"]))
-            el.from_serializable(data)
-            return el
-        raise BookkeepingError("Unsupported element type in serialized data")
-
-# ---- Delta (unchanged) ----
+        entry = ElementFactory._BY_TYPE_CODE.get(data.get("type"))
+        if entry is None:
+            raise BookkeepingError("Unsupported element type in serialized data")
+        cls, default_name = entry
+        el = cls(data.get("name", default_name), element_id=int(data["id"]))
+        el.from_serializable(data)
+        return el
+
+# ---- Delta ----
 @dataclass
 class Delta:
     action: str
     element_id: Optional[int] = None
     before: Optional[Dict[str, Any]] = None
     after: Optional[Dict[str, Any]] = None
-    path_before: Optional[List[int]] = None
-    path_after: Optional[List[int]] = None
+    # tuples; deltas that leave the path alone share one tuple for both
+    path_before: Optional[Tuple[int, ...]] = None
+    path_after: Optional[Tuple[int, ...]] = None
     current_element_before: Optional[int] = None
     current_element_after: Optional[int] = None
+    packed: Optional[bytes] = None  # zlib(JSON [before, after]) once the delta has gone cold
+    subdeltas: Optional[List["Delta"]] = None  # set for action="group": applied in order, undone in reverse
+    # single-slot refs change ({"op": "set_ref", "element_id", "pos", "old", "new", "len"}) recorded instead of snapshots
+    patch: Optional[Dict[str, Any]] = None
+
+    def pack(self):
+        """Compress before/after into `packed` (no-op for navigation-only or already packed deltas)."""
+        if self.subdeltas:
+            for d in self.subdeltas:
+                d.pack()
+        if self.packed is not None or (self.before is None and self.after is None):
+            return
+        raw = json.dumps([self.before, self.after], separators=(",", ":"), ensure_ascii=False)
+        self.packed = zlib.compress(raw.encode("utf-8"), 1)
+        self.before = None
+        self.after = None
+
+    def states(self) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        if self.packed is None:
+            return self.before, self.after
+        before, after = json.loads(zlib.decompress(self.packed).decode("utf-8"))
+        return before, after
 
 # ---- ElementRegistry ----
 class ElementRegistry:
@@ -530,21 +940,39 @@ class ElementRegistry:
         root_id = self._alloc_id()
         root = KeyValuePair("root", element_id=root_id)
         # initialize root with one slot (optional)
-        root.refs = []
+        root.refs = array("I")
         self.elements[root.id] = root
         self.root_id: int = root.id
 
+        # reverse index of refs: target id -> [(parent id, slot pos)]; slot writes go through _set_slot/_clear_slot
+        self._parents: Dict[int, List[Tuple[int, int]]] = {}
+
         self.current_element_id: int = self.root_id
         # path_stack stores positions (integers) used to descend at each level
         self.path_stack: List[int] = []
-
-        self._history: List[Delta] = []
+        # tuple(path_stack) shared by deltas; reset wherever path_stack changes
+        self._path_tuple_cache: Optional[Tuple[int, ...]] = None
+
+        # bounded undo log: ring buffer of history_limit slots; logical entry i lives at
+        # (_hist_head + i) % history_limit, and once full a push overwrites the oldest
+        self._history: List[Optional[Delta]] = [None] * history_limit
+        self._hist_head: int = 0
+        self._hist_size: int = 0
         self._hist_ptr: int = -1
         self._history_limit = history_limit
+        # deltas collected by an open group() block; None when no group is open
+        self._group: Optional[List[Delta]] = None
+        # bumped on every change to elements or position, so views can compare one int
+        self.version: int = 0
 
     def _alloc_id(self) -> int:
-        if self._free_ids:
-            return self._free_ids.pop()
+        free = self._free_ids
+        elements = self.elements
+        while free:
+            eid = free.pop()
+            # entries go stale when undo/redo reinstalls a freed element; skip those
+            if eid not in elements:
+                return eid
         nid = self._next_id
         self._next_id += 1
         return nid
@@ -560,109 +988,245 @@ class ElementRegistry:
         return self.get_element(self.current_element_id)
 
     def get_element(self, element_id: int) -> Element:
-        if element_id not in self.elements:
+        # one probe: ids are small ints, which hash to themselves
+        el = self.elements.get(element_id)
+        if el is None:
             raise BookkeepingError("No such element")
-        return self.elements[element_id]
+        return el
 
     def find_by_name(self, name: str) -> List[Element]:
         return [e for e in self.elements.values() if e.name == name]
 
+    @contextmanager
+    def group(self):
+        """Record every delta pushed inside the block as one undo step (nested blocks join the outer one)."""
+        if self._group is not None:
+            yield
+            return
+        self._group = []
+        try:
+            yield
+        finally:
+            deltas, self._group = self._group, None
+            if len(deltas) == 1:
+                self._push_delta(deltas[0])
+            elif deltas:
+                first, last = deltas[0], deltas[-1]
+                self._push_delta(Delta(action="group", subdeltas=deltas,
+                                       path_before=first.path_before, path_after=last.path_after,
+                                       current_element_before=first.current_element_before,
+                                       current_element_after=last.current_element_after))
+
     def _push_delta(self, delta: Delta):
-        if self._hist_ptr < len(self._history) - 1:
-            self._history = self._history[: self._hist_ptr + 1]
-        self._history.append(delta)
-        if len(self._history) > self._history_limit:
-            drop = len(self._history) - self._history_limit
-            self._history = self._history[drop:]
-        self._hist_ptr = len(self._history) - 1
+        self.version += 1
+        if self._group is not None:
+            self._group.append(delta)
+            return
+        n = self._history_limit
+        if n <= 0:
+            return
+        # the redo tail is discarded by shrinking the size; its slots get overwritten later
+        size = self._hist_ptr + 1
+        if size == n:
+            self._history[self._hist_head] = delta
+            self._hist_head = (self._hist_head + 1) % n
+        else:
+            self._history[(self._hist_head + size) % n] = delta
+            size += 1
+        self._hist_size = size
+        self._hist_ptr = size - 1
+        if size > HISTORY_HOT_DELTAS:
+            self._hist_at(size - 1 - HISTORY_HOT_DELTAS).pack()
+
+    def _hist_at(self, i: int) -> Delta:
+        return self._history[(self._hist_head + i) % self._history_limit]
+
+    def _clear_history(self):
+        self._history = [None] * self._history_limit
+        self._hist_head = 0
+        self._hist_size = 0
+        self._hist_ptr = -1
 
     def undo(self):
         if self._hist_ptr < 0:
             raise BookkeepingError("Nothing to undo")
-        d = self._history[self._hist_ptr]
+        d = self._hist_at(self._hist_ptr)
         self._apply_delta(d, reverse=True)
         self._hist_ptr -= 1
 
     def redo(self):
-        if self._hist_ptr >= len(self._history) - 1:
+        if self._hist_ptr >= self._hist_size - 1:
             raise BookkeepingError("Nothing to redo")
         self._hist_ptr += 1
-        d = self._history[self._hist_ptr]
+        d = self._hist_at(self._hist_ptr)
         self._apply_delta(d, reverse=False)
 
     def list_history(self):
         out = []
-        for i, d in enumerate(self._history):
+        for i in range(self._hist_size):
+            d = self._hist_at(i)
             out.append({"idx": i, "action": d.action, "element_id": d.element_id})
         return out
 
     def _apply_delta(self, delta: Delta, reverse: bool):
-        state = delta.before if reverse else delta.after
+        self.version += 1
+        if delta.subdeltas is not None:
+            for d in (reversed(delta.subdeltas) if reverse else delta.subdeltas):
+                self._apply_delta(d, reverse)
+            return
+        before, after = delta.states()
+        state = before if reverse else after
         if delta.action == "create":
             if reverse:
-                if delta.element_id in self.elements:
-                    del self.elements[delta.element_id]
-                    self._free_id(delta.element_id)
+                self._remove_element(delta.element_id)
+                if delta.patch is not None:
+                    self._apply_patch(delta.patch, reverse)
             else:
                 if state is None:
                     raise BookkeepingError("Malformed create delta")
-                el = ElementFactory.from_serializable(state)
-                self.elements[el.id] = el
+                if delta.patch is not None:
+                    self._apply_patch(delta.patch, reverse)
+                self._install_element(ElementFactory.from_serializable(state))
 
         elif delta.action == "delete":
             if reverse:
                 if state is None:
                     raise BookkeepingError("Malformed delete delta")
-                el = ElementFactory.from_serializable(state)
-                self.elements[el.id] = el
+                self._install_element(ElementFactory.from_serializable(state))
             else:
-                if delta.element_id in self.elements:
-                    del self.elements[delta.element_id]
-                    self._free_id(delta.element_id)
+                self._remove_element(delta.element_id)
+
+        elif delta.patch is not None:
+            self._apply_patch(delta.patch, reverse)
 
         elif delta.action == "update":
             if state is None:
-                if delta.element_id in self.elements:
-                    del self.elements[delta.element_id]
-                    self._free_id(delta.element_id)
+                self._remove_element(delta.element_id)
             else:
-                el = ElementFactory.from_serializable(state)
-                self.elements[el.id] = el
+                self._install_element(ElementFactory.from_serializable(state))
 
         if reverse:
             if delta.path_before is not None:
                 self.path_stack = list(delta.path_before)
+                self._path_tuple_cache = None
             if delta.current_element_before is not None:
                 self.current_element_id = delta.current_element_before
         else:
             if delta.path_after is not None:
                 self.path_stack = list(delta.path_after)
+                self._path_tuple_cache = None
             if delta.current_element_after is not None:
                 self.current_element_id = delta.current_element_after
 
+    def _apply_patch(self, patch: Dict[str, Any], reverse: bool):
+        if patch.get("op") != "set_ref":
+            raise BookkeepingError("Malformed patch delta")
+        el = self.elements.get(patch["element_id"])
+        if el is None:
+            raise BookkeepingError("Malformed patch delta")
+        pos = patch["pos"]
+        target = patch["old"] if reverse else patch["new"]
+        if target:
+            self._set_slot(el, pos, target)
+        elif pos < len(el.refs):
+            self._clear_slot(el, pos)
+        if reverse:
+            # drop the empty slots the forward write padded on
+            el.truncate_slots(patch["len"])
+
+    # write one slot through _set_slot/_clear_slot and return the patch that records it
+    def _write_ref(self, el: Element, pos: int, target: int) -> Dict[str, Any]:
+        patch = {"op": "set_ref", "element_id": el.id, "pos": pos,
+                 "old": el.refs[pos] if pos < len(el.refs) else 0, "new": target, "len": len(el.refs)}
+        if target:
+            self._set_slot(el, pos, target)
+        else:
+            self._clear_slot(el, pos)
+        return patch
+
+    def _push_ref_delta(self, patch: Dict[str, Any]):
+        p = self._path_tuple()
+        self._push_delta(Delta(action="update", element_id=patch["element_id"], patch=patch,
+                               path_before=p, path_after=p,
+                               current_element_before=self.current_element_id, current_element_after=self.current_element_id))
+
+    # ---- refs reverse index ----
+    def _index_refs(self, el: Element):
+        setdefault = self._parents.setdefault
+        eid = el.id
+        for pos, target in enumerate(el.refs):
+            if target:
+                setdefault(target, []).append((eid, pos))
+
+    def _unindex_refs(self, el: Element):
+        for pos, target in enumerate(el.refs):
+            if target:
+                self._unlink_parent(target, el.id, pos)
+
+    def _unlink_parent(self, target: int, parent_id: int, pos: int):
+        entries = self._parents.get(target)
+        if entries is None:
+            return
+        entries.remove((parent_id, pos))
+        if not entries:
+            del self._parents[target]
+
+    def _rebuild_parents(self):
+        self._parents = {}
+        index_refs = self._index_refs
+        for el in self.elements.values():
+            index_refs(el)
+
+    def _set_slot(self, parent: Element, pos: int, target: int):
+        old = parent.refs[pos] if pos < len(parent.refs) else 0
+        if old:
+            self._unlink_parent(old, parent.id, pos)
+        parent.set_slot(pos, target)
+        if target:
+            self._parents.setdefault(target, []).append((parent.id, pos))
+
+    def _clear_slot(self, parent: Element, pos: int):
+        old = parent.refs[pos]
+        if old:
+            self._unlink_parent(old, parent.id, pos)
+        parent.clear_slot(pos)
+
+    # put el in place of any element with the same id, keeping _parents in step
+    def _install_element(self, el: Element):
+        old = self.elements.get(el.id)
+        if old is not None:
+            self._unindex_refs(old)
+        self.elements[el.id] = el
+        self._index_refs(el)
+
+    def _remove_element(self, eid: int):
+        el = self.elements.pop(eid, None)
+        if el is None:
+            return
+        self._unindex_refs(el)
+        self._free_id(eid)
+
     # incoming refs: return (element_id, slot_pos) pairs where slot_pos is the index in parent's refs list
     def incoming_refs(self, target_id: int) -> List[Tuple[int, int]]:
-        out = []
-        for eid, el in self.elements.items():
-            for pos, v in enumerate(el.refs):
-                if v == target_id:
-                    out.append((eid, pos))
-        return out
+        return list(self._parents.get(target_id, ()))
 
     def reachable_from_root(self) -> set:
-        seen = set()
-        q = [self.root_id]
+        seen = {self.root_id}
+        q = deque([self.root_id])
+        # bound once: attribute lookups inside the loop would run per visited slot
+        get_element = self.elements.get
+        seen_add = seen.add
+        q_append = q.append
+        q_popleft = q.popleft
         while q:
-            cur = q.pop(0)
-            if cur in seen:
-                continue
-            seen.add(cur)
-            el = self.elements.get(cur)
+            el = get_element(q_popleft())
             if not el:
                 continue
             for child_id in el.refs:
+                # mark on enqueue so each id is queued at most once
                 if child_id and child_id not in seen:
-                    q.append(child_id)
+                    seen_add(child_id)
+                    q_append(child_id)
         return seen
 
     # create element and link from current element into a stable slot position (reuse empty slots)
@@ -670,39 +1234,24 @@ class ElementRegistry:
         el_id = self._alloc_id()
         el = ElementFactory.create(element_type, name, element_id=el_id, **kwargs)
         cur = self._current()
-        before_cur = cur.to_serializable()
         # choose slot: if slot_pos specified, use it (must be within 0..len)
         if slot_pos is None:
-            # find first empty slot (0) or append
-            found = None
-            for i, v in enumerate(cur.refs):
-                if v == 0:
-                    found = i
-                    break
-            if found is None:
-                cur.refs.append(el.id)
-                used_pos = len(cur.refs) - 1
-            else:
-                cur.refs[found] = el.id
-                used_pos = found
+            # first empty slot (0) or append
+            used_pos = cur.first_free_slot()
+            if used_pos is None:
+                used_pos = len(cur.refs)
         else:
             if slot_pos < 0:
                 raise BookkeepingError("slot_pos out of range")
-            if slot_pos < len(cur.refs):
-                if cur.refs[slot_pos] != 0:
-                    raise BookkeepingError("slot already occupied")
-                cur.refs[slot_pos] = el.id
-                used_pos = slot_pos
-            else:
-                # extend with zeros up to slot_pos then set
-                while len(cur.refs) < slot_pos:
-                    cur.refs.append(0)
-                cur.refs.append(el.id)
-                used_pos = slot_pos
-        self.elements[el.id] = el
-        after_cur = cur.to_serializable()
-        delta = Delta(action="create", element_id=el.id, before={"cur": before_cur}, after={"cur": after_cur, "created": el.to_serializable()},
-                      path_before=list(self.path_stack), path_after=list(self.path_stack),
+            if slot_pos < len(cur.refs) and cur.refs[slot_pos] != 0:
+                raise BookkeepingError("slot already occupied")
+            # past the end: extended with empty slots up to slot_pos
+            used_pos = slot_pos
+        patch = self._write_ref(cur, used_pos, el.id)
+        self._install_element(el)
+        p = self._path_tuple()
+        delta = Delta(action="create", element_id=el.id, before=None, after=el.to_serializable(), patch=patch,
+                      path_before=p, path_after=p,
                       current_element_before=self.current_element_id, current_element_after=self.current_element_id)
         self._push_delta(delta)
         return el.id, used_pos
@@ -712,37 +1261,17 @@ class ElementRegistry:
         if element_id not in self.elements:
             raise BookkeepingError("Target element does not exist")
         cur = self._current()
-        before = cur.to_serializable()
         if slot_pos is None:
-            found = None
-            for i, v in enumerate(cur.refs):
-                if v == 0:
-                    found = i
-                    break
-            if found is None:
-                cur.refs.append(element_id)
-                used = len(cur.refs) - 1
-            else:
-                cur.refs[found] = element_id
-                used = found
+            used = cur.first_free_slot()
+            if used is None:
+                used = len(cur.refs)
         else:
             if slot_pos < 0:
                 raise BookkeepingError("slot_pos out of range")
-            if slot_pos < len(cur.refs):
-                if cur.refs[slot_pos] != 0:
-                    raise BookkeepingError("slot already occupied")
-                cur.refs[slot_pos] = element_id
-                used = slot_pos
-            else:
-                while len(cur.refs) < slot_pos:
-                    cur.refs.append(0)
-                cur.refs.append(element_id)
-                used = slot_pos
-        after = cur.to_serializable()
-        delta = Delta(action="update", element_id=cur.id, before=before, after=after,
-                      path_before=list(self.path_stack), path_after=list(self.path_stack),
-                      current_element_before=self.current_element_id, current_element_after=self.current_element_id)
-        self._push_delta(delta)
+            if slot_pos < len(cur.refs) and cur.refs[slot_pos] != 0:
+                raise BookkeepingError("slot already occupied")
+            used = slot_pos
+        self._push_ref_delta(self._write_ref(cur, used, element_id))
         return used
 
     # updateref: change target at slot_pos to new element id
@@ -754,13 +1283,7 @@ class ElementRegistry:
             raise BookkeepingError("New target element does not exist")
         if cur.refs[slot_pos] == 0:
             raise BookkeepingError("Slot is empty")
-        before = cur.to_serializable()
-        cur.refs[slot_pos] = new_element_id
-        after = cur.to_serializable()
-        delta = Delta(action="update", element_id=cur.id, before=before, after=after,
-                      path_before=list(self.path_stack), path_after=list(self.path_stack),
-                      current_element_before=self.current_element_id, current_element_after=self.current_element_id)
-        self._push_delta(delta)
+        self._push_ref_delta(self._write_ref(cur, slot_pos, new_element_id))
 
     # deleteref: clear slot (set to 0) only if target has >1 incoming refs after removal
     def deleteref(self, slot_pos: int):
@@ -775,13 +1298,7 @@ class ElementRegistry:
         count = sum(1 for (eid, pos) in incoming if not (eid == cur.id and pos == slot_pos))
         if count <= 0:
             raise BookkeepingError("Cannot clear slot: would orphan target (no other incoming refs)")
-        before = cur.to_serializable()
-        cur.refs[slot_pos] = 0
-        after = cur.to_serializable()
-        delta = Delta(action="update", element_id=cur.id, before=before, after=after,
-                      path_before=list(self.path_stack), path_after=list(self.path_stack),
-                      current_element_before=self.current_element_id, current_element_after=self.current_element_id)
-        self._push_delta(delta)
+        self._push_ref_delta(self._write_ref(cur, slot_pos, 0))
 
     # delete element entirely (allowed only if element has no children refs)
     def delete(self, slot_pos: int):
@@ -793,13 +1310,7 @@ class ElementRegistry:
             raise BookkeepingError("Slot empty")
         target_el = self.elements.get(target_id)
         if target_el is None:
-            before_parent = cur.to_serializable()
-            cur.refs[slot_pos] = 0
-            after_parent = cur.to_serializable()
-            delta = Delta(action="update", element_id=cur.id, before=before_parent, after=after_parent,
-                          path_before=list(self.path_stack), path_after=list(self.path_stack),
-                          current_element_before=self.current_element_id, current_element_after=self.current_element_id)
-            self._push_delta(delta)
+            self._push_ref_delta(self._write_ref(cur, slot_pos, 0))
             raise BookkeepingError("Dangling reference removed (target was missing)")
         if any(child for child in target_el.refs if child):
             raise BookkeepingError("Cannot delete: target element has children refs (would orphan subtree)")
@@ -810,20 +1321,19 @@ class ElementRegistry:
         for (eid, pos) in incoming:
             el = self.elements.get(eid)
             if el and pos < len(el.refs) and el.refs[pos] == target_id:
-                el.refs[pos] = 0
+                self._clear_slot(el, pos)
         # delete element
-        if target_id in self.elements:
-            del self.elements[target_id]
-            self._free_id(target_id)
+        self._remove_element(target_id)
         # clear parent slot
         if cur.refs[slot_pos] == target_id:
-            cur.refs[slot_pos] = 0
+            self._clear_slot(cur, slot_pos)
         after_parent = cur.to_serializable()
+        p = self._path_tuple()
         delta = Delta(action="delete", element_id=target_id, before=before_deleted, after=None,
-                      path_before=list(self.path_stack), path_after=list(self.path_stack),
+                      path_before=p, path_after=p,
                       current_element_before=self.current_element_id, current_element_after=self.current_element_id)
         parent_delta = Delta(action="update", element_id=cur.id, before=before_parent, after=after_parent,
-                             path_before=list(self.path_stack), path_after=list(self.path_stack),
+                             path_before=p, path_after=p,
                              current_element_before=self.current_element_id, current_element_after=self.current_element_id)
         self._push_delta(delta)
         self._push_delta(parent_delta)
@@ -838,39 +1348,57 @@ class ElementRegistry:
         target_id = cur.refs[slot_pos]
         if target_id not in self.elements:
             raise BookkeepingError("Referenced element missing")
-        before_path = list(self.path_stack)
+        before_path = self._path_tuple()
         before_current = self.current_element_id
         self.path_stack.append(slot_pos)
+        self._path_tuple_cache = None
         self.current_element_id = target_id
         delta = Delta(action="update", element_id=None, before=None, after=None,
-                      path_before=before_path, path_after=list(self.path_stack),
+                      path_before=before_path, path_after=self._path_tuple(),
                       current_element_before=before_current, current_element_after=self.current_element_id)
         self._push_delta(delta)
 
     def ascend(self):
         if not self.path_stack:
             raise BookkeepingError("Already at root; cannot ascend")
-        before_path = list(self.path_stack)
+        before_path = self._path_tuple()
         before_current = self.current_element_id
         self.path_stack.pop()
-        cur = self.root_id
-        for pos in self.path_stack:
-            el = self.elements.get(cur)
-            if el is None or pos < 0 or pos >= len(el.refs):
-                raise BookkeepingError("Invalid path state while ascending")
-            cur = el.refs[pos]
-            if cur == 0 or cur not in self.elements:
-                raise BookkeepingError("Invalid path state while ascending (missing element)")
+        self._path_tuple_cache = None
+        cur = self._walk_path(self.path_stack)
+        if cur is None:
+            raise BookkeepingError("Invalid path state while ascending")
         self.current_element_id = cur
         delta = Delta(action="update", element_id=None, before=None, after=None,
-                      path_before=before_path, path_after=list(self.path_stack),
+                      path_before=before_path, path_after=self._path_tuple(),
                       current_element_before=before_current, current_element_after=self.current_element_id)
         self._push_delta(delta)
 
+    def _path_tuple(self) -> Tuple[int, ...]:
+        p = self._path_tuple_cache
+        if p is None:
+            p = self._path_tuple_cache = tuple(self.path_stack)
+        return p
+
+    # follow slot positions from the root; element id at the end, or None if any step is broken
+    def _walk_path(self, path) -> Optional[int]:
+        elements = self.elements
+        cur = self.root_id
+        for pos in path:
+            el = elements.get(cur)
+            if el is None or not 0 <= pos < len(el.refs):
+                return None
+            nxt = el.refs[pos]
+            if nxt == 0 or nxt not in elements:
+                return None
+            cur = nxt
+        return cur
+
     def _record_element_update(self, el: Element, before_state: Dict[str, Any]):
         after_state = el.to_serializable()
+        p = self._path_tuple()
         delta = Delta(action="update", element_id=el.id, before=before_state, after=after_state,
-                      path_before=list(self.path_stack), path_after=list(self.path_stack),
+                      path_before=p, path_after=p,
                       current_element_before=self.current_element_id, current_element_after=self.current_element_id)
         self._push_delta(delta)
 
@@ -879,6 +1407,7 @@ class ElementRegistry:
         el = self._current()
         if not isinstance(el, Table):
             raise BookkeepingError("Current element is not a Table")
+        el._validate_new_column(col)
         before = el.to_serializable()
         el.add_column(col)
         self._record_element_update(el, before)
@@ -887,6 +1416,7 @@ class ElementRegistry:
         el = self._current()
         if not isinstance(el, Table):
             raise BookkeepingError("Current element is not a Table")
+        el._validate_column(col)
         before = el.to_serializable()
         el.del_column(col)
         self._record_element_update(el, before)
@@ -895,6 +1425,7 @@ class ElementRegistry:
         el = self._current()
         if not isinstance(el, Table):
             raise BookkeepingError("Current element is not a Table")
+        el._validate_row_keys(row)
         before = el.to_serializable()
         idx = el.insert_row(row)
         self._record_element_update(el, before)
@@ -904,6 +1435,8 @@ class ElementRegistry:
         el = self._current()
         if not isinstance(el, Table):
             raise BookkeepingError("Current element is not a Table")
+        el._validate_row_index(row_idx)
+        el._validate_row_keys(updates)
         before = el.to_serializable()
         el.update_row(row_idx, updates)
         self._record_element_update(el, before)
@@ -912,6 +1445,7 @@ class ElementRegistry:
         el = self._current()
         if not isinstance(el, Table):
             raise BookkeepingError("Current element is not a Table")
+        el._validate_row_index(row_idx)
         before = el.to_serializable()
         el.delete_row(row_idx)
         self._record_element_update(el, before)
@@ -920,6 +1454,7 @@ class ElementRegistry:
         el = self._current()
         if not isinstance(el, Table):
             raise BookkeepingError("Current element is not a Table")
+        el._validate_move(old_idx, new_idx)
         before = el.to_serializable()
         el.move_row(old_idx, new_idx)
         self._record_element_update(el, before)
@@ -928,6 +1463,7 @@ class ElementRegistry:
         el = self._current()
         if not isinstance(el, Table):
             raise BookkeepingError("Current element is not a Table")
+        el._validate_column(col)
         before = el.to_serializable()
         el.set_index_column(col)
         self._record_element_update(el, before)
@@ -945,6 +1481,7 @@ class ElementRegistry:
         el = self._current()
         if not isinstance(el, Table):
             raise BookkeepingError("Current element is not a Table")
+        el._validate_new_column(col)
         before = el.to_serializable()
         el.add_list_column(col)
         self._record_element_update(el, before)
@@ -953,6 +1490,7 @@ class ElementRegistry:
         el = self._current()
         if not isinstance(el, Table):
             raise BookkeepingError("Current element is not a Table")
+        el._validate_column(col)
         before = el.to_serializable()
         el.del_list_column(col)
         self._record_element_update(el, before)
@@ -961,6 +1499,7 @@ class ElementRegistry:
         el = self._current()
         if not isinstance(el, Table):
             raise BookkeepingError("Current element is not a Table")
+        el._validate_list_cell(row_idx, col)
         before = el.to_serializable()
         el.append_to_list_cell(row_idx, col, value)
         self._record_element_update(el, before)
@@ -969,6 +1508,7 @@ class ElementRegistry:
         el = self._current()
         if not isinstance(el, Table):
             raise BookkeepingError("Current element is not a Table")
+        el._validate_list_cell(row_idx, col)
         before = el.to_serializable()
         el.insert_into_list_cell(row_idx, col, index, value)
         self._record_element_update(el, before)
@@ -977,6 +1517,7 @@ class ElementRegistry:
         el = self._current()
         if not isinstance(el, Table):
             raise BookkeepingError("Current element is not a Table")
+        el._validate_list_item(row_idx, col, index)
         before = el.to_serializable()
         el.update_list_cell_item(row_idx, col, index, value)
         self._record_element_update(el, before)
@@ -985,6 +1526,7 @@ class ElementRegistry:
         el = self._current()
         if not isinstance(el, Table):
             raise BookkeepingError("Current element is not a Table")
+        el._validate_list_item(row_idx, col, index)
         before = el.to_serializable()
         el.delete_list_cell_item(row_idx, col, index)
         self._record_element_update(el, before)
@@ -994,6 +1536,7 @@ class ElementRegistry:
         el = self._current()
         if not isinstance(el, Graph):
             raise BookkeepingError("Current element is not a Graph")
+        el._validate_new_node(node_id)
         before = el.to_serializable()
         el.add_node(node_id, attrs)
         self._record_element_update(el, before)
@@ -1002,6 +1545,7 @@ class ElementRegistry:
         el = self._current()
         if not isinstance(el, Graph):
             raise BookkeepingError("Current element is not a Graph")
+        el._validate_node(node_id)
         before = el.to_serializable()
         el.del_node(node_id)
         self._record_element_update(el, before)
@@ -1010,6 +1554,7 @@ class ElementRegistry:
         el = self._current()
         if not isinstance(el, Graph):
             raise BookkeepingError("Current element is not a Graph")
+        el._validate_node(node_id)
         before = el.to_serializable()
         el.update_node(node_id, attrs)
         self._record_element_update(el, before)
@@ -1018,6 +1563,7 @@ class ElementRegistry:
         el = self._current()
         if not isinstance(el, Graph):
             raise BookkeepingError("Current element is not a Graph")
+        el._validate_edge_ends(frm, to)
         before = el.to_serializable()
         el.add_edge(frm, to, meta)
         self._record_element_update(el, before)
@@ -1026,6 +1572,7 @@ class ElementRegistry:
         el = self._current()
         if not isinstance(el, Graph):
             raise BookkeepingError("Current element is not a Graph")
+        el._validate_edge(frm, to)
         before = el.to_serializable()
         el.del_edge(frm, to)
         self._record_element_update(el, before)
@@ -1053,7 +1600,7 @@ class ElementRegistry:
         # Works with adjacency table: lookup in attrs for matching value
         if attr not in el.indexed_node_attrs:
             raise BookkeepingError("Node attribute not indexed")
-        nids = el.node_index_maps.get(attr, {}).get(value, [])
+        nids = el.node_index_maps.get(attr, {}).get(value, ())
         return [{ "node_id": nid, "attrs": el.adj[nid]["attrs"] } for nid in nids]
 
 
@@ -1076,6 +1623,7 @@ class ElementRegistry:
         el = self._current()
         if not isinstance(el, KeyValuePair):
             raise BookkeepingError("Current element is not a KeyValuePair")
+        el._validate_key(key)
         before = el.to_serializable()
         el.delete(key)
         self._record_element_update(el, before)
@@ -1084,6 +1632,7 @@ class ElementRegistry:
         el = self._current()
         if not isinstance(el, KeyValuePair):
             raise BookkeepingError("Current element is not a KeyValuePair")
+        el._validate_index_key(key)
         before = el.to_serializable()
         el.set_index_key(key)
         self._record_element_update(el, before)
@@ -1182,24 +1731,24 @@ class ElementRegistry:
                 self.path_stack = list(path_stack)
             else:
                 self.path_stack = []
-            self._history.clear()
-            self._hist_ptr = -1
+            self._clear_history()
     '''
 
         # ---- JSON save/load (human-readable) ----
     def save_to_file(self, filepath: str):
-        data = {
-            "elements": [el.to_serializable() for el in self.elements.values()],
-            "meta": {
-                "current_element_id": self.current_element_id,
-                "path_stack": list(self.path_stack),
-                "root_id": self.root_id,
-                "next_id": self._next_id,
-                "free_ids": list(self._free_ids)
-            }
+        meta = {
+            "current_element_id": self.current_element_id,
+            "path_stack": list(self.path_stack),
+            "root_id": self.root_id,
+            "next_id": self._next_id,
+            "free_ids": list(self._free_ids)
         }
+        # same bytes as dumping {"elements": [...], "meta": ...} in one go, but each element's
+        # fragment is reused from the previous save unless that element changed since
+        parts = [el.file_json() for el in self.elements.values()]
+        text = '{"elements":[' + ",".join(parts) + '],"meta":' + json.dumps(meta, separators=(",", ":"), ensure_ascii=False) + "}"
         with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(data, f, separators=(",", ":"), ensure_ascii=False)
+            f.write(text)
 
     def load_from_file(self, filepath: str):
         if not os.path.exists(filepath):
@@ -1211,6 +1760,8 @@ class ElementRegistry:
             el = ElementFactory.from_serializable(el_data)
             new_elements[el.id] = el
         self.elements = new_elements
+        self._rebuild_parents()
+        self.version += 1
         meta = data.get("meta", {})
         self._next_id = int(meta.get("next_id", max(self.elements.keys()) + 1 if self.elements else 1))
         self._free_ids = list(meta.get("free_ids", []))
@@ -1232,37 +1783,39 @@ class ElementRegistry:
             self.current_element_id = self.root_id
         path_stack = meta.get("path_stack", [])
         # validate path_stack
-        valid = True
-        cur = self.root_id
-        for pos in path_stack:
-            el = self.elements.get(cur)
-            if el is None or pos < 0 or pos >= len(el.refs) or el.refs[pos] == 0 or el.refs[pos] not in self.elements:
-                valid = False
-                break
-            cur = el.refs[pos]
+        valid = self._walk_path(path_stack) is not None
         self.path_stack = list(path_stack) if valid else []
-        self._history.clear()
-        self._hist_ptr = -1
+        self._path_tuple_cache = None
+        self._clear_history()
 
 
     def validate_pointer(self, pointer: IndexPointer) -> bool:
-        if pointer.target_element_id not in self.elements:
+        target = self.elements.get(pointer.target_element_id)
+        if target is None:
             return False
-        target = self.elements[pointer.target_element_id]
         return target.has_index_key(pointer.target_index_key)
 
     def resolve_pointer(self, pointer: IndexPointer) -> Any:
         if not self.validate_pointer(pointer):
             raise BookkeepingError("Invalid pointer")
         target = self.elements[pointer.target_element_id]
+        # postings are kept as dict sets internally; hand out value -> list as before
         if isinstance(target, Table):
-            return target.index_maps[pointer.target_index_key]
+            return {v: list(idxs) for v, idxs in target.index_maps[pointer.target_index_key].items()}
         if isinstance(target, Graph):
-            return target.node_index_maps[pointer.target_index_key]
+            return {v: list(nids) for v, nids in target.node_index_maps[pointer.target_index_key].items()}
         if isinstance(target, KeyValuePair):
             return {pointer.target_index_key: target.store.get(pointer.target_index_key)}
         raise BookkeepingError("Unsupported target type")
 
+# numeric literal classifiers for parse_value (no exception round-trips on plain strings);
+# they accept exactly what int()/float() accept: underscores, surrounding whitespace, inf/nan
+_DIGITS = r"\d(?:_?\d)*"
+_INT_RE = re.compile(rf"\s*[-+]?{_DIGITS}\s*")
+_FLOAT_RE = re.compile(
+    rf"\s*[-+]?(?:(?:{_DIGITS}(?:\.(?:{_DIGITS})?)?|\.{_DIGITS})(?:[eE][-+]?{_DIGITS})?|(?i:inf|infinity|nan))\s*"
+)
+
 def parse_value(token: str):
     if token.startswith("ptr:"):
         body = token[len("ptr:"):]
@@ -1274,20 +1827,29 @@ def parse_value(token: str):
         except ValueError:
             raise BookkeepingError("Invalid element id in pointer")
         return IndexPointer(eid, k)
-    try:
+    if _INT_RE.fullmatch(token):
         return int(token)
-    except ValueError:
-        pass
-    try:
+    if _FLOAT_RE.fullmatch(token):
         return float(token)
-    except ValueError:
-        pass
     if token.lower() in ("true", "false"):
         return token.lower() == "true"
     if (token.startswith('"') and token.endswith('"')) or (token.startswith("'") and token.endswith("'")):
         return token[1:-1]
     return token
 
+_SHLEX_SPECIAL = frozenset("\"'\\")
+
+
+def _fast_shlex(text: str) -> List[str]:
+    # without quotes or backslashes shlex.split is plain whitespace splitting
+    if _SHLEX_SPECIAL.isdisjoint(text):
+        return text.split()
+    try:
+        return shlex.split(text)
+    except ValueError as e:  # e.g. unbalanced quotes
+        raise BookkeepingError(str(e))
+
+
 def parse_kvs(tokens: List[str]) -> Dict[str, Any]:
     out = {}
     for t in tokens:
@@ -1328,13 +1890,20 @@ class Cursor:
     slot_index: int = 0
     row: int = 0
     col: int = 0
+    scroll: int = 0  # first element row shown in the body
 
 
 @dataclass
 class Status:
-    message: str = ""
+    # formatted only when the footer is actually drawn
+    template: str = ""
+    args: tuple = ()
     error: bool = False
 
+    @property
+    def message(self) -> str:
+        return self.template % self.args if self.args else self.template
+
 
 def clamp(value: int, lo: int, hi: int) -> int:
     if hi < lo:
@@ -1342,13 +1911,46 @@ def clamp(value: int, lo: int, hi: int) -> int:
     return max(lo, min(value, hi))
 
 
-def draw_text(stdscr: "curses._CursesWindow", y: int, x: int, text: str, attr: int = 0) -> None:
-    max_y, max_x = stdscr.getmaxyx()
-    if y < 0 or y >= max_y:
-        return
-    if x < 0:
-        x = 0
-    stdscr.addnstr(y, x, text, max_x - x - 1, attr)
+def pop_utf8_char(buf: bytearray) -> None:
+    """Remove the last character of UTF-8 bytes: its continuation bytes, then the lead byte."""
+    while buf and buf[-1] & 0xC0 == 0x80:
+        buf.pop()
+    if buf:
+        buf.pop()
+
+
+_CLOSE = object()
+
+
+def _stream_pformat(obj: Any, indent: int = 2) -> Iterator[str]:
+    """Yield obj one line per scalar/bracket, lazily, so the caller can stop once the screen is full."""
+    stack: List[Tuple[int, str, Any, str]] = [(0, "", obj, "")]
+    while stack:
+        depth, head, value, tail = stack.pop()
+        pad = " " * (indent * depth)
+        if value is _CLOSE:
+            yield pad + head + tail
+            continue
+        if isinstance(value, dict) and value:
+            opener, closer = "{", "}"
+            children = [(depth + 1, f"{k!r}: ", v, ",") for k, v in value.items()]
+        elif isinstance(value, (list, tuple)) and value:
+            opener, closer = "[", "]"
+            children = [(depth + 1, "", v, ",") for v in value]
+        else:
+            yield pad + head + repr(value) + tail
+            continue
+        yield pad + head + opener
+        stack.append((depth, closer, _CLOSE, tail))
+        stack.extend(reversed(children))
+
+
+def scroll_into_view(cur: Cursor, visible: int) -> None:
+    """Move cur.scroll the least amount that keeps cur.row inside a window of `visible` rows."""
+    if cur.row < cur.scroll:
+        cur.scroll = cur.row
+    elif cur.row >= cur.scroll + visible:
+        cur.scroll = cur.row - visible + 1
 
 
 class TUIApp:
@@ -1360,9 +1962,15 @@ class TUIApp:
         self.status: Status = Status()
         self.mode: Mode = Mode.NORMAL
         self.key_buffer: str = ""
-        self.command_line: str = ""
+        # raw UTF-8 bytes as typed; command_line decodes on demand
+        self.command_line_buf: bytearray = bytearray()
         self.file_path: Optional[str] = None
         self.cursors: Dict[int, Cursor] = {}
+        # window size, read from curses only at startup and on KEY_RESIZE
+        self.max_y: int = 0
+        self.max_x: int = 0
+        # bound once: every key handler reports through it
+        self._set_status = self.set_status
 
         # ---------- Dispatch Tables ----------
         self.table_commands = {
@@ -1401,6 +2009,63 @@ class TUIApp:
             "I": self._kvp_unset_index,
         }
 
+        self.normal_commands = {
+            "j": self._key_down,
+            "k": self._key_up,
+            "h": self._key_ascend,
+            "l": self._key_descend,
+            "i": self._key_enter_mode,
+        }
+
+        # keys every non-command mode understands
+        self.common_commands = {
+            ":": self._key_command_mode,
+            "u": self._key_undo,
+            "\x12": self._key_redo,  # Ctrl-r
+            "H": self._key_history,
+        }
+
+        # per-mode 256-entry jump tables indexed by the raw key code
+        self._jumptables: Dict[Mode, List[Optional[Callable]]] = {
+            Mode.NORMAL: self._jumptable(self.normal_commands),
+            Mode.TABLE: self._jumptable(self.table_commands, "hjkl", self._nav_table),
+            Mode.GRAPH: self._jumptable(self.graph_commands, "jk", self._nav_graph),
+            Mode.KVP: self._jumptable(self.kvp_commands, "jk", self._nav_kvp),
+        }
+
+        # body renderer per mode; COMMAND mode leaves the body empty
+        self._body_renderers: Dict[Mode, Callable[["curses._CursesWindow", int], None]] = {
+            Mode.NORMAL: self._render_slots,
+            Mode.TABLE: self._render_element_pprint,
+            Mode.GRAPH: self._render_element_pprint,
+            Mode.KVP: self._render_element_pprint,
+        }
+        # element body renderers by TYPE_CODE
+        self._element_renderers: Dict[str, Callable[["curses._CursesWindow", Any, int], int]] = {
+            Table.TYPE_CODE: self._render_table,
+            Graph.TYPE_CODE: self._render_graph,
+            KeyValuePair.TYPE_CODE: self._render_kvp,
+        }
+
+        # ":" commands by verb; a handler returning False ends the session
+        self._cmd_dispatch: Dict[str, Callable[[Optional[str]], Optional[bool]]] = {
+            "load": self._cmd_load,
+            "w": self._cmd_save,
+            "wq": self._cmd_save_quit,
+            "q": self._cmd_quit,
+            "q!": self._cmd_quit,
+        }
+
+        # key of what each screen region last showed; None forces a repaint
+        self._drawn: Dict[str, Optional[tuple]] = {"header": None, "body": None, "footer": None}
+        self._body_top: int = 1
+        # (element id, registry version, formatted lines) of the last element body rendered
+        self._pp_cache: Optional[Tuple[int, int, List[str]]] = None
+        # slot lines keyed by (element id, registry version)
+        self._slot_cache: Optional[Tuple[int, int, List[str]]] = None
+        # (template, args, error, status line)
+        self._footer_cache: Optional[Tuple[str, tuple, bool, str]] = None
+
     # --- per-element cursor helpers ---
     def _elem_cursor(self) -> Cursor:
         """Return (and create if needed) the cursor for the current element."""
@@ -1437,7 +2102,7 @@ class TUIApp:
     def reset_mode(self) -> None:
         self.mode = Mode.NORMAL
         self.key_buffer = ""
-        if not self.status.message:
+        if not self.status.template:
             self.set_status("Normal mode")
 
     # ---------- Cursor navigation ----------
@@ -1455,9 +2120,18 @@ class TUIApp:
         cur.slot_index = clamp(cur.slot_index + delta, 0, n - 1)
 
 
+    # ---------- Command line ----------
+    @property
+    def command_line(self) -> str:
+        return self.command_line_buf.decode("utf-8", errors="replace")
+
+    @command_line.setter
+    def command_line(self, text: str) -> None:
+        self.command_line_buf = bytearray(text.encode("utf-8"))
+
     # ---------- Status ----------
-    def set_status(self, msg: str, *, error: bool = False) -> None:
-        self.status = Status(msg, error)
+    def set_status(self, template: str, *args: Any, error: bool = False) -> None:
+        self.status = Status(template, args, error)
 
     # ---------- Rendering ----------
     def _render_header(self, stdscr: "curses._CursesWindow") -> int:
@@ -1467,118 +2141,223 @@ class TUIApp:
         mode_name = self.mode.name
         file_part = f" | {self.file_path}" if self.file_path else ""
         header = f" {self.TITLE} | Mode: {mode_name} | {name}#{eid}{file_part} "
-        max_y, max_x = stdscr.getmaxyx()
-        draw_text(stdscr, 0, 0, header.ljust(max_x - 1), curses.A_REVERSE)
+        self._draw_bar(stdscr, 0, header, curses.A_REVERSE)
         return 1
 
-    def _render_slots(self, stdscr: "curses._CursesWindow", start_y: int) -> None:
-        slots = self._current_slots()
-        max_y, max_x = stdscr.getmaxyx()
-        cur = self._elem_cursor()
-        for i, eid in enumerate(slots):
-            sel = (i == cur.slot_index)
+    def _slot_lines(self) -> List[str]:
+        reg = self.reg
+        key = (reg.current_element_id, reg.version)
+        cached = self._slot_cache
+        if cached is not None and cached[:2] == key:
+            return cached[2]
+        lines = []
+        for i, eid in enumerate(self._current_slots()):
             label = f"{i:>3} -> {eid:<4} "
             details = "<empty>"
-            if eid != 0 and eid in self.reg.elements:
-                target = self.reg.elements[eid]
+            if eid != 0 and eid in reg.elements:
+                target = reg.elements[eid]
                 details = f"{getattr(target, 'TYPE_CODE', '?')} '{getattr(target, 'name', '?')}'"
-            draw_text(stdscr, start_y + i, 0,
-                      (label + details).ljust(max_x - 1),
-                      curses.A_STANDOUT if sel else 0)
-        if not slots:
-            draw_text(stdscr, start_y, 0, "<no slots>")
+            lines.append(label + details)
+        self._slot_cache = key + (lines,)
+        return lines
+
+    def _render_slots(self, stdscr: "curses._CursesWindow", start_y: int) -> None:
+        lines = self._slot_lines()
+        cur = self._elem_cursor()
+        for i, line in enumerate(lines):
+            if i == cur.slot_index:
+                self._draw_bar(stdscr, start_y + i, line, curses.A_STANDOUT)
+            else:
+                self._draw(stdscr, start_y + i, 0, line)
+        if not lines:
+            self._draw(stdscr, start_y, 0, "<no slots>")
 
     def _render_element_pprint(self, stdscr: "curses._CursesWindow", start_y: int) -> None:
         el = self.reg._current()
-        if getattr(el, "TYPE_CODE", None) == "Table":
-            self._render_table(stdscr, el, start_y)
-            return
-        if getattr(el, "TYPE_CODE", None) == "Graph":
-            self._render_graph(stdscr, el, start_y)
+        render = self._element_renderers.get(getattr(el, "TYPE_CODE", None))
+        if render is not None:
+            render(stdscr, el, start_y)
             return
-        if getattr(el, "TYPE_CODE", None) == "KeyValuePair":
-            self._render_kvp(stdscr, el, start_y)
-            return
-        # fallback
+        # fallback: format only as many lines as fit above the footer
+        max_y = self.max_y
         try:
-            content = pformat(el.to_serializable(), indent=2, width=80, compact=False)
+            lines = list(islice(_stream_pformat(el.to_serializable()), max(0, max_y - 1 - start_y)))
         except Exception as e:
-            content = f"<error rendering element: {e}>"
-        for i, line in enumerate(content.splitlines()):
-            draw_text(stdscr, start_y + i, 0, line)
+            lines = [f"<error rendering element: {e}>"]
+        for i, line in enumerate(lines):
+            self._draw(stdscr, start_y + i, 0, line)
+
+    def _element_lines(self, el: Element, fmt: Callable[[Element], List[str]]) -> List[str]:
+        """Formatted lines of el, reused until the registry changes (cursor moves only re-highlight)."""
+        version = self.reg.version
+        cached = self._pp_cache
+        if cached is not None and cached[0] == el.id and cached[1] == version:
+            return cached[2]
+        lines = fmt(el)
+        self._pp_cache = (el.id, version, lines)
+        return lines
+
+    # --- Formatters: element -> plain lines, no cursor state ---
+    @staticmethod
+    def _format_table(table: Table) -> List[str]:
+        # compute widths
+        col_widths = {c: len(str(c)) for c in table.columns}
+        for r in table.rows:
+            for c in table.columns:
+                col_widths[c] = max(col_widths[c], len(str(r.get(c, ""))))
+
+        # header, then one line per row
+        lines = [" | ".join(str(c).ljust(col_widths[c]) for c in table.columns)]
+        for row in table.rows:
+            lines.append(" | ".join(str(row.get(c, "")).ljust(col_widths[c]) for c in table.columns))
+        return lines
+
+    @staticmethod
+    def _format_graph(graph: Graph) -> List[str]:
+        lines = []
+        for nid, data in graph.adj.items():
+            attrs = data.get("attrs", {})
+            edges = list(data.get("edges", {}).keys())
+            lines.append(f"{nid}: {attrs} -> {edges}")
+        return lines
+
+    @staticmethod
+    def _format_kvp(kvp: KeyValuePair) -> List[str]:
+        return [f"{k:<20} = {v}" for k, v in kvp.store.items()]
 
     # --- Pretty renderers ---
     def _render_table(self, stdscr: "curses._CursesWindow", table: Table, start_y: int) -> int:
-        max_y, max_x = stdscr.getmaxyx()
+        max_y, max_x = self.max_y, self.max_x
         cur = self._elem_cursor()
         # clamp remembered coords to current data shape
         n_rows = len(table.rows)
         n_cols = len(table.columns)
         if n_rows == 0:
-            draw_text(stdscr, start_y, 0, "<empty table>")
+            self._draw(stdscr, start_y, 0, "<empty table>")
             return start_y + 1
         cur.row = clamp(cur.row, 0, n_rows - 1)
         cur.col = clamp(cur.col, 0, max(0, n_cols - 1))
 
-        # compute widths
-        col_widths = {c: len(str(c)) for c in table.columns}
-        for r in table.rows:
-            for c in table.columns:
-                col_widths[c] = max(col_widths[c], len(str(r.get(c, ""))))
-
-        # header
-        header = " | ".join(str(c).ljust(col_widths[c]) for c in table.columns)
-        draw_text(stdscr, start_y, 0, header[:max_x-1], curses.A_BOLD | curses.A_UNDERLINE)
-
-        # rows
-        for i, row in enumerate(table.rows):
-            cells = []
-            for j, c in enumerate(table.columns):
-                cell = str(row.get(c, "")).ljust(col_widths[c])
-                cells.append(cell)
-            row_str = " | ".join(cells)
+        lines = self._element_lines(table, self._format_table)
+        self._draw(stdscr, start_y, 0, lines[0][:max_x-1], curses.A_BOLD | curses.A_UNDERLINE)
+        visible = max(1, max_y - 2 - start_y)
+        scroll_into_view(cur, visible)
+        first = cur.scroll
+        for i, row_str in enumerate(islice(lines, 1 + first, 1 + first + visible), first):
             attr = curses.A_STANDOUT if i == cur.row else 0
-            draw_text(stdscr, start_y + 1 + i, 0, row_str[:max_x-1], attr)
+            self._draw(stdscr, start_y + 1 + i - first, 0, row_str[:max_x-1], attr)
         return start_y + 1 + n_rows
 
     def _render_graph(self, stdscr: "curses._CursesWindow", graph: Graph, start_y: int) -> int:
         cur = self._elem_cursor()
-        items = list(graph.adj.items())
-        if not items:
-            draw_text(stdscr, start_y, 0, "<empty graph>")
+        if not graph.adj:
+            self._draw(stdscr, start_y, 0, "<empty graph>")
             return start_y + 1
-        cur.row = clamp(cur.row, 0, len(items) - 1)
-        for i, (nid, data) in enumerate(items):
-            attrs = data.get("attrs", {})
-            edges = list(data.get("edges", {}).keys())
-            label = f"{nid}: {attrs} -> {edges}"
+        lines = self._element_lines(graph, self._format_graph)
+        cur.row = clamp(cur.row, 0, len(lines) - 1)
+        visible = max(1, self.max_y - 1 - start_y)
+        scroll_into_view(cur, visible)
+        first = cur.scroll
+        for i, label in enumerate(islice(lines, first, first + visible), first):
             attr = curses.A_STANDOUT if i == cur.row else 0
-            draw_text(stdscr, start_y + i, 0, label, attr)
-        return start_y + len(items)
+            self._draw(stdscr, start_y + i - first, 0, label, attr)
+        return start_y + len(lines)
 
     def _render_kvp(self, stdscr: "curses._CursesWindow", kvp: KeyValuePair, start_y: int) -> int:
         cur = self._elem_cursor()
-        items = list(kvp.store.items())
-        if not items:
-            draw_text(stdscr, start_y, 0, "<empty map>")
+        if not kvp.store:
+            self._draw(stdscr, start_y, 0, "<empty map>")
             return start_y + 1
-        cur.row = clamp(cur.row, 0, len(items) - 1)
-        for i, (k, v) in enumerate(items):
-            line = f"{k:<20} = {v}"
+        lines = self._element_lines(kvp, self._format_kvp)
+        cur.row = clamp(cur.row, 0, len(lines) - 1)
+        visible = max(1, self.max_y - 1 - start_y)
+        scroll_into_view(cur, visible)
+        first = cur.scroll
+        for i, line in enumerate(islice(lines, first, first + visible), first):
             attr = curses.A_STANDOUT if i == cur.row else 0
-            draw_text(stdscr, start_y + i, 0, line, attr)
-        return start_y + len(items)
+            self._draw(stdscr, start_y + i - first, 0, line, attr)
+        return start_y + len(lines)
+
+
+    # ---------- Geometry ----------
+    def _resize(self, stdscr: "curses._CursesWindow") -> None:
+        self.max_y, self.max_x = stdscr.getmaxyx()
+        stdscr.erase()
+        self._invalidate()
+
+    def _draw(self, stdscr: "curses._CursesWindow", y: int, x: int, text: str, attr: int = 0) -> None:
+        if y < 0 or y >= self.max_y:
+            return
+        if x < 0:
+            x = 0
+        stdscr.addnstr(y, x, text, self.max_x - x - 1, attr)
+
+    def _draw_bar(self, stdscr: "curses._CursesWindow", y: int, text: str, attr: int) -> None:
+        """Draw text at the start of row y with attr spanning the full row width."""
+        # the row was cleared by _render, so curses only has to recolour it; no padded string needed
+        self._draw(stdscr, y, 0, text, attr)
+        if 0 <= y < self.max_y:
+            stdscr.chgat(y, 0, self.max_x - 1, attr)
+
+    # ---------- Damage tracking ----------
+    def _invalidate(self, *regions: str) -> None:
+        for region in regions or tuple(self._drawn):
+            self._drawn[region] = None
+
+    def _region_keys(self, size: Tuple[int, int]) -> Dict[str, tuple]:
+        reg = self.reg
+        cur = self.cursors.get(reg.current_element_id)
+        cur_key = (cur.slot_index, cur.row, cur.col) if cur is not None else None
+        return {
+            "header": (size, self.mode, reg.version, reg.current_element_id, self.file_path),
+            "body": (size, self.mode, reg.version, reg.current_element_id, cur_key),
+            "footer": (size, self.mode, self.command_line, self.status.template, self.status.args, self.status.error),
+        }
 
+    @staticmethod
+    def _clear_rows(stdscr: "curses._CursesWindow", top: int, bottom: int) -> None:
+        move, clrtoeol = stdscr.move, stdscr.clrtoeol
+        for y in range(top, bottom):
+            move(y, 0)
+            clrtoeol()
+
+    def _render(self, stdscr: "curses._CursesWindow") -> bool:
+        """Repaint only the regions whose state changed since the last frame; True if anything was drawn."""
+        max_y, max_x = self.max_y, self.max_x
+        drawn = self._drawn
+        keys = self._region_keys((max_y, max_x))
+        dirty = [r for r, k in keys.items() if drawn[r] != k]
+        if not dirty:
+            return False
+        if "header" in dirty:
+            self._clear_rows(stdscr, 0, self._body_top)
+            self._body_top = self._render_header(stdscr)
+        if "body" in dirty:
+            self._clear_rows(stdscr, self._body_top, max_y - 1)
+            render_body = self._body_renderers.get(self.mode)
+            if render_body is not None:
+                render_body(stdscr, self._body_top)
+            # a long body spills onto the footer row; rendering may also clamp the cursor
+            keys = self._region_keys((max_y, max_x))
+            drawn["footer"] = None
+        if drawn["footer"] != keys["footer"]:
+            self._clear_rows(stdscr, max_y - 1, max_y)
+            self._render_footer(stdscr)
+        drawn.update(keys)
+        return True
 
     def _render_footer(self, stdscr: "curses._CursesWindow") -> None:
-        max_y, max_x = stdscr.getmaxyx()
+        max_y, max_x = self.max_y, self.max_x
         if self.mode == Mode.COMMAND:
-            draw_text(stdscr, max_y - 1, 0, f":{self.command_line}")
+            self._draw(stdscr, max_y - 1, 0, f":{self.command_line}")
         else:
-            status_attr = curses.A_BOLD | (curses.A_REVERSE if self.status.error else 0)
-            draw_text(stdscr, max_y - 1, 0,
-                      f" {self.status.message} ".ljust(max_x - 1),
-                      status_attr)
+            status = self.status
+            key = (status.template, status.args, status.error)
+            cached = self._footer_cache
+            if cached is None or cached[:3] != key:
+                cached = self._footer_cache = key + (f" {status.message} ",)
+            status_attr = curses.A_BOLD | (curses.A_REVERSE if status.error else 0)
+            self._draw_bar(stdscr, max_y - 1, cached[3], status_attr)
 
     def _nav_table(self, ch: int) -> None:
         el = self.reg._current()
@@ -1631,71 +2410,101 @@ class TUIApp:
 
     # ---------- Input handling ----------
     def handle_input(self, ch: int, stdscr: "curses._CursesWindow") -> bool:
+        if ch == curses.KEY_RESIZE:
+            self._resize(stdscr)
+            return True
         if ch == 27:  # ESC
             self.reset_mode()
             return True
-        if self.mode == Mode.NORMAL:
-            return self._handle_normal(ch)
-        elif self.mode == Mode.TABLE:
-            if ch in (ord("h"), ord("j"), ord("k"), ord("l")):
-                self._nav_table(ch)
-                return True
-            return self._dispatch(self.table_commands, ch, stdscr)
-        elif self.mode == Mode.GRAPH:
-            if ch in (ord("j"), ord("k")):
-                self._nav_graph(ch)
-                return True
-            return self._dispatch(self.graph_commands, ch, stdscr)
-        elif self.mode == Mode.KVP:
-            if ch in (ord("j"), ord("k")):
-                self._nav_kvp(ch)
-                return True
-            return self._dispatch(self.kvp_commands, ch, stdscr)
-
-        elif self.mode == Mode.COMMAND:
+        table = self._jumptables.get(self.mode)
+        if table is not None:
+            return self._dispatch(table, ch, stdscr)
+        if self.mode == Mode.COMMAND:
             return self._handle_command(ch)
         return True
 
-    def _dispatch(self, commands: Dict[str, "Callable"], ch: int, stdscr) -> bool:
-        try:
-            key = chr(ch) if 0 <= ch < 256 else None
-            if key in commands:
-                commands[key](stdscr)
-            elif ch == ord(":"):
-                self.mode = Mode.COMMAND
-                self.command_line = ""
-                self.set_status("")
-            elif key == "u":
-                self.reg.undo()
-                self.set_status("Undo successful")
-            elif ch == 18:  # Ctrl-r
-                self.reg.redo()
-                self.set_status("Redo successful")
-            elif key == "H":
-                hist = self.reg.list_history()
-                self.set_status(f"History: {hist}")
-            return True
-        except BookkeepingError as e:
-            self.set_status(str(e), error=True)
-            return True
+    def _jumptable(self, commands: Dict[str, Callable], nav_keys: str = "",
+                   nav: Optional[Callable[[int], None]] = None) -> List[Optional[Callable]]:
+        # precedence: navigation keys over mode commands over the common keys
+        table: List[Optional[Callable]] = [None] * 256
+        for key, fn in self.common_commands.items():
+            table[ord(key)] = fn
+        for key, fn in commands.items():
+            table[ord(key)] = fn
+        for key in nav_keys:
+            table[ord(key)] = lambda stdscr, ch=ord(key): nav(ch)
+        return table
+
+    def _dispatch(self, table: List[Optional[Callable]], ch: int, stdscr: "curses._CursesWindow") -> bool:
+        fn = table[ch] if 0 <= ch < 256 else None
+        if fn is not None:
+            try:
+                fn(stdscr)
+            except BookkeepingError as e:
+                self._set_status(str(e), error=True)
+        return True
+
+    # ---------- Key handlers shared by the jump tables ----------
+    def _key_down(self, stdscr) -> None:
+        self.move_cursor(1)
+
+    def _key_up(self, stdscr) -> None:
+        self.move_cursor(-1)
+
+    def _key_ascend(self, stdscr) -> None:
+        self.reg.ascend()
+        self._set_status("ascend")
+
+    def _key_descend(self, stdscr) -> None:
+        cur = self._elem_cursor()
+        self.reg.descend(cur.slot_index)
+        self._set_status("descend %s", cur.slot_index)
+
+    def _key_enter_mode(self, stdscr) -> None:
+        self.enter_mode_for_element()
+
+    def _key_command_mode(self, stdscr) -> None:
+        self.mode = Mode.COMMAND
+        self.command_line = ""
+        self._set_status("")
+
+    def _key_undo(self, stdscr) -> None:
+        self.reg.undo()
+        self._set_status("Undo successful")
+
+    def _key_redo(self, stdscr) -> None:
+        self.reg.redo()
+        self._set_status("Redo successful")
+
+    def _key_history(self, stdscr) -> None:
+        hist = self.reg.list_history()
+        self._set_status("History: %s", hist)
 
     # ---------- Prompt & Sanitizers ----------
-    def _prompt_user(self, stdscr, prompt: str) -> Optional[str]:
+    def _prompt_user(self, stdscr: "curses._CursesWindow", prompt: str) -> Optional[str]:
         """
         Prompt the user for input.
         Returns the string entered, or None if Esc pressed.
         """
         curses.echo(False)
-        stdscr.addstr(curses.LINES - 1, 0, prompt + ": ")
-        stdscr.clrtoeol()
-        stdscr.refresh()
-
-        buf: list[str] = []
+        # keys drained by run() since the last frame may have changed the screen
+        self._render(stdscr)
+        self._invalidate("footer")
+        head = prompt + ": "
+
+        getch, move, addnstr, clrtoeol = stdscr.getch, stdscr.move, stdscr.addnstr, stdscr.clrtoeol
+        # raw UTF-8 bytes; getch hands over non-ASCII input one byte at a time
+        buf = bytearray()
         while True:
-            ch = stdscr.getch()
+            # one write per key: repaint the prompt row from buf; getch() flushes it
+            move(self.max_y - 1, 0)
+            addnstr(head + buf.decode("utf-8", errors="replace"), self.max_x - 1)
+            clrtoeol()
+
+            ch = getch()
 
             if ch in (curses.KEY_ENTER, 10, 13):  # Enter
-                text = "".join(buf).strip()
+                text = buf.decode("utf-8", errors="replace").strip()
                 return text if text else None
 
             elif ch == 27:  # Esc
@@ -1703,18 +2512,14 @@ class TUIApp:
                 return None
 
             elif ch in (curses.KEY_BACKSPACE, 127, 8):
-                if buf:
-                    buf.pop()
-                    y, x = stdscr.getyx()
-                    if x > len(prompt) + 2:
-                        stdscr.move(y, x - 1)
-                        stdscr.delch()
+                pop_utf8_char(buf)
 
-            elif 32 <= ch < 127:
-                buf.append(chr(ch))
-                stdscr.addch(ch)
+            elif ch == curses.KEY_RESIZE:
+                # the rest of the screen is repainted once the prompt returns
+                self._resize(stdscr)
 
-            stdscr.refresh()
+            elif 32 <= ch < 256 and ch != 127:
+                buf.append(ch)
 
     def _safe_int(self, stdscr, prompt: str) -> Optional[int]:
         raw = self._prompt_user(stdscr, prompt)
@@ -1723,7 +2528,7 @@ class TUIApp:
         try:
             return int(raw.strip())
         except ValueError:
-            self.set_status(f"Invalid integer: {raw}", error=True)
+            self.set_status("Invalid integer: %s", raw, error=True)
             return None
 
     def _safe_value(self, stdscr, prompt: str):
@@ -1741,70 +2546,70 @@ class TUIApp:
         if raw is None or not raw.strip():
             return None
         try:
-            return parse_kvs(shlex.split(raw.strip()))
+            return parse_kvs(_fast_shlex(raw.strip()))
         except BookkeepingError as e:
             self.set_status(str(e), error=True)
             return None
 
     # ---------- Keep existing normal & command handlers ----------
-    # (We reuse _handle_normal and _handle_command from the original implementation.)
+    # (We reuse _handle_command from the original implementation.)
 
     # ---------- Table Commands ----------
     def _table_add_column(self, stdscr):
         col = self._prompt_user(stdscr, "Column name")
         if col:
             self.reg.table_add_column(col)
-            self.set_status(f"Added column {col}")
+            self.set_status("Added column %s", col)
 
     def _table_add_list_column(self, stdscr):
         col = self._prompt_user(stdscr, "List column name")
         if col:
             self.reg.table_add_list_column(col)
-            self.set_status(f"Added list column {col}")
+            self.set_status("Added list column %s", col)
 
     def _table_delete_column(self, stdscr):
         col = self._prompt_user(stdscr, "Column to delete")
         if col:
             self.reg.table_del_column(col)
-            self.set_status(f"Deleted column {col}")
+            self.set_status("Deleted column %s", col)
 
     def _table_insert_row(self, stdscr):
         kv = self._safe_kvs(stdscr, "Row data key=value ...")
         if kv:
             idx = self.reg.table_insert_row(kv)
-            self.set_status(f"Inserted row #{idx}")
+            self.set_status("Inserted row #%s", idx)
 
     def _table_delete_row(self, stdscr):
         idx = self._safe_int(stdscr, "Row index")
         if idx is not None:
             self.reg.table_delete_row(idx)
-            self.set_status(f"Deleted row #{idx}")
+            self.set_status("Deleted row #%s", idx)
 
     def _table_move_row(self, stdscr):
         old_idx = self._safe_int(stdscr, "Old index")
         new_idx = self._safe_int(stdscr, "New index")
         if old_idx is not None and new_idx is not None:
             self.reg.table_move_row(old_idx, new_idx)
-            self.set_status(f"Moved row {old_idx} -> {new_idx}")
+            self.set_status("Moved row %s -> %s", old_idx, new_idx)
 
     def _table_update_row(self, stdscr):
         idx = self._safe_int(stdscr, "Row index")
         kv = self._safe_kvs(stdscr, "Updates key=value ...")
         if idx is not None and kv:
             self.reg.table_update_row(idx, kv)
-            self.set_status(f"Updated row #{idx}")
+            self.set_status("Updated row #%s", idx)
 
     def _table_set_index(self, stdscr):
         col = self._prompt_user(stdscr, "Column to index")
         if col:
             self.reg.table_set_index(col)
-            self.set_status(f"Indexed column {col}")
+            self.set_status("Indexed column %s", col)
 
     def _table_unset_index(self, stdscr):
         col = self._prompt_user(stdscr, "Column to unindex")
         if col:
             self.reg.table_unset_index(col)
-            self.set_status(f"Unindexed column {col}")
+            self.set_status("Unindexed column %s", col)
 
     def _table_list_append(self, stdscr):
         idx = self._safe_int(stdscr, "Row index")
@@ -1812,7 +2617,7 @@ class TUIApp:
         val = self._safe_value(stdscr, "Value to append")
         if idx is not None and col and val is not None:
             self.reg.table_list_append(idx, col, val)
-            self.set_status(f"Appended to {col} in row {idx}")
+            self.set_status("Appended to %s in row %s", col, idx)
 
     def _table_list_insert(self, stdscr):
         idx = self._safe_int(stdscr, "Row index")
@@ -1821,7 +2626,7 @@ class TUIApp:
         val = self._safe_value(stdscr, "Value")
         if idx is not None and col and pos is not None and val is not None:
             self.reg.table_list_insert(idx, col, pos, val)
-            self.set_status(f"Inserted in {col}[{pos}] row {idx}")
+            self.set_status("Inserted in %s[%s] row %s", col, pos, idx)
 
     def _table_list_update(self, stdscr):
         idx = self._safe_int(stdscr, "Row index")
@@ -1830,7 +2635,7 @@ class TUIApp:
         val = self._safe_value(stdscr, "New value")
         if idx is not None and col and pos is not None and val is not None:
             self.reg.table_list_update(idx, col, pos, val)
-            self.set_status(f"Updated {col}[{pos}] row {idx}")
+            self.set_status("Updated %s[%s] row %s", col, pos, idx)
 
     def _table_list_delete(self, stdscr):
         idx = self._safe_int(stdscr, "Row index")
@@ -1838,7 +2643,7 @@ class TUIApp:
         pos = self._safe_int(stdscr, "Position")
         if idx is not None and col and pos is not None:
             self.reg.table_list_delete(idx, col, pos)
-            self.set_status(f"Deleted from {col}[{pos}] row {idx}")
+            self.set_status("Deleted from %s[%s] row %s", col, pos, idx)
 
     # ---------- Graph Commands ----------
     def _graph_add_node(self, stdscr):
@@ -1846,20 +2651,20 @@ class TUIApp:
         kv = self._safe_kvs(stdscr, "Attrs key=value ... (optional)")
         if nid:
             self.reg.graph_add_node(nid, kv or {})
-            self.set_status(f"Added node {nid}")
+            self.set_status("Added node %s", nid)
 
     def _graph_del_node(self, stdscr):
         nid = self._prompt_user(stdscr, "Node ID")
         if nid:
             self.reg.graph_del_node(nid)
-            self.set_status(f"Deleted node {nid}")
+            self.set_status("Deleted node %s", nid)
 
     def _graph_update_node(self, stdscr):
         nid = self._prompt_user(stdscr, "Node ID")
         kv = self._safe_kvs(stdscr, "Updates key=value ...")
         if nid and kv:
             self.reg.graph_update_node(nid, kv)
-            self.set_status(f"Updated node {nid}")
+            self.set_status("Updated node %s", nid)
 
     def _graph_add_edge(self, stdscr):
         frm = self._prompt_user(stdscr, "From node")
@@ -1867,33 +2672,33 @@ class TUIApp:
         kv = self._safe_kvs(stdscr, "Meta key=value ... (optional)")
         if frm and to:
             self.reg.graph_add_edge(frm, to, kv or {})
-            self.set_status(f"Added edge {frm}->{to}")
+            self.set_status("Added edge %s->%s", frm, to)
 
     def _graph_del_edge(self, stdscr):
         frm = self._prompt_user(stdscr, "From node")
         to = self._prompt_user(stdscr, "To node")
         if frm and to:
             self.reg.graph_del_edge(frm, to)
-            self.set_status(f"Deleted edge {frm}->{to}")
+            self.set_status("Deleted edge %s->%s", frm, to)
 
     def _graph_set_index(self, stdscr):
         attr = self._prompt_user(stdscr, "Attr to index")
         if attr:
             self.reg.graph_set_node_index(attr)
-            self.set_status(f"Indexed {attr}")
+            self.set_status("Indexed %s", attr)
 
     def _graph_unset_index(self, stdscr):
         attr = self._prompt_user(stdscr, "Attr to unindex")
         if attr:
             self.reg.graph_unset_node_index(attr)
-            self.set_status(f"Unindexed {attr}")
+            self.set_status("Unindexed %s", attr)
 
     def _graph_find_nodes(self, stdscr):
         attr = self._prompt_user(stdscr, "Attr name")
         val = self._safe_value(stdscr, "Value")
         if attr and val is not None:
             res = self.reg.graph_lookup_nodes(attr, val)
-            self.set_status(f"Found: {res}")
+            self.set_status("Found: %s", res)
 
     # ---------- KVP Commands ----------
     def _kvp_set(self, stdscr):
@@ -1901,14 +2706,14 @@ class TUIApp:
         val = self._safe_value(stdscr, "Value")
         if key and val is not None:
             self.reg.kv_set(key, val)
-            self.set_status(f"Set {key}={val}")
+            self.set_status("Set %s=%s", key, val)
 
     def _kvp_get(self, stdscr):
         key = self._prompt_user(stdscr, "Key")
         if key:
             try:
                 val = self.reg.kv_get(key)
-                self.set_status(f"{key}={val}")
+                self.set_status("%s=%s", key, val)
             except BookkeepingError as e:
                 self.set_status(str(e), error=True)
 
@@ -1916,140 +2721,69 @@ class TUIApp:
         key = self._prompt_user(stdscr, "Key")
         if key:
             self.reg.kv_delete(key)
-            self.set_status(f"Deleted {key}")
+            self.set_status("Deleted %s", key)
 
     def _kvp_set_index(self, stdscr):
         key = self._prompt_user(stdscr, "Key to index")
         if key:
             self.reg.kv_set_index(key)
-            self.set_status(f"Indexed key {key}")
+            self.set_status("Indexed key %s", key)
 
     def _kvp_unset_index(self, stdscr):
         key = self._prompt_user(stdscr, "Key to unindex")
         if key:
             self.reg.kv_unset_index(key)
-            self.set_status(f"Unindexed key {key}")
+            self.set_status("Unindexed key %s", key)
 
     # ---------- Existing Normal/Command/Run from original ----------
-    # We keep _handle_normal, _handle_command, _cmd_save, _cmd_load, run as-is in the file.
+    # We keep _handle_command, _cmd_save, _cmd_load, run as-is in the file.
 
 
 
 
 
-    def _handle_normal(self, ch: int) -> bool:
-        if ch == ord("j"):
-            self.move_cursor(1)
-        elif ch == ord("k"):
-            self.move_cursor(-1)
-        elif ch == ord("h"):
-            try:
-                self.reg.ascend()
-                self.set_status("ascend")
-            except BookkeepingError as e:
-                self.set_status(str(e), error=True)
-        elif ch == ord("l"):
-            try:
-                cur = self._elem_cursor()
-                self.reg.descend(cur.slot_index)
-                self.set_status(f"descend {cur.slot_index}")
-            except BookkeepingError as e:
-                self.set_status(str(e), error=True)
-        elif ch == ord("i"):
-            self.enter_mode_for_element()
-
-        elif ch == ord(":"):
-            self.mode = Mode.COMMAND
-            self.command_line = ""
-            self.set_status("")
-        elif ch == ord("u"):  # undo
-            try:
-                self.reg.undo()
-                self.set_status("Undo successful")
-            except BookkeepingError as e:
-                self.set_status(str(e), error=True)
-        elif ch == 18:  # Ctrl-r for redo
-            try:
-                self.reg.redo()
-                self.set_status("Redo successful")
-            except BookkeepingError as e:
-                self.set_status(str(e), error=True)
-        elif ch == ord("H"):  # show history
-            hist = self.reg.list_history()
-            self.set_status(f"History: {hist}")
-
-        return True
-
-
     def _handle_command(self, ch: int) -> bool:
         if ch in (10, 13):
-            cmd = self.command_line.strip()
-            if cmd.startswith("load "):
-                path = cmd.partition(" ")[2].strip()
-                self._cmd_load(path)
-            elif cmd.startswith("w"):
-                path = cmd.partition(" ")[2].strip() or self.file_path
-                self._cmd_save(path)
-                if cmd.startswith("wq"):
+            verb, _, rest = self.command_line.strip().partition(" ")
+            fn = self._cmd_dispatch.get(verb)
+            if fn is not None:
+                if fn(rest.strip() or self.file_path) is False:
                     return False
-            elif cmd in ("q", "q!"):
-                return False
+            elif verb:
+                self.set_status("Unknown command: %s", verb, error=True)
             self.reset_mode()
         elif ch in (curses.KEY_BACKSPACE, 127, 8):
-            self.command_line = self.command_line[:-1]
-        else:
-            try:
-                self.command_line += chr(ch)
-            except ValueError:
-                pass
+            pop_utf8_char(self.command_line_buf)
+        elif 32 <= ch < 256 and ch != 127:
+            # getch hands over non-ASCII input one UTF-8 byte at a time
+            self.command_line_buf.append(ch)
         return True
 
 
-    def _cmd_save(self, path: Optional[str]) -> None:
+    def _save(self, path: Optional[str]) -> bool:
         if not path:
             self.set_status("No file path", error=True)
-            return
+            return False
         try:
             self.reg.save_to_file(path)
             self.file_path = path
-            self.set_status(f"Saved to {path}")
-        except BookkeepingError as e:
-            self.set_status(str(e), error=True)
-
-    def _cmd_load(self, path: str) -> None:
-        if not path:
-            self.set_status("Usage: :load <file>", error=True)
-            return
-        try:
-            self.reg.load_from_file(path)
-            self.cursor = Cursor(0)
-            self.file_path = path
-            self.set_status(f"Loaded {path}")
+            self.set_status("Saved to %s", path)
+            return True
         except BookkeepingError as e:
             self.set_status(str(e), error=True)
+            return False
 
-    # ---------- Main loop ----------
-    def run(self, stdscr: "curses._CursesWindow") -> None:
-        curses.curs_set(0)
-        stdscr.nodelay(False)
-        stdscr.keypad(True)
-        self.set_status("PyBookkeeping initialized")
-        while True:
-            stdscr.erase()
-            top = self._render_header(stdscr)
-            if self.mode == Mode.NORMAL:
-                self._render_slots(stdscr, top)
-            elif self.mode in (Mode.TABLE, Mode.GRAPH, Mode.KVP):
-                self._render_element_pprint(stdscr, top)
-            self._render_footer(stdscr)
-            stdscr.refresh()
-
-            ch = stdscr.getch()
-            if not self.handle_input(ch, stdscr):
-                break
-
+    def _cmd_save(self, path: Optional[str]) -> None:
+        self._save(path)
 
+    def _cmd_save_quit(self, path: Optional[str]) -> Optional[bool]:
+        # a failed save keeps the session open so the error can be seen
+        if self._save(path):
+            return False
+        return None
 
+    def _cmd_quit(self, path: Optional[str]) -> bool:
+        return False
 
     def _cmd_load(self, path: str) -> None:
         if not path:
@@ -2059,7 +2793,7 @@ class TUIApp:
             self.reg.load_from_file(path)
             self.cursor = Cursor(0)
             self.file_path = path
-            self.set_status(f"Loaded {path}")
+            self.set_status("Loaded %s", path)
         except BookkeepingError as e:
             self.set_status(str(e), error=True)
 
@@ -2069,40 +2803,32 @@ class TUIApp:
         stdscr.nodelay(False)
         stdscr.keypad(True)
         self.set_status("PyBookkeeping initialized")
+        self._resize(stdscr)
         while True:
-            stdscr.erase()
-            top = self._render_header(stdscr)
-            if self.mode == Mode.NORMAL:
-                self._render_slots(stdscr, top)
-            elif self.mode in (Mode.TABLE, Mode.GRAPH, Mode.KVP):
-                self._render_element_pprint(stdscr, top)
-            self._render_footer(stdscr)
-            stdscr.refresh()
+            # no explicit refresh(): getch() refreshes a window that changed since the last
+            # refresh, so a key handler chaining several prompts costs one flush per key read
+            self._render(stdscr)
 
             ch = stdscr.getch()
-            if not self.handle_input(ch, stdscr):
-                break
-
-
-
-    def run(self, stdscr: "curses._CursesWindow") -> None:
-        curses.curs_set(0)
-        stdscr.nodelay(False)
-        stdscr.keypad(True)
-        self.set_status("PyBookkeeping initialized")
-        while True:
-            stdscr.erase()
-            top = self._render_header(stdscr)
-            if self.mode == Mode.NORMAL:
-                self._render_slots(stdscr, top)
-            elif self.mode in (Mode.TABLE, Mode.GRAPH, Mode.KVP):
-                self._render_element_pprint(stdscr, top)
-            self._render_footer(stdscr)
-            stdscr.refresh()
+            # handle this key and any already queued behind it (held-key repeat, paste)
+            # before drawing again, so a burst costs one render instead of one per key
+            while ch != -1:
+                # one key = one undo step, however many registry edits it makes
+                with self.reg.group():
+                    keep_going = self.handle_input(ch, stdscr)
+                if not keep_going:
+                    return
+                ch = self._poll_key(stdscr)
 
-            ch = stdscr.getch()
-            if not self.handle_input(ch, stdscr):
-                break
+    @staticmethod
+    def _poll_key(stdscr: "curses._CursesWindow") -> int:
+        """Return the next key if one is already waiting, else -1; never blocks."""
+        # blocking mode is restored before any handler runs, so prompts still wait for input
+        stdscr.nodelay(True)
+        try:
+            return stdscr.getch()
+        finally:
+            stdscr.nodelay(False)
 
 
 
@@ -0,0 +1,93 @@
+import math
+import unittest
+
+from PyBookkeepingTUI import BookkeepingError, ElementRegistry, IndexPointer, parse_value
+
+
+def _parse_value_reference(token):
+    # parse_value as it was before the regex pre-check: try int(), then float()
+    if token.startswith("ptr:"):
+        body = token[len("ptr:"):]
+        if "::" not in body:
+            raise BookkeepingError("ptr must be ptr:<element_id>::<index_key>")
+        eid_s, k = body.split("::", 1)
+        try:
+            eid = int(eid_s)
+        except ValueError:
+            raise BookkeepingError("Invalid element id in pointer")
+        return IndexPointer(eid, k)
+    try:
+        return int(token)
+    except ValueError:
+        pass
+    try:
+        return float(token)
+    except ValueError:
+        pass
+    if token.lower() in ("true", "false"):
+        return token.lower() == "true"
+    if (token.startswith('"') and token.endswith('"')) or (token.startswith("'") and token.endswith("'")):
+        return token[1:-1]
+    return token
+
+class TestFreeSlots(unittest.TestCase):
+
+    def setUp(self):
+        self.reg = ElementRegistry()
+        self.root = self.reg.elements[self.reg.root_id]
+
+    def test_create_delete_cycles_keep_heap_bounded(self):
+        # the same slot is filled and freed over and over
+        for _ in range(1000):
+            eid, pos = self.reg.create_element("kvp", "x")
+            self.assertEqual(pos, 0)
+            self.reg.delete(pos)
+        self.assertEqual(len(self.root.refs), 1)
+        self.assertLessEqual(len(self.root._free_slots), 1)
+
+    def test_explicit_slot_cycles_keep_heap_bounded(self):
+        # filling a slot that is not the lowest free one leaves its entry below the top
+        for _ in range(1000):
+            self.reg.create_element("kvp", "y", slot_pos=3)
+            self.reg.delete(3)
+        self.assertEqual(len(self.root.refs), 4)
+        self.assertLessEqual(len(self.root._free_slots), 2 * len(self.root.refs) + 8)
+
+    def test_first_free_slot_is_lowest_empty(self):
+        for i in range(5):
+            self.reg.create_element("kvp", f"e{i}")
+        self.reg.delete(3)
+        self.reg.delete(1)
+        self.assertEqual(self.root.first_free_slot(), 1)
+        _, pos = self.reg.create_element("kvp", "again")
+        self.assertEqual(pos, 1)
+        self.assertEqual(self.root.first_free_slot(), 3)
+
+
+class TestParseValue(unittest.TestCase):
+
+    EDGE_TOKENS = [
+        "", "0", "-1", "+1", "007", "1_000", "1__0", "_1", "1_", " 5", "5 ", "\t7\n",
+        "1.", ".5", "1.5", "1e5", "1E-5", "1_0.5", "1.5_0", "1e1_0", "1e", "e5", ".", "-.5e3",
+        "inf", "-Infinity", "nan", "NaN", " +inf ", "infinit", "\u0661\u0662", "0x10",
+        "true", "FALSE", "True ", "'a'", '"b"', "'", '"', "abc", "ptr:3::k",
+    ]
+
+    def _describe(self, fn, token):
+        try:
+            v = fn(token)
+        except BookkeepingError as e:
+            return ("error", str(e))
+        if isinstance(v, float) and math.isnan(v):
+            return ("float", "nan")
+        return (type(v).__name__, v)
+
+    def test_matches_try_except_version(self):
+        for token in self.EDGE_TOKENS:
+            with self.subTest(token=token):
+                self.assertEqual(self._describe(parse_value, token),
+                                 self._describe(_parse_value_reference, token))
+
+
+if __name__ == "__main__":
+    unittest.main()
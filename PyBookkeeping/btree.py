@@ -1,22 +1,39 @@
+from array import array
+from collections import deque
+from bisect import bisect_left, bisect_right, insort
+
+
 class BTreeNode:
-    def __init__(self, t, leaf=False):
+    __slots__ = ("t", "leaf", "keys", "children")
+
+    def __init__(self, t, leaf=False, typecode=None):
         self.t = t
         self.leaf = leaf
-        self.keys = []
+        self.keys = array(typecode) if typecode else []
         self.children = []
 
     def __str__(self, level=0):
-        indent = "   " * level
-        rep = indent + str(self.keys) + "\n"
-        for child in self.children:
-            rep += child.__str__(level + 1)
-        return rep
+        # pre-order walk collecting one fragment per node, joined once at the end
+        parts = []
+        stack = [(self, level)]
+        while stack:
+            node, level = stack.pop()
+            parts.append(f"{'   ' * level}{node.keys}\n")
+            stack.extend((child, level + 1) for child in reversed(node.children))
+        return "".join(parts)
 
 
 class BTree:
-    def __init__(self, t):
+    def __init__(self, t=32, typecode=None):
+        """t is the minimum degree; nodes hold up to 2t - 1 keys.
+
+        With a typecode (e.g. 'q' for int64 keys) every node keeps its keys in a
+        packed array.array instead of a list; all keys must then fit that type.
+        """
         self.t = t
-        self.root = BTreeNode(t, leaf=True)
+        self._max_keys = 2 * t - 1
+        self.typecode = typecode
+        self.root = BTreeNode(t, leaf=True, typecode=typecode)
 
     # ------------------------------
     # SEARCH
@@ -25,24 +42,22 @@ class BTree:
         if x is None:
             x = self.root
 
-        i = 0
-        while i < len(x.keys) and k > x.keys[i]:
-            i += 1
-
-        if i < len(x.keys) and k == x.keys[i]:
-            return (x, i)
-        elif x.leaf:
-            return None
-        else:
-            return self.search(k, x.children[i])
+        while True:
+            keys = x.keys
+            i = bisect_left(keys, k)
+            if i < len(keys) and k == keys[i]:
+                return (x, i)
+            elif x.leaf:
+                return None
+            x = x.children[i]
 
     # ------------------------------
     # INSERT
     # ------------------------------
     def insert(self, k):
         root = self.root
-        if len(root.keys) == (2 * self.t - 1):
-            new_root = BTreeNode(self.t, leaf=False)
+        if len(root.keys) == self._max_keys:
+            new_root = BTreeNode(self.t, leaf=False, typecode=self.typecode)
             new_root.children.insert(0, root)
             self._split_child(new_root, 0)
             self._insert_non_full(new_root, k)
@@ -51,27 +66,22 @@ class BTree:
             self._insert_non_full(root, k)
 
     def _insert_non_full(self, x, k):
-        i = len(x.keys) - 1
-        if x.leaf:
-            x.keys.append(None)
-            while i >= 0 and k < x.keys[i]:
-                x.keys[i + 1] = x.keys[i]
-                i -= 1
-            x.keys[i + 1] = k
-        else:
-            while i >= 0 and k < x.keys[i]:
-                i -= 1
-            i += 1
-            if len(x.children[i].keys) == (2 * self.t - 1):
+        # splits happen on the way down, so nothing is left to do on the way back up
+        max_keys = self._max_keys
+        while not x.leaf:
+            children = x.children
+            i = bisect_right(x.keys, k)
+            if len(children[i].keys) == max_keys:
                 self._split_child(x, i)
                 if k > x.keys[i]:
                     i += 1
-            self._insert_non_full(x.children[i], k)
+            x = children[i]
+        insort(x.keys, k)
 
     def _split_child(self, x, i):
         t = self.t
         y = x.children[i]
-        z = BTreeNode(t, leaf=y.leaf)
+        z = BTreeNode(t, leaf=y.leaf, typecode=self.typecode)
 
         z.keys = y.keys[t:]
         middle = y.keys[t - 1]
@@ -93,30 +103,32 @@ class BTree:
             self.root = self.root.children[0]
 
     def _delete(self, x, k):
+        # children are topped up before descending, so one pass down is enough
         t = self.t
-        i = 0
-        while i < len(x.keys) and k > x.keys[i]:
-            i += 1
-
-        if i < len(x.keys) and x.keys[i] == k:
-            if x.leaf:
-                x.keys.pop(i)
-            else:
-                if len(x.children[i].keys) >= t:
+        while True:
+            keys, children = x.keys, x.children
+            i = bisect_left(keys, k)
+            if i < len(keys) and keys[i] == k:
+                if x.leaf:
+                    keys.pop(i)
+                    return
+                if len(children[i].keys) >= t:
                     pred = self._get_pred(x, i)
-                    x.keys[i] = pred
-                    self._delete(x.children[i], pred)
-                elif len(x.children[i + 1].keys) >= t:
+                    keys[i] = pred
+                    x, k = children[i], pred
+                elif len(children[i + 1].keys) >= t:
                     succ = self._get_succ(x, i)
-                    x.keys[i] = succ
-                    self._delete(x.children[i + 1], succ)
+                    keys[i] = succ
+                    x, k = children[i + 1], succ
                 else:
                     self._merge(x, i)
-                    self._delete(x.children[i], k)
-        elif not x.leaf:
-            if len(x.children[i].keys) < t:
-                self._fix_child_size(x, i)
-            self._delete(x.children[i], k)
+                    x = children[i]
+            elif not x.leaf:
+                if len(children[i].keys) < t:
+                    self._fix_child_size(x, i)
+                x = x.children[i]
+            else:
+                return
 
     def _get_pred(self, x, i):
         node = x.children[i]
@@ -140,41 +152,49 @@ class BTree:
         x.children.pop(i + 1)
 
     def _fix_child_size(self, x, i):
+        # borrowing shifts a node's keys by one slot at the front; with at most
+        # 2t - 1 keys that is one small memmove, so keys stay bisectable lists
         t = self.t
-        if i > 0 and len(x.children[i - 1].keys) >= t:
-            left = x.children[i - 1]
-            child = x.children[i]
+        children = x.children
+        child = children[i]
+        if i > 0 and len(children[i - 1].keys) >= t:
+            left = children[i - 1]
             child.keys.insert(0, x.keys[i - 1])
             x.keys[i - 1] = left.keys.pop()
             if not left.leaf:
                 child.children.insert(0, left.children.pop())
-        elif i < len(x.children) - 1 and len(x.children[i + 1].keys) >= t:
-            right = x.children[i + 1]
-            child = x.children[i]
+        elif i < len(children) - 1 and len(children[i + 1].keys) >= t:
+            right = children[i + 1]
             child.keys.append(x.keys[i])
             x.keys[i] = right.keys.pop(0)
             if not right.leaf:
                 child.children.append(right.children.pop(0))
+        elif i < len(children) - 1:
+            self._merge(x, i)
         else:
-            if i < len(x.children) - 1:
-                self._merge(x, i)
-            else:
-                self._merge(x, i - 1)
+            self._merge(x, i - 1)
 
     # ------------------------------
     # TRAVERSAL
     # ------------------------------
     def inorder_traversal(self, x=None):
+        """Yield the keys in sorted order, lazily."""
         if x is None:
             x = self.root
-        result = []
-        for i in range(len(x.keys)):
-            if not x.leaf:
-                result.extend(self.inorder_traversal(x.children[i]))
-            result.append(x.keys[i])
-        if not x.leaf:
-            result.extend(self.inorder_traversal(x.children[-1]))
-        return result
+        # (node, i): emit node.keys[i - 1] (if i > 0), then walk child i
+        stack = [(x, 0)]
+        while stack:
+            node, i = stack.pop()
+            if node.leaf:
+                yield from node.keys
+                continue
+            if i > 0:
+                yield node.keys[i - 1]
+            if i < len(node.keys):
+                stack.append((node, i + 1))
+                stack.append((node.children[i], 0))
+            else:
+                stack.append((node.children[-1], 0))
 
     # ------------------------------
     # PRETTY PRINT
@@ -183,22 +203,29 @@ class BTree:
         """Print tree level by level with keys grouped per node."""
         levels = []
         self._collect_levels(self.root, 0, levels)
-        for depth, nodes in enumerate(levels):
-            print("Level", depth, ":", " | ".join(str(node) for node in nodes))
+        print("\n".join(f"Level {depth} : " + " | ".join(str(node) for node in nodes)
+                        for depth, nodes in enumerate(levels)))
 
     def _collect_levels(self, node, depth, levels):
-        if len(levels) <= depth:
-            levels.append([])
-        levels[depth].append(node.keys)
-        for child in node.children:
-            self._collect_levels(child, depth + 1, levels)
+        # breadth-first, so each level fills left to right without recursion
+        queue = deque([(node, depth)])
+        while queue:
+            node, depth = queue.popleft()
+            if len(levels) <= depth:
+                levels.append([])
+            levels[depth].append(node.keys)
+            queue.extend((child, depth + 1) for child in node.children)
             
     def print_yaml(self, node=None, indent=0):
         """Pretty print the B-tree in a YAML-like hierarchical style."""
         if node is None:
             node = self.root
 
-        prefix = "  " * indent
-        print(f"{prefix}- {node.keys}")
-        for child in node.children:
-            self.print_yaml(child, indent + 1)
\ No newline at end of file
+        # pre-order walk into one buffer, printed with a single write
+        lines = []
+        stack = [(node, indent)]
+        while stack:
+            node, indent = stack.pop()
+            lines.append(f"{'  ' * indent}- {node.keys}")
+            stack.extend((child, indent + 1) for child in reversed(node.children))
+        print("\n".join(lines))
\ No newline at end of file
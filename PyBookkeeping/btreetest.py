@@ -8,9 +8,9 @@ if __name__ == "__main__":
     print("Pretty print:")
     b.print_yaml()
 
-    print("\nIn-order traversal:", b.inorder_traversal())
+    print("\nIn-order traversal:", list(b.inorder_traversal()))
 
     b.delete(6)
     print("\nAfter deleting 6:")
     b.print_yaml()
-    print("In-order traversal:", b.inorder_traversal())
+    print("In-order traversal:", list(b.inorder_traversal()))
@@ -28,26 +28,26 @@ class TestBTree(unittest.TestCase):
         values = [10, 20, 5, 6, 12, 30, 7, 17]
         for v in values:
             self.btree.insert(v)
-        traversal = self.btree.inorder_traversal()
+        traversal = list(self.btree.inorder_traversal())
         self.assertEqual(traversal, sorted(values))
 
     def test_delete_leaf(self):
         self.btree.insert(10)
         self.btree.insert(20)
         self.btree.insert(5)
-        self.assertIn(10, self.btree.inorder_traversal())
+        self.assertIn(10, list(self.btree.inorder_traversal()))
         self.btree.delete(10)
-        self.assertNotIn(10, self.btree.inorder_traversal())
+        self.assertNotIn(10, list(self.btree.inorder_traversal()))
 
     def test_delete_internal_node(self):
         values = [10, 20, 5, 6, 12, 30, 7, 17]
         for v in values:
             self.btree.insert(v)
 
-        self.assertIn(20, self.btree.inorder_traversal())
+        self.assertIn(20, list(self.btree.inorder_traversal()))
         self.btree.delete(20)
-        self.assertNotIn(20, self.btree.inorder_traversal())
-        self.assertEqual(self.btree.inorder_traversal(), sorted(set(values) - {20}))
+        self.assertNotIn(20, list(self.btree.inorder_traversal()))
+        self.assertEqual(list(self.btree.inorder_traversal()), sorted(set(values) - {20}))
 
     def test_root_shrinking(self):
         self.btree.insert(1)
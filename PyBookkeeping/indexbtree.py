@@ -2,6 +2,8 @@ from typing import Any, List, Optional
 
 
 class IndexBTreeNode:
+    __slots__ = ("t", "leaf", "rows", "children", "subtree_size")
+
     def __init__(self, t: int, leaf: bool = True):
         self.t = t
         self.leaf = leaf
@@ -10,7 +12,7 @@ class IndexBTreeNode:
         self.subtree_size: int = 0            # total #rows in this subtree
 
     def update_size(self) -> int:
-        """Recalculate subtree size recursively."""
+        """Recalculate subtree size recursively (integrity check; insert/delete keep it current)."""
         if self.leaf:
             self.subtree_size = len(self.rows)
         else:
@@ -19,15 +21,37 @@ class IndexBTreeNode:
 
 
 class IndexBTree:
+    # when set, size() re-sums the whole tree to check the incremental counts
+    audit_sizes: bool = False
+
     def __init__(self, t: int = 4):
         self.t = t
         self.root = IndexBTreeNode(t, leaf=True)
-
-    def from_list(given_list: list, t: int = 4):
-        indexBTree: IndexBTree = IndexBTree(t)
-        for i in range(len(given_list)):
-            list_item: Any = given_list[i]
-            indexBTree.insert(i, list_item)
+        # result of inorder() for the whole tree; reset by insert/delete
+        self._inorder_cache: Optional[List[Any]] = None
+
+    @classmethod
+    def from_list(cls, given_list: list, t: int = 4) -> "IndexBTree":
+        """Build the tree bottom-up: pack rows into full leaves, then group
+        up to 2t nodes under each parent until a single root is left."""
+        indexBTree = cls(t)
+        max_rows = 2 * t - 1
+        level: List[IndexBTreeNode] = []
+        for start in range(0, len(given_list), max_rows):
+            leaf = IndexBTreeNode(t, leaf=True)
+            leaf.rows = list(given_list[start:start + max_rows])
+            leaf.subtree_size = len(leaf.rows)
+            level.append(leaf)
+        while len(level) > 1:
+            parents: List[IndexBTreeNode] = []
+            for start in range(0, len(level), 2 * t):
+                parent = IndexBTreeNode(t, leaf=False)
+                parent.children = level[start:start + 2 * t]
+                parent.subtree_size = sum(child.subtree_size for child in parent.children)
+                parents.append(parent)
+            level = parents
+        if level:
+            indexBTree.root = level[0]
         return indexBTree
 
     # ------------------------------
@@ -37,18 +61,20 @@ class IndexBTree:
         if node is None:
             node = self.root
 
-        if node.leaf:
-            if index < 0 or index >= len(node.rows):
+        # Walk children based on subtree sizes, one level per iteration
+        while not node.leaf:
+            for child in node.children:
+                size = child.subtree_size
+                if index < size:
+                    node = child
+                    break
+                index -= size
+            else:
                 raise IndexError("Row index out of range")
-            return node.rows[index]
-
-        # Walk children based on subtree sizes
-        for child in node.children:
-            if index < child.subtree_size:
-                return self.get(index, child)
-            index -= child.subtree_size
 
-        raise IndexError("Row index out of range")
+        if index < 0 or index >= len(node.rows):
+            raise IndexError("Row index out of range")
+        return node.rows[index]
 
     # ------------------------------
     # INSERT ROW AT INDEX
@@ -56,6 +82,7 @@ class IndexBTree:
     def insert(self, index: int, row: Any, node: Optional[IndexBTreeNode] = None):
         if node is None:
             node = self.root
+            self._inorder_cache = None
 
         if node.leaf:
             if index < 0 or index > len(node.rows):
@@ -64,13 +91,15 @@ class IndexBTree:
             node.subtree_size = len(node.rows)
             return
 
-        for i, child in enumerate(node.children):
+        for child in node.children:
             if index <= child.subtree_size:
                 self.insert(index, row, child)
+                # exactly one row was added below us
+                node.subtree_size += 1
                 break
             index -= child.subtree_size
-
-        node.update_size()
+        else:
+            raise IndexError("Row index out of range")
 
     # ------------------------------
     # DELETE ROW AT INDEX
@@ -78,6 +107,7 @@ class IndexBTree:
     def delete(self, index: int, node: Optional[IndexBTreeNode] = None):
         if node is None:
             node = self.root
+            self._inorder_cache = None
 
         if node.leaf:
             if index < 0 or index >= len(node.rows):
@@ -89,20 +119,28 @@ class IndexBTree:
         for child in node.children:
             if index < child.subtree_size:
                 self.delete(index, child)
+                # exactly one row was removed below us
+                node.subtree_size -= 1
                 break
             index -= child.subtree_size
-
-        node.update_size()
+        else:
+            raise IndexError("Row index out of range")
 
     # ------------------------------
     # UTILITIES
     # ------------------------------
     def size(self) -> int:
-        return self.root.update_size()
+        # insert/delete keep subtree sizes current, so the root's is authoritative
+        if self.audit_sizes:
+            stored = self.root.subtree_size
+            assert self.root.update_size() == stored, "subtree sizes out of date"
+        return self.root.subtree_size
 
     def inorder(self, node: Optional[IndexBTreeNode] = None) -> List[Any]:
         if node is None:
-            node = self.root
+            if self._inorder_cache is None:
+                self._inorder_cache = self.inorder(self.root)
+            return self._inorder_cache[:]
         if node.leaf:
             return node.rows[:]
         result = []
@@ -114,13 +152,18 @@ class IndexBTree:
         if node is None:
             node = self.root
 
-        prefix = "  " * indent
-        if node.leaf:
-            print(f"{prefix}- leaf (size={node.subtree_size}): {node.rows}")
-        else:
-            print(f"{prefix}- internal (size={node.subtree_size}):")
-            for child in node.children:
-                self.print_yaml(child, indent + 1)
+        # pre-order walk into one buffer, printed with a single write
+        lines = []
+        stack = [(node, indent)]
+        while stack:
+            node, indent = stack.pop()
+            prefix = "  " * indent
+            if node.leaf:
+                lines.append(f"{prefix}- leaf (size={node.subtree_size}): {node.rows}")
+            else:
+                lines.append(f"{prefix}- internal (size={node.subtree_size}):")
+                stack.extend((child, indent + 1) for child in reversed(node.children))
+        print("\n".join(lines))
 
 def main():
     t = IndexBTree.from_list([12, 32, 92, 38, 28, 38], 2)
@@ -1,4 +1,6 @@
 class BTreeNode:
+    __slots__ = ("t", "leaf", "keys", "children", "subtree_size")
+
     def __init__(self, t, leaf=False):
         self.t = t
         self.leaf = leaf
@@ -7,7 +9,9 @@ class BTreeNode:
         self.subtree_size = 0
 
 class ShiftingBTree:
-    def __init__(self, t=2):
+    def __init__(self, t=32):
+        # a wide fanout keeps the tree shallow; the per-node list shifts on
+        # insert/pop stay cheap next to the per-level Python overhead they save
         self.t = t
         self.root = BTreeNode(t, leaf=True)
 
@@ -20,19 +24,22 @@ class ShiftingBTree:
     def get(self, index, node=None):
         if node is None:
             node = self.root
-        i = 0
-        while i < len(node.keys):
-            left_size = node.children[i].subtree_size if not node.leaf else 0
-            if index < left_size:
-                return self.get(index, node.children[i])
-            index -= left_size
-            if index == 0:
-                return node.keys[i]
-            index -= 1
-            i += 1
-        if not node.leaf:
-            return self.get(index, node.children[-1])
-        raise IndexError("Index out of range")
+        # one level per iteration: skip whole subtrees and the keys between them
+        while True:
+            keys, children, leaf = node.keys, node.children, node.leaf
+            for i in range(len(keys)):
+                left_size = children[i].subtree_size if not leaf else 0
+                if index < left_size:
+                    node = children[i]
+                    break
+                index -= left_size
+                if index == 0:
+                    return keys[i]
+                index -= 1
+            else:
+                if leaf:
+                    raise IndexError("Index out of range")
+                node = children[-1]
 
     # ------------------------------
     # Insert value at index
@@ -42,6 +49,7 @@ class ShiftingBTree:
         if len(root.keys) == (2 * self.t - 1):
             new_root = BTreeNode(self.t, leaf=False)
             new_root.children.append(root)
+            new_root.subtree_size = root.subtree_size
             self._split_child(new_root, 0)
             self.root = new_root
             self._insert_non_full(new_root, index, value)
@@ -49,44 +57,53 @@ class ShiftingBTree:
             self._insert_non_full(root, index, value)
 
     def _insert_non_full(self, node, index, value):
-        node.subtree_size += 1
-        if node.leaf:
-            node.keys.insert(index, value)
-        else:
+        max_keys = 2 * self.t - 1
+        # full children are split on the way down, so nothing is left to do on the way back up
+        while True:
+            node.subtree_size += 1
+            if node.leaf:
+                node.keys.insert(index, value)
+                return
+            children = node.children
             i = 0
-            while i < len(node.keys):
-                left_size = node.children[i].subtree_size
+            num_keys = len(node.keys)
+            while i < num_keys:
+                left_size = children[i].subtree_size
                 if index <= left_size:
                     break
                 index -= left_size + 1
                 i += 1
-            child = node.children[i]
-            if len(child.keys) == 2 * self.t - 1:
+            if len(children[i].keys) == max_keys:
                 self._split_child(node, i)
-                left_size = node.children[i].subtree_size
+                left_size = children[i].subtree_size
                 if index > left_size:
                     index -= left_size + 1
                     i += 1
-            self._insert_non_full(node.children[i], index, value)
+            node = children[i]
 
     def _split_child(self, parent, i):
         t = self.t
         y = parent.children[i]
         z = BTreeNode(t, leaf=y.leaf)
 
+        # y keeps the first t - 1 keys, the median moves up, z takes the rest
+        median = y.keys[t - 1]
         z.keys = y.keys[t:]
-        y.keys = y.keys[:t]
+        y.keys = y.keys[:t - 1]
 
+        moved = 0
         if not y.leaf:
             z.children = y.children[t:]
-            y.children = y.children[:t+1]
+            y.children = y.children[:t]
+            moved = sum(c.subtree_size for c in z.children)
 
-        y.subtree_size = len(y.keys) + sum(c.subtree_size for c in y.children) if not y.leaf else len(y.keys)
-        z.subtree_size = len(z.keys) + sum(c.subtree_size for c in z.children) if not z.leaf else len(z.keys)
+        # a split only moves rows around, so the parent's size is unchanged and
+        # y keeps whatever did not go to z or up into the parent
+        z.subtree_size = len(z.keys) + moved
+        y.subtree_size -= z.subtree_size + 1
 
         parent.children.insert(i+1, z)
-        parent.keys.insert(i, z.keys[0])
-        parent.subtree_size = len(parent.keys) + sum(c.subtree_size for c in parent.children) if not parent.leaf else len(parent.keys)
+        parent.keys.insert(i, median)
 
     # ------------------------------
     # Delete by index (simplified)
@@ -97,19 +114,20 @@ class ShiftingBTree:
         return val
 
     def _delete_row(self, node, index):
-        node.subtree_size -= 1
-        if node.leaf:
-            node.keys.pop(index)
-        else:
-            i = 0
-            while i < len(node.keys):
-                left_size = node.children[i].subtree_size
+        while True:
+            node.subtree_size -= 1
+            if node.leaf:
+                node.keys.pop(index)
+                return
+            children = node.children
+            for i in range(len(node.keys)):
+                left_size = children[i].subtree_size
                 if index < left_size:
-                    self._delete_row(node.children[i], index)
-                    return
+                    node = children[i]
+                    break
                 index -= left_size + 1
-                i += 1
-            self._delete_row(node.children[-1], index)
+            else:
+                node = children[-1]
 
     # ------------------------------
     # Debug print (in-order traversal)